@@ -1,6 +1,25 @@
-from django.contrib import admin
+import difflib
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.models import LogEntry
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import PermissionDenied
+from django.db.models import Count
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
 from django.utils.safestring import mark_safe
-from .models import Cliente, Dispositivo, Protocolo, AtualizacaoProtocolo
+from . import arquivamento, autocompletar, busca, cache_modelos, exportacao, importacao, triagem
+from .forms import ImportacaoDispositivosForm, ProtocoloAdminForm, TriagemActionForm
+from .models import (
+    AcessoCliente, Cliente, Dispositivo, Protocolo, AtualizacaoProtocolo, Incidente, TransicaoStatusProtocolo, ProtocoloArquivado,
+    AtualizacaoProtocoloArquivada, TransicaoStatusArquivada, Tarefa, ConflitoEdicao,
+)
 
 # A classe Inline permite que você edite o histórico de atualizações dentro do Protocolo.
 class AtualizacaoProtocoloInline(admin.TabularInline):
@@ -16,17 +35,90 @@ class AtualizacaoProtocoloInline(admin.TabularInline):
             return ('tecnico', 'data_atualizacao')
         return ('tecnico',)  # Se é um novo protocolo, só o tecnico é readonly
 
+def _e_autocompletar(request):
+    """
+    Indica se a requisição é a busca dos campos autocomplete_fields do admin.
+    """
+    return request.resolver_match is not None and request.resolver_match.url_name == 'autocomplete'
+
+class FiltroRelacionadoEmCache(admin.RelatedFieldListFilter):
+    """
+    Filtro lateral por chave estrangeira com a lista de opções (todos os
+    clientes, técnicos...) em cache até o modelo relacionado mudar.
+    """
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        return cache_modelos.obter(
+            'filtro_relacionado', (field.remote_field.model,),
+            lambda: field.get_choices(include_blank=False, ordering=ordering),
+            field.model._meta.label_lower, field.name, ordering,
+        )
+
+class FiltroValoresEmCache(admin.AllValuesFieldListFilter):
+    """
+    Filtro lateral pelos valores distintos de um campo (ex.: tipo do
+    dispositivo) sem o SELECT DISTINCT a cada página.
+    """
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        valores = self.lookup_choices
+        self.lookup_choices = cache_modelos.obter(
+            'filtro_valores', (model,), lambda: list(valores), model._meta.label_lower, field_path,
+        )
+
+def _valor_exibido(campo, valor):
+    """
+    Valor de um campo do formulário como exibido ao usuário (rótulo das opções).
+    """
+    if valor is None:
+        return ''
+    if isinstance(campo, forms.ChoiceField) and not isinstance(campo, forms.ModelChoiceField):
+        return dict(campo.choices).get(valor, valor)
+    return valor
+
+class ChangeListExportacao(ChangeList):
+    """
+    ChangeList usada só para obter o queryset com os filtros da lista: sem o
+    COUNT(*) e sem a página de resultados que a listagem calcularia.
+    """
+    def get_results(self, request):
+        self.result_list = []
+
+# Histórico de status: somente leitura (gravado por Protocolo.save())
+class TransicaoStatusProtocoloInline(admin.TabularInline):
+    model = TransicaoStatusProtocolo
+    extra = 0
+    can_delete = False
+    fields = ('status_anterior', 'status_novo', 'autor', 'criado_em')
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('autor')
+
 @admin.register(Protocolo)
 class ProtocoloAdmin(admin.ModelAdmin):
     list_display = ('id', 'cliente', 'tecnico_responsavel', 'dispositivo', 'buic', 'descricao_curta', 'status', 'data_criacao')
-    list_filter = ('status', 'tecnico_responsavel', 'cliente', 'dispositivo__cliente')
+    list_filter = ('status', 'origem', ('tecnico_responsavel', FiltroRelacionadoEmCache),
+                   ('cliente', FiltroRelacionadoEmCache), ('dispositivo__cliente', FiltroRelacionadoEmCache))
     search_fields = ('id', 'cliente__nome', 'dispositivo__nome', 'buic', 'descricao')
     list_per_page = 25
     ordering = ('-id',)  # Ordenar pelos protocolos mais recentes primeiro
+    date_hierarchy = 'criado_em'
+    autocomplete_fields = ('cliente', 'dispositivo')
+    change_list_template = 'admin/suporte_app/protocolo/change_list.html'
+    # Leva a versão do protocolo exibido (controle de concorrência otimista)
+    form = ProtocoloAdminForm
     
-    inlines = [AtualizacaoProtocoloInline]
+    inlines = [AtualizacaoProtocoloInline, TransicaoStatusProtocoloInline]
     
     readonly_fields = ('id', 'tecnico_responsavel', 'data_criacao')
+
+    # Triagem em massa: o valor de cada ação vem dos campos extras da barra de ações
+    action_form = TriagemActionForm
+    actions = ['alterar_status', 'reatribuir', 'adicionar_atualizacao']
     
     # Remove os fieldsets fixos - vamos usar get_fieldsets dinâmico
 
@@ -37,13 +129,16 @@ class ProtocoloAdmin(admin.ModelAdmin):
         if obj:  # Editando protocolo existente
             return (
                 ('Informações do Protocolo', {
-                    'fields': ('id', 'cliente', 'tecnico_responsavel', 'dispositivo', 'buic'),
+                    'fields': ('id', 'cliente', 'tecnico_responsavel', 'dispositivo', 'buic', 'origem', 'incidente'),
                     'description': 'O ID e Técnico Responsável são preenchidos automaticamente.'
                 }),
                 ('Detalhes do Problema', {
-                    'fields': ('descricao', 'status'),
+                    'fields': ('descricao', 'status', 'versao_lida'),
                     'classes': ('wide',),
                 }),
+                ('SLA', {
+                    'fields': ('data_criacao', 'primeira_resposta_em', 'concluido_em'),
+                }),
                 ('Informações MQTT (Opcional)', {
                     'fields': ('topico_mqtt', 'payload_exemplo'),
                     'classes': ('collapse',),
@@ -70,17 +165,105 @@ class ProtocoloAdmin(admin.ModelAdmin):
         Torna o ID e tecnico_responsavel readonly sempre
         """
         if obj:  # Se está editando um protocolo existente
-            return ('id', 'tecnico_responsavel', 'data_criacao')
+            return ('id', 'tecnico_responsavel', 'data_criacao', 'origem', 'incidente',
+                    'primeira_resposta_em', 'concluido_em')
         return ('tecnico_responsavel',)  # Quando criando, só o técnico é readonly
 
     def save_model(self, request, obj, form, change):
         """
-        Automaticamente define o técnico responsável como o usuário logado
+        Automaticamente define o técnico responsável como o usuário logado.
+        Na edição, grava só se o protocolo não mudou desde que o formulário foi
+        aberto (compare-and-swap pela versão, sem travar a linha); se mudou, nada
+        do protocolo é gravado e response_change exibe o conflito. Atribuir o
+        técnico a um protocolo sem responsável também é uma alteração. As novas
+        atualizações da linha do tempo (inline) são gravadas de qualquer forma.
         """
-        if not obj.tecnico_responsavel_id:
+        atribuiu_tecnico = not obj.tecnico_responsavel_id
+        if atribuiu_tecnico:
             obj.tecnico_responsavel = request.user
+        obj.autor = request.user  # autor da transição de status
+        if change:
+            if not form.campos_alterados() and not atribuiu_tecnico:
+                return  # só a linha do tempo mudou: não há o que comparar
+            if form.cleaned_data.get('versao_lida') is not None:
+                obj.versao = form.cleaned_data['versao_lida']
+            try:
+                super().save_model(request, obj, form, change)
+            except ConflitoEdicao:
+                request._conflito_edicao = {'form': form}
+            return
         super().save_model(request, obj, form, change)
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if hasattr(request, '_conflito_edicao'):
+            request._conflito_edicao['formsets'] = formsets
+
+    def construct_change_message(self, request, form, formsets, add=False):
+        mensagem = super().construct_change_message(request, form, formsets, add)
+        if hasattr(request, '_conflito_edicao'):
+            # Os campos do protocolo não foram gravados: ficam só as alterações dos inlines
+            mensagem = [item for item in mensagem if not ('changed' in item and 'name' not in item['changed'])]
+        return mensagem
+
+    def response_change(self, request, obj):
+        if hasattr(request, '_conflito_edicao'):
+            return self.conflito_view(request, obj, **request._conflito_edicao)
+        return super().response_change(request, obj)
+
+    def conflito_view(self, request, obj, form, formsets=()):
+        """
+        Página de conflito (409): o que o usuário enviou e o que está gravado,
+        campo a campo (com o diff do texto), e um formulário para gravar a versão
+        do usuário sobre a atual.
+        """
+        atual = (
+            Protocolo.objects.select_related('cliente', 'dispositivo', 'tecnico_responsavel')
+            .filter(pk=obj.pk).first()
+        )
+        if atual is None:
+            raise Http404("Protocolo removido.")
+        diferencas = []
+        for nome in form.campos_alterados():
+            enviado, gravado = form.cleaned_data.get(nome), getattr(atual, nome)
+            if enviado == gravado:
+                continue
+            diff = None
+            if isinstance(enviado, str) and isinstance(gravado, str) and '\n' in enviado + gravado:
+                diff = '\n'.join(difflib.unified_diff(
+                    gravado.splitlines(), enviado.splitlines(), 'atual', 'sua versão', lineterm=''))
+            campo = form.fields[nome]
+            diferencas.append({
+                'campo': campo.label or nome,
+                'enviado': _valor_exibido(campo, enviado),
+                'gravado': _valor_exibido(campo, gravado),
+                'diff': diff,
+            })
+        # Reenvio: os campos do protocolo com a versão atual; as atualizações já foram gravadas
+        reenvio = [(nome, valor) for nome in form.fields if nome != 'versao_lida'
+                   for valor in request.POST.getlist(nome)]
+        reenvio.append(('versao_lida', atual.versao))
+        reenvio.append(('_continue', '1'))
+        for formset in formsets:
+            gestao = formset.management_form
+            reenvio += [(gestao.add_prefix('TOTAL_FORMS'), 0), (gestao.add_prefix('INITIAL_FORMS'), 0),
+                        (gestao.add_prefix('MIN_NUM_FORMS'), 0),
+                        (gestao.add_prefix('MAX_NUM_FORMS'), formset.max_num)]
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f'Conflito de edição no protocolo {atual.numero_protocolo}',
+            'protocolo': atual,
+            'diferencas': diferencas,
+            'reenvio': reenvio,
+            'ultima_alteracao': (
+                LogEntry.objects.filter(content_type=ContentType.objects.get_for_model(Protocolo),
+                                        object_id=str(atual.pk))
+                .select_related('user').order_by('-action_time').first()
+            ),
+        }
+        return TemplateResponse(request, 'admin/suporte_app/protocolo/conflito.html', context, status=409)
+
     def save_formset(self, request, form, formset, change):
         """
         Automaticamente define o técnico das atualizações como o usuário logado
@@ -103,41 +286,215 @@ class ProtocoloAdmin(admin.ModelAdmin):
 
     def data_criacao(self, obj):
         """
-        Exibe a data de criação do protocolo (baseada no primeiro registro de atualização)
+        Exibe a data de criação do protocolo (campo criado_em, sem consultas extras)
         """
-        primeira_atualizacao = obj.atualizacoes.first()
-        if primeira_atualizacao:
-            return primeira_atualizacao.data_atualizacao.strftime("%d/%m/%Y %H:%M")
+        if obj.criado_em:
+            return timezone.localtime(obj.criado_em).strftime("%d/%m/%Y %H:%M")
         return "N/A"
     data_criacao.short_description = "Data de Criação"
+    data_criacao.admin_order_field = 'criado_em'
 
     def get_queryset(self, request):
         """
         Otimiza as consultas incluindo relacionamentos
         """
         queryset = super().get_queryset(request)
-        return queryset.select_related('dispositivo', 'cliente', 'tecnico_responsavel', 'dispositivo__cliente').prefetch_related('atualizacoes')
+        return queryset.select_related('dispositivo', 'cliente', 'tecnico_responsavel', 'dispositivo__cliente')
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Usa o índice textual (descrição, BUIC, tópico MQTT, cliente, dispositivo e
+        atualizações) em vez de LIKE sobre as colunas de search_fields
+        """
+        if not search_term:
+            return queryset, False
+        return busca.filtrar(queryset, search_term), False
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        """
+        Carrega o cliente junto com cada dispositivo do select (usado no rótulo)
+        """
+        if db_field.name == 'dispositivo':
+            kwargs['queryset'] = Dispositivo.objects.com_cliente()
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_urls(self):
+        urls = [
+            path('exportar/<str:formato>/', self.admin_site.admin_view(self.exportar_view),
+                 name='suporte_app_protocolo_exportar'),
+        ]
+        return urls + super().get_urls()
+
+    def get_changelist(self, request, **kwargs):
+        if request.resolver_match is not None and request.resolver_match.url_name == 'suporte_app_protocolo_exportar':
+            return ChangeListExportacao
+        return super().get_changelist(request, **kwargs)
+
+    def exportar_view(self, request, formato):
+        """
+        Exporta (em stream) os protocolos da lista, com os filtros e a busca atuais
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        if formato not in exportacao.FORMATOS:
+            raise Http404
+        try:
+            protocolos = self.get_changelist_instance(request).queryset
+        except IncorrectLookupParameters:
+            return redirect('admin:suporte_app_protocolo_changelist')
+        resposta = StreamingHttpResponse(exportacao.exportar(protocolos, formato),
+                                         content_type=exportacao.FORMATOS[formato][0])
+        resposta['Content-Disposition'] = f'attachment; filename="{exportacao.nome_arquivo(formato)}"'
+        # Proxies (nginx) entregam os blocos assim que chegam, sem acumular o arquivo
+        resposta['X-Accel-Buffering'] = 'no'
+        return resposta
+
+    def _campo_da_acao(self, request, campo, mensagem):
+        """
+        Valor do campo extra da barra de ações, ou None (com aviso) se não informado
+        """
+        form = TriagemActionForm(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        if form.is_valid() and form.cleaned_data.get(campo):
+            return form.cleaned_data[campo]
+        self.message_user(request, mensagem, messages.WARNING)
+        return None
+
+    # As ações recebem o queryset da lista (com os filtros e o "selecionar todos")
+    # e o alteram com poucas consultas, sem carregar os protocolos
+    @admin.action(description="Alterar status dos selecionados", permissions=['change'])
+    def alterar_status(self, request, queryset):
+        status = self._campo_da_acao(request, 'status', "Escolha o novo status.")
+        if status:
+            total = triagem.alterar_status(queryset, status, request.user)
+            self.message_user(request, f"Status alterado em {total} protocolos.", messages.SUCCESS)
+
+    @admin.action(description="Reatribuir selecionados ao técnico", permissions=['change'])
+    def reatribuir(self, request, queryset):
+        tecnico = self._campo_da_acao(request, 'tecnico', "Escolha o técnico.")
+        if tecnico:
+            total = triagem.reatribuir(queryset, tecnico, request.user)
+            self.message_user(request, f"{total} protocolos reatribuídos a {tecnico}.", messages.SUCCESS)
+
+    @admin.action(description="Adicionar atualização aos selecionados", permissions=['change'])
+    def adicionar_atualizacao(self, request, queryset):
+        texto = self._campo_da_acao(request, 'texto', "Escreva o texto da atualização.")
+        if texto:
+            total = triagem.adicionar_atualizacao(queryset, texto, request.user)
+            self.message_user(request, f"Atualização adicionada a {total} protocolos.", messages.SUCCESS)
 
 @admin.register(Cliente)
 class ClienteAdmin(admin.ModelAdmin):
-    list_display = ('nome', 'email', 'telefone', 'quantidade_dispositivos')
+    list_display = ('nome', 'email', 'telefone', 'quantidade_dispositivos', 'dispositivos_online',
+                    'dispositivos_offline', 'protocolos_abertos')
     search_fields = ('nome', 'email')
     list_per_page = 50
-    
+
+    def get_queryset(self, request):
+        """
+        Calcula as contagens de todos os clientes da página em uma única consulta
+        """
+        queryset = super().get_queryset(request)
+        if _e_autocompletar(request):
+            return queryset  # o autocompletar só exibe o nome
+        return queryset.com_contagens()
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        No autocompletar, busca por prefixo de nome/e-mail usando os índices
+        """
+        if _e_autocompletar(request):
+            return autocompletar.filtrar_clientes(queryset, search_term), False
+        return super().get_search_results(request, queryset, search_term)
+
     def quantidade_dispositivos(self, obj):
         """
         Mostra a quantidade de dispositivos do cliente
         """
-        return obj.dispositivo_set.count()
+        return obj.quantidade_dispositivos
     quantidade_dispositivos.short_description = "Qtd. Dispositivos"
+    quantidade_dispositivos.admin_order_field = 'quantidade_dispositivos'
+
+    def dispositivos_online(self, obj):
+        return obj.dispositivos_online
+    dispositivos_online.short_description = "Online"
+    dispositivos_online.admin_order_field = 'dispositivos_online'
+
+    def dispositivos_offline(self, obj):
+        return obj.dispositivos_offline
+    dispositivos_offline.short_description = "Offline"
+    dispositivos_offline.admin_order_field = 'dispositivos_offline'
+
+    def protocolos_abertos(self, obj):
+        return obj.protocolos_abertos
+    protocolos_abertos.short_description = "Protocolos Abertos"
+    protocolos_abertos.admin_order_field = 'protocolos_abertos'
+
+@admin.register(AcessoCliente)
+class AcessoClienteAdmin(admin.ModelAdmin):
+    """
+    Clientes que cada usuário pode ver (ver suporte_app.escopo).
+    """
+    list_display = ('usuario', 'cliente')
+    search_fields = ('usuario__username', 'cliente__nome')
+    autocomplete_fields = ('usuario', 'cliente')
+    list_select_related = ('usuario', 'cliente')
+    list_per_page = 50
 
 @admin.register(Dispositivo)
 class DispositivoAdmin(admin.ModelAdmin):
-    list_display = ('nome', 'cliente', 'status_online', 'tipo', 'mac_address', 'localizacao')
-    list_filter = ('online', 'tipo', 'cliente')
-    search_fields = ('nome', 'cliente__nome', 'mac_address')
+    list_display = ('nome', 'cliente', 'status_online', 'tipo', 'mac_address', 'buic', 'localizacao')
+    list_filter = ('online', ('tipo', FiltroValoresEmCache), ('cliente', FiltroRelacionadoEmCache))
+    search_fields = ('nome', 'cliente__nome', 'mac_address', 'buic')
     list_per_page = 50
-    
+    list_select_related = ('cliente',)
+    change_list_template = 'admin/suporte_app/dispositivo/change_list.html'
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        No autocompletar, busca por prefixo de nome, MAC ou BUIC usando os índices
+        """
+        if _e_autocompletar(request):
+            return autocompletar.filtrar_dispositivos(queryset.select_related('cliente'), search_term), False
+        return super().get_search_results(request, queryset, search_term)
+
+    def get_urls(self):
+        urls = [
+            path('importar/', self.admin_site.admin_view(self.importar_view), name='suporte_app_dispositivo_importar'),
+        ]
+        return urls + super().get_urls()
+
+    def importar_view(self, request):
+        """
+        Importação em massa de clientes e dispositivos (CSV/JSONL) pelo admin
+        """
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        if request.method == 'POST':
+            form = ImportacaoDispositivosForm(request.POST, request.FILES)
+            if form.is_valid():
+                arquivo = importacao.abrir_texto(form.cleaned_data['arquivo'].file)
+                resultado = importacao.importar(importacao.ler_registros(arquivo, form.cleaned_data['formato']))
+                self.message_user(request, (
+                    f"{resultado.importados} dispositivos importados, {resultado.clientes_criados} clientes criados "
+                    f"em {resultado.segundos:.1f}s ({resultado.linhas_por_segundo:.0f} linhas/s)."
+                ), messages.SUCCESS)
+                for numero, mensagem in resultado.erros[:10]:
+                    self.message_user(request, f"Linha {numero}: {mensagem}", messages.WARNING)
+                if resultado.quantidade_erros > 10:
+                    self.message_user(request, f"... e mais {resultado.quantidade_erros - 10} linhas rejeitadas.",
+                                      messages.WARNING)
+                return redirect('admin:suporte_app_dispositivo_changelist')
+        else:
+            form = ImportacaoDispositivosForm()
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Importar dispositivos',
+            'form': form,
+        }
+        return render(request, 'admin/suporte_app/dispositivo/importar.html', context)
+
     def status_online(self, obj):
         """
         Exibe o status online com cores
@@ -148,6 +505,105 @@ class DispositivoAdmin(admin.ModelAdmin):
             return mark_safe('<span style="color: red; font-weight: bold;">● Offline</span>')
     status_online.short_description = "Status"
 
+@admin.register(Incidente)
+class IncidenteAdmin(admin.ModelAdmin):
+    list_display = ('id', 'cliente', 'status', 'criado_em', 'quantidade_protocolos')
+    list_filter = ('status',)
+    search_fields = ('cliente__nome', 'descricao')
+    list_per_page = 50
+    list_select_related = ('cliente',)
+    readonly_fields = ('criado_em',)
+
+    def get_queryset(self, request):
+        """
+        Conta os protocolos agrupados de todos os incidentes da página na mesma consulta
+        """
+        return super().get_queryset(request).annotate(quantidade_protocolos=Count('protocolos'))
+
+    def quantidade_protocolos(self, obj):
+        return obj.quantidade_protocolos
+    quantidade_protocolos.short_description = "Protocolos"
+    quantidade_protocolos.admin_order_field = 'quantidade_protocolos'
+
+# Arquivo de protocolos: somente leitura, consultado só por quem abre esta lista
+class AtualizacaoProtocoloArquivadaInline(admin.TabularInline):
+    model = AtualizacaoProtocoloArquivada
+    extra = 0
+    can_delete = False
+    fields = ('data_atualizacao', 'tecnico', 'texto')
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('tecnico')
+
+class TransicaoStatusArquivadaInline(TransicaoStatusProtocoloInline):
+    model = TransicaoStatusArquivada
+
+@admin.register(ProtocoloArquivado)
+class ProtocoloArquivadoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'cliente', 'tecnico_responsavel', 'dispositivo', 'criado_em', 'concluido_em', 'arquivado_em')
+    list_filter = ('origem',)
+    search_fields = ('=id', 'buic')
+    list_per_page = 25
+    list_select_related = ('cliente', 'tecnico_responsavel', 'dispositivo__cliente')
+    date_hierarchy = 'concluido_em'
+    # Sem COUNT(*) do arquivo inteiro a cada página
+    show_full_result_count = False
+    inlines = [AtualizacaoProtocoloArquivadaInline, TransicaoStatusArquivadaInline]
+    actions = ['restaurar']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def has_restaurar_permission(self, request):
+        return request.user.has_perm('suporte_app.add_protocolo')
+
+    @admin.action(description="Restaurar protocolos selecionados", permissions=['restaurar'])
+    def restaurar(self, request, queryset):
+        """
+        Devolve os protocolos (com atualizações e transições) às tabelas em uso
+        """
+        total = arquivamento.restaurar(list(queryset.values_list('pk', flat=True)))
+        self.message_user(request, f"{total} protocolos restaurados.", messages.SUCCESS)
+
+@admin.register(Tarefa)
+class TarefaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'nome', 'status', 'tentativas', 'executar_em', 'concluida_em', 'erro_curto')
+    list_filter = ('status', 'nome')
+    search_fields = ('=id', 'chave')
+    list_per_page = 50
+    show_full_result_count = False
+    readonly_fields = ('nome', 'argumentos', 'chave', 'status', 'tentativas', 'maximo_tentativas', 'executar_em',
+                       'criada_em', 'iniciada_em', 'concluida_em', 'trabalhador', 'erro')
+    actions = ['reexecutar']
+
+    def has_add_permission(self, request):
+        return False
+
+    def erro_curto(self, obj):
+        return obj.erro[:80]
+    erro_curto.short_description = "Último Erro"
+
+    @admin.action(description="Executar novamente", permissions=['change'])
+    def reexecutar(self, request, queryset):
+        """
+        Devolve à fila as tarefas que falharam, com novas tentativas
+        """
+        # Se já houver outra pendente com a mesma chave, ela faz o trabalho
+        pendentes = Tarefa.objects.filter(status='pendente', chave__isnull=False).values('chave')
+        total = queryset.filter(status='falhou').exclude(chave__in=pendentes).update(
+            status='pendente', tentativas=0, executar_em=timezone.now(), concluida_em=None)
+        self.message_user(request, f"{total} tarefas devolvidas à fila.", messages.SUCCESS)
+
 # Personalização do site admin
 admin.site.site_header = "Sistema de Suporte Beyond"
 admin.site.site_title = "Suporte Beyond"
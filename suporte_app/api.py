@@ -0,0 +1,309 @@
+"""
+API de leitura (JSON) de protocolos, dispositivos e clientes.
+
+* Paginação por cursor (keyset) sobre o id, do mais recente para o mais antigo:
+  cada página é um `WHERE id < cursor ORDER BY id DESC LIMIT n`, sem OFFSET nem
+  COUNT(*), então o custo é o mesmo na primeira ou na milésima página.
+* Seleção de campos com `?fields=id,status,cliente.nome`: apenas as colunas pedidas
+  são lidas e só os relacionamentos necessários entram no JOIN.
+* Protocolos arquivados só entram com `?arquivados=incluir` (quentes e arquivados,
+  intercalados pelo id) ou `?arquivados=somente`.
+
+A única escrita é a triagem em massa (POST api/protocolos/triagem/), que aplica
+as operações de suporte_app.triagem a uma lista de ids ou aos mesmos filtros da listagem.
+"""
+import heapq
+import json
+from datetime import datetime, time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import require_POST
+
+from . import triagem
+from .models import Cliente, Dispositivo, Protocolo, ProtocoloArquivado, STATUS_CHOICES
+
+POR_PAGINA = 50
+POR_PAGINA_MAXIMO = 500
+
+
+class ErroParametro(ValueError):
+    """
+    Parâmetro inválido na requisição (resulta em HTTP 400).
+    """
+
+
+class Recurso:
+    """
+    Descreve um modelo exposto pela API: campos públicos (nome na API -> caminho
+    no ORM), campos padrão e filtros aceitos.
+    """
+    model = None
+    # Modelo de arquivo com os mesmos campos (consultado só quando pedido)
+    model_arquivado = None
+    campos = {}
+    campos_padrao = ()
+    filtros = {}
+
+    def queryset(self):
+        return self.model.objects.order_by('-pk')
+
+    def querysets(self, arquivados):
+        """
+        Consultas a paginar conforme o parâmetro `arquivados`.
+        """
+        if not arquivados:
+            return [self.queryset()]
+        if self.model_arquivado is None or arquivados not in ('incluir', 'somente'):
+            raise ErroParametro("Valor inválido para 'arquivados'.")
+        arquivo = self.model_arquivado.objects.order_by('-pk')
+        return [arquivo] if arquivados == 'somente' else [self.queryset(), arquivo]
+
+    def caminhos(self, nomes):
+        desconhecidos = [nome for nome in nomes if nome not in self.campos]
+        if desconhecidos:
+            raise ErroParametro(f"Campos desconhecidos: {', '.join(desconhecidos)}")
+        return [self.campos[nome] for nome in nomes]
+
+    def filtrar(self, queryset, params):
+        for parametro, (lookup, conversor) in self.filtros.items():
+            valor = params.get(parametro)
+            if valor in (None, ''):
+                continue
+            try:
+                valor = conversor(valor)
+            except (TypeError, ValueError):
+                raise ErroParametro(f"Valor inválido para '{parametro}'.")
+            queryset = queryset.filter(**{lookup: valor})
+        return queryset
+
+
+def _booleano(valor):
+    if valor.lower() in ('1', 'true', 'sim'):
+        return True
+    if valor.lower() in ('0', 'false', 'nao', 'não'):
+        return False
+    raise ValueError(valor)
+
+
+def _data_hora(valor, fim_do_dia=False):
+    """
+    Aceita data (AAAA-MM-DD) ou data e hora ISO 8601.
+    """
+    data_hora = parse_datetime(valor)
+    if data_hora is None:
+        data = parse_date(valor)
+        if data is None:
+            raise ValueError(valor)
+        data_hora = datetime.combine(data, time.max if fim_do_dia else time.min)
+    if timezone.is_naive(data_hora):
+        data_hora = timezone.make_aware(data_hora)
+    return data_hora
+
+
+class RecursoProtocolo(Recurso):
+    model = Protocolo
+    model_arquivado = ProtocoloArquivado
+    campos = {
+        'id': 'id',
+        'status': 'status',
+        'descricao': 'descricao',
+        'buic': 'buic',
+        'topico_mqtt': 'topico_mqtt',
+        'criado_em': 'criado_em',
+        'versao': 'versao',
+        'cliente.id': 'cliente_id',
+        'cliente.nome': 'cliente__nome',
+        'cliente.email': 'cliente__email',
+        'dispositivo.id': 'dispositivo_id',
+        'dispositivo.nome': 'dispositivo__nome',
+        'dispositivo.mac_address': 'dispositivo__mac_address',
+        'dispositivo.online': 'dispositivo__online',
+        'tecnico.id': 'tecnico_responsavel_id',
+        'tecnico.username': 'tecnico_responsavel__username',
+    }
+    campos_padrao = ('id', 'status', 'criado_em', 'cliente.id', 'dispositivo.id', 'tecnico.id')
+    filtros = {
+        'status': ('status', str),
+        'tecnico': ('tecnico_responsavel_id', int),
+        'cliente': ('cliente_id', int),
+        'dispositivo': ('dispositivo_id', int),
+        'criado_de': ('criado_em__gte', _data_hora),
+        'criado_ate': ('criado_em__lte', lambda valor: _data_hora(valor, fim_do_dia=True)),
+    }
+
+
+class RecursoDispositivo(Recurso):
+    model = Dispositivo
+    campos = {
+        'id': 'id',
+        'nome': 'nome',
+        'tipo': 'tipo',
+        'mac_address': 'mac_address',
+        'buic': 'buic',
+        'topico_mqtt': 'topico_mqtt',
+        'localizacao': 'localizacao',
+        'online': 'online',
+        'cliente.id': 'cliente_id',
+        'cliente.nome': 'cliente__nome',
+    }
+    campos_padrao = ('id', 'nome', 'tipo', 'mac_address', 'online', 'cliente.id')
+    filtros = {
+        'cliente': ('cliente_id', int),
+        'tipo': ('tipo', str),
+        'online': ('online', _booleano),
+    }
+
+
+class RecursoCliente(Recurso):
+    model = Cliente
+    campos = {
+        'id': 'id',
+        'nome': 'nome',
+        'email': 'email',
+        'telefone': 'telefone',
+    }
+    campos_padrao = ('id', 'nome', 'email', 'telefone')
+
+
+def _aninhar(nomes, linha):
+    """
+    Converte {'cliente.nome': 'X'} em {'cliente': {'nome': 'X'}}.
+    """
+    resultado = {}
+    for nome, valor in zip(nomes, linha):
+        destino = resultado
+        *grupos, campo = nome.split('.')
+        for grupo in grupos:
+            destino = destino.setdefault(grupo, {})
+        destino[campo] = valor
+    return resultado
+
+
+def listar(request, recurso):
+    """
+    Página de resultados de um recurso. Parâmetros: fields, limit, cursor,
+    arquivados e os filtros do recurso. A resposta traz `next_cursor` (nulo na última página).
+    """
+    params = request.GET
+    try:
+        nomes = [nome.strip() for nome in params.get('fields', '').split(',') if nome.strip()]
+        nomes = nomes or list(recurso.campos_padrao)
+        caminhos = recurso.caminhos(nomes)
+        try:
+            limite = min(max(int(params.get('limit', POR_PAGINA)), 1), POR_PAGINA_MAXIMO)
+        except ValueError:
+            raise ErroParametro("Valor inválido para 'limit'.")
+
+        querysets = [recurso.filtrar(queryset, params) for queryset in recurso.querysets(params.get('arquivados'))]
+        if params.get('cursor'):
+            try:
+                cursor = int(params['cursor'])
+            except ValueError:
+                raise ErroParametro("Cursor inválido.")
+            querysets = [queryset.filter(pk__lt=cursor) for queryset in querysets]
+    except ErroParametro as erro:
+        return JsonResponse({'erro': str(erro)}, status=400)
+
+    # O id é sempre lido (último campo) para montar o cursor da próxima página. Com
+    # o arquivo, cada tabela devolve sua página e elas são intercaladas pelo id
+    # (os ids do arquivo são os dos protocolos originais, sem repetição).
+    paginas = [queryset.values_list(*caminhos, 'pk')[:limite + 1] for queryset in querysets]
+    if len(paginas) == 1:
+        linhas = list(paginas[0])
+    else:
+        linhas = list(heapq.merge(*paginas, key=lambda linha: linha[-1], reverse=True))[:limite + 1]
+    proximo_cursor = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo_cursor = str(linhas[-1][-1])
+
+    return JsonResponse({
+        'resultados': [_aninhar(nomes, linha[:-1]) for linha in linhas],
+        'next_cursor': proximo_cursor,
+    })
+
+
+@login_required
+def api_protocolos(request):
+    return listar(request, RecursoProtocolo())
+
+
+@login_required
+def api_dispositivos(request):
+    return listar(request, RecursoDispositivo())
+
+
+@login_required
+def api_clientes(request):
+    return listar(request, RecursoCliente())
+
+
+def _selecao_triagem(dados):
+    """
+    Protocolos da triagem: `ids` (lista) ou `filtros` (os da listagem de protocolos).
+    """
+    if dados.get('ids'):
+        ids = dados['ids']
+        if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+            raise ErroParametro("Valor inválido para 'ids'.")
+        return Protocolo.objects.filter(pk__in=ids)
+    filtros = dados.get('filtros')
+    if not filtros or not isinstance(filtros, dict):
+        # Sem seleção explícita nada é alterado (nunca "todos os protocolos")
+        raise ErroParametro("Informe 'ids' ou 'filtros'.")
+    recurso = RecursoProtocolo()
+    desconhecidos = [nome for nome in filtros if nome not in recurso.filtros]
+    if desconhecidos:
+        raise ErroParametro(f"Filtros desconhecidos: {', '.join(desconhecidos)}")
+    return recurso.filtrar(Protocolo.objects.all(), filtros)
+
+
+def _executar_triagem(dados, autor):
+    acao = dados.get('acao')
+    if acao == 'status':
+        status = dados.get('status')
+        if status not in dict(STATUS_CHOICES):
+            raise ErroParametro("Valor inválido para 'status'.")
+        return triagem.alterar_status(_selecao_triagem(dados), status, autor)
+    if acao == 'tecnico':
+        # null remove o técnico responsável
+        tecnico = None
+        if dados.get('tecnico') is not None:
+            if isinstance(dados['tecnico'], int):
+                tecnico = get_user_model().objects.filter(pk=dados['tecnico'], is_active=True).first()
+            if tecnico is None:
+                raise ErroParametro("Valor inválido para 'tecnico'.")
+        return triagem.reatribuir(_selecao_triagem(dados), tecnico, autor)
+    if acao == 'atualizacao':
+        texto = dados.get('texto')
+        if not isinstance(texto, str) or not texto.strip():
+            raise ErroParametro("Valor inválido para 'texto'.")
+        return triagem.adicionar_atualizacao(_selecao_triagem(dados), texto.strip(), autor)
+    raise ErroParametro("Valor inválido para 'acao'.")
+
+
+@login_required
+@require_POST
+def api_triagem_protocolos(request):
+    """
+    Triagem em massa. Corpo JSON: {"acao": "status" | "tecnico" | "atualizacao",
+    "ids": [...] ou "filtros": {...}, e "status", "tecnico" (id ou null) ou "texto"}.
+    Responde {"alterados": n}.
+    """
+    if not request.user.has_perm('suporte_app.change_protocolo'):
+        return JsonResponse({'erro': "Sem permissão para alterar protocolos."}, status=403)
+    try:
+        try:
+            dados = json.loads(request.body)
+        except ValueError:
+            raise ErroParametro("Corpo JSON inválido.")
+        if not isinstance(dados, dict):
+            raise ErroParametro("Corpo JSON inválido.")
+        alterados = _executar_triagem(dados, request.user)
+    except ErroParametro as erro:
+        return JsonResponse({'erro': str(erro)}, status=400)
+    return JsonResponse({'alterados': alterados})
@@ -0,0 +1,157 @@
+"""
+Arquivamento de protocolos concluídos.
+
+Protocolos concluídos há mais de N dias (ARQUIVAMENTO_DIAS) são movidos, com as
+atualizações e transições de status, para as tabelas ProtocoloArquivado,
+AtualizacaoProtocoloArquivada e TransicaoStatusArquivada, mantendo os ids. As
+tabelas quentes ficam só com o que está em uso, e o admin, a busca, as
+contagens e o painel deixam de percorrer o histórico antigo.
+
+* Lotes curtos: cada lote (ARQUIVAMENTO_LOTE protocolos) é copiado e removido
+  em uma transação própria, travando só as linhas do lote (SELECT ... FOR
+  UPDATE SKIP LOCKED onde suportado; linhas em edição ficam para a próxima vez).
+* Retomável: o que falta arquivar é sempre o que ainda está na tabela quente,
+  então uma execução interrompida é continuada pela próxima, sem estado extra.
+* Os contadores do painel (suporte_app.metricas) acompanham a tabela quente e
+  são ajustados como na exclusão; `restaurar` faz o caminho inverso.
+
+Tabelas arquivo foram preferidas a partições por data do PostgreSQL: funcionam
+em qualquer banco e não exigem a data na chave primária de Protocolo.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import busca, cache_modelos, metricas
+from .models import (
+    AtualizacaoProtocolo, AtualizacaoProtocoloArquivada, IndiceBuscaProtocolo, Protocolo, ProtocoloArquivado,
+    TransicaoStatusArquivada, TransicaoStatusProtocolo,
+)
+
+# Pares (modelo quente, modelo arquivo) das tabelas filhas, ligadas por protocolo_id
+FILHAS = (
+    (AtualizacaoProtocolo, AtualizacaoProtocoloArquivada),
+    (TransicaoStatusProtocolo, TransicaoStatusArquivada),
+)
+
+
+def _campos(modelo):
+    return [campo.attname for campo in modelo._meta.concrete_fields]
+
+
+def _copiar(origem, destino, filtro):
+    """
+    Copia as linhas de `origem` que casam com `filtro` para `destino` (mesmos
+    nomes de colunas), em lotes de inserção. Retorna a quantidade copiada.
+    """
+    linhas = list(origem.objects.filter(**filtro).order_by().values(*_campos(destino)))
+    objetos = destino.objects.bulk_create([destino(**linha) for linha in linhas], batch_size=500)
+    # Campos auto_now_add são sobrescritos na inserção: regrava os valores originais
+    automaticos = [campo.attname for campo in destino._meta.concrete_fields if getattr(campo, 'auto_now_add', False)]
+    if objetos and automaticos:
+        for objeto, linha in zip(objetos, linhas):
+            for campo in automaticos:
+                setattr(objeto, campo, linha[campo])
+        destino.objects.bulk_update(objetos, automaticos, batch_size=500)
+    return len(objetos)
+
+
+def _remover(queryset):
+    # Exclusão direta (sem o coletor do ORM nem sinais por linha): as linhas já
+    # foram copiadas e os contadores/índice são ajustados por quem chama
+    return queryset._raw_delete(queryset.db)
+
+
+def candidatos(dias=None, agora=None):
+    """
+    Protocolos concluídos há mais de `dias` dias (sem data de conclusão: pela abertura).
+    """
+    dias = settings.ARQUIVAMENTO_DIAS if dias is None else dias
+    limite = (agora or timezone.now()) - timedelta(days=dias)
+    return Protocolo.objects.filter(
+        Q(concluido_em__lt=limite) | Q(concluido_em__isnull=True, criado_em__lt=limite),
+        status='concluido',
+    )
+
+
+def arquivar_lote(ids, dias=None):
+    """
+    Move para o arquivo os protocolos `ids` que ainda são candidatos e não estão
+    travados por outra transação. Retorna a quantidade arquivada.
+    """
+    with transaction.atomic():
+        protocolos = list(
+            candidatos(dias).filter(pk__in=ids).select_for_update(skip_locked=True).order_by('pk')
+        )
+        if not protocolos:
+            return 0
+        ids = [protocolo.pk for protocolo in protocolos]
+        agora = timezone.now()
+        campos = [campo for campo in _campos(ProtocoloArquivado) if campo != 'arquivado_em']
+        ProtocoloArquivado.objects.bulk_create([
+            ProtocoloArquivado(**{campo: getattr(protocolo, campo) for campo in campos}, arquivado_em=agora)
+            for protocolo in protocolos
+        ])
+        for quente, arquivo in FILHAS:
+            _copiar(quente, arquivo, {'protocolo_id__in': ids})
+            _remover(quente.objects.filter(protocolo_id__in=ids))
+        _remover(IndiceBuscaProtocolo.objects.filter(protocolo_id__in=ids))
+        _remover(Protocolo.objects.filter(pk__in=ids))
+        metricas.contabilizar_protocolos(protocolos, sinal=-1)
+        # As remoções em massa não disparam o sinal que invalida o cache de referência
+        transaction.on_commit(lambda: cache_modelos.invalidar(Protocolo))
+    return len(protocolos)
+
+
+def arquivar(dias=None, tamanho_lote=None, pausa=0, maximo=None, progresso=None):
+    """
+    Arquiva todos os candidatos em lotes, do menor para o maior id. `pausa`
+    (segundos) entre lotes reduz a pressão sobre o banco; `maximo` limita o
+    total desta execução. `progresso(arquivados)` é chamado após cada lote.
+    Retorna a quantidade arquivada.
+    """
+    tamanho_lote = tamanho_lote or settings.ARQUIVAMENTO_LOTE
+    total = 0
+    ultimo_id = 0
+    while maximo is None or total < maximo:
+        quantidade = tamanho_lote if maximo is None else min(tamanho_lote, maximo - total)
+        ids = list(
+            candidatos(dias).filter(pk__gt=ultimo_id).order_by('pk').values_list('pk', flat=True)[:quantidade]
+        )
+        if not ids:
+            break
+        total += arquivar_lote(ids, dias)
+        ultimo_id = ids[-1]
+        if progresso:
+            progresso(total)
+        if pausa:
+            time.sleep(pausa)
+    return total
+
+
+def restaurar(ids):
+    """
+    Devolve os protocolos arquivados `ids` (com atualizações e transições) às
+    tabelas quentes. Retorna a quantidade restaurada.
+    """
+    with transaction.atomic():
+        arquivados = list(ProtocoloArquivado.objects.filter(pk__in=ids).select_for_update().order_by('pk'))
+        if not arquivados:
+            return 0
+        ids = [arquivado.pk for arquivado in arquivados]
+        campos = [campo for campo in _campos(ProtocoloArquivado) if campo != 'arquivado_em']
+        # bulk_create não passa por Protocolo.save(): a restauração não gera transições
+        protocolos = Protocolo.objects.bulk_create([
+            Protocolo(**{campo: getattr(arquivado, campo) for campo in campos}) for arquivado in arquivados
+        ])
+        for quente, arquivo in FILHAS:
+            _copiar(arquivo, quente, {'protocolo_id__in': ids})
+            _remover(arquivo.objects.filter(protocolo_id__in=ids))
+        _remover(ProtocoloArquivado.objects.filter(pk__in=ids))
+        busca.indexar(ids)
+        metricas.contabilizar_protocolos(protocolos, sinal=1)
+    return len(arquivados)
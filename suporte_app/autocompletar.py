@@ -0,0 +1,95 @@
+"""
+Consultas de autocompletar de clientes e dispositivos (formulário de protocolo e admin).
+
+As buscas são por prefixo sobre colunas normalizadas em maiúsculas, com índices
+funcionais (UPPER(nome)) ou únicos (e-mail, MAC e BUIC do dispositivo). O prefixo vira uma
+faixa `>= termo AND < próximo` além do LIKE, então o banco percorre só a faixa
+do índice em vez da tabela inteira.
+"""
+import re
+
+from django.db.models import Q
+from django.db.models.functions import Upper
+
+from . import cache_modelos
+from .models import Cliente, Dispositivo
+
+LIMITE = 20
+
+
+def _faixa(campo, prefixo):
+    """
+    Filtro de prefixo sobre `campo` que o banco resolve com uma faixa do índice.
+    """
+    if not prefixo:
+        return Q()
+    proximo = prefixo[:-1] + chr(ord(prefixo[-1]) + 1)
+    return Q(**{f'{campo}__gte': prefixo, f'{campo}__lt': proximo, f'{campo}__startswith': prefixo})
+
+
+def prefixo_mac(termo):
+    """
+    Converte o início de um MAC digitado em qualquer formato ("aa-bb-c", "AABBC")
+    para o formato gravado ("AA:BB:C"). Retorna None se não parecer um MAC.
+    """
+    digitos = re.sub(r'[:\-. ]', '', termo).upper()
+    if not digitos or len(digitos) > 12 or re.search(r'[^0-9A-F]', digitos):
+        return None
+    return ':'.join(digitos[i:i + 2] for i in range(0, len(digitos), 2))
+
+
+def filtrar_clientes(queryset, termo):
+    """
+    Restringe `queryset` aos clientes cujo nome ou e-mail começa com `termo`.
+    """
+    termo = termo.strip()
+    if not termo:
+        return queryset
+    return queryset.alias(nome_maiusculo=Upper('nome')).filter(
+        _faixa('nome_maiusculo', termo.upper()) | _faixa('email', termo.lower()))
+
+
+def filtrar_dispositivos(queryset, termo, cliente_id=None):
+    """
+    Restringe `queryset` aos dispositivos (do cliente, se informado) cujo nome,
+    MAC ou BUIC começa com `termo`.
+    """
+    if cliente_id is not None:
+        queryset = queryset.filter(cliente_id=cliente_id)
+    termo = termo.strip()
+    if not termo:
+        return queryset
+    condicao = _faixa('nome_maiusculo', termo.upper()) | _faixa('buic', termo.upper())
+    mac = prefixo_mac(termo)
+    if mac:
+        condicao |= _faixa('mac_address', mac)
+    return queryset.alias(nome_maiusculo=Upper('nome')).filter(condicao)
+
+
+def clientes(termo, limite=LIMITE):
+    """
+    Primeiros clientes, em ordem de nome, que casam com `termo`.
+    """
+    return filtrar_clientes(Cliente.objects.all(), termo).order_by('nome', 'pk')[:limite]
+
+
+def dispositivos(termo, cliente_id=None, limite=LIMITE):
+    """
+    Primeiros dispositivos, em ordem de nome, que casam com `termo`. Sem cliente,
+    o termo é obrigatório (não lista a frota inteira).
+    """
+    if cliente_id is None and not termo.strip():
+        return Dispositivo.objects.none()
+    return filtrar_dispositivos(Dispositivo.objects.all(), termo, cliente_id).order_by('nome', 'pk')[:limite]
+
+
+def dispositivos_do_cliente(cliente_id, limite=LIMITE):
+    """
+    [(id, nome, mac, online)] dos primeiros dispositivos do cliente (lista sem
+    termo, exibida ao escolher o cliente), do cache até algum dispositivo mudar.
+    """
+    return cache_modelos.obter(
+        'dispositivos_do_cliente', (Dispositivo,),
+        lambda: list(dispositivos('', cliente_id, limite).values_list('pk', 'nome', 'mac_address', 'online')),
+        cliente_id, limite,
+    )
@@ -0,0 +1,163 @@
+"""
+Benchmark das páginas principais sobre os dados do banco atual (ver o comando
+gerar_dados_sinteticos para montar bases de 10 mil a 1 milhão de protocolos).
+
+Cada cenário é requisitado várias vezes pelo cliente de testes do Django (sem
+servidor HTTP), medindo a latência e as consultas de cada requisição. O
+resultado (p50/p95/p99 em ms e consultas) é gravado em JSON e pode ser
+comparado com uma execução anterior para apontar regressões.
+"""
+import platform
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .instrumentacao import Medicao
+from .models import Cliente, Dispositivo, Protocolo, AtualizacaoProtocolo
+
+PERCENTIS = (50, 95, 99)
+
+# Diferença mínima (ms) para uma piora de latência contar como regressão (ruído de medição)
+DIFERENCA_MINIMA_MS = 2.0
+
+
+class Cenario:
+    """
+    Uma requisição medida. Requisições POST são desfeitas (rollback) a cada
+    iteração para não alterar a base entre as medições.
+    """
+
+    def __init__(self, nome, url, metodo='get', dados=None):
+        self.nome = nome
+        self.url = url
+        self.metodo = metodo
+        self.dados = dados or {}
+
+    def requisitar(self, cliente):
+        if self.metodo == 'get':
+            return cliente.get(self.url, self.dados)
+        with transaction.atomic():
+            resposta = cliente.post(self.url, self.dados)
+            transaction.set_rollback(True)
+        return resposta
+
+
+def montar_cenarios():
+    """
+    Cenários sobre registros reais da base (o protocolo mais recente e seu cliente).
+    """
+    protocolo = Protocolo.objects.select_related('dispositivo').order_by('-pk').first()
+    termo = 'dispositivo'
+    cenarios = [
+        Cenario('admin_protocolos', reverse('admin:suporte_app_protocolo_changelist')),
+        Cenario('admin_protocolos_busca', reverse('admin:suporte_app_protocolo_changelist'), dados={'q': termo}),
+        Cenario('admin_clientes', reverse('admin:suporte_app_cliente_changelist')),
+        Cenario('admin_dispositivos', reverse('admin:suporte_app_dispositivo_changelist')),
+        Cenario('gerar_protocolo_get', reverse('gerar_protocolo')),
+        Cenario('busca_protocolos', reverse('buscar_protocolos'), dados={'q': termo}),
+        Cenario('api_protocolos', reverse('api_protocolos')),
+    ]
+    if protocolo is not None:
+        cenarios += [
+            Cenario('admin_protocolo_edicao', reverse('admin:suporte_app_protocolo_change', args=[protocolo.pk])),
+            Cenario('protocolo_detalhe', reverse('protocolo_detalhe', args=[protocolo.pk])),
+            Cenario('gerar_protocolo_post', reverse('gerar_protocolo'), metodo='post', dados={
+                'cliente': protocolo.dispositivo.cliente_id,
+                'dispositivo': protocolo.dispositivo_id,
+                'descricao': "Protocolo de benchmark",
+                'status': 'aberto',
+                'atualizacoes-TOTAL_FORMS': '1',
+                'atualizacoes-INITIAL_FORMS': '0',
+                'atualizacoes-0-texto': "Primeira atualização",
+            }),
+        ]
+    return cenarios
+
+
+def percentil(valores, p):
+    """
+    Percentil pelo método do posto mais próximo.
+    """
+    ordenados = sorted(valores)
+    posto = max(-(-len(ordenados) * p // 100), 1)
+    return ordenados[posto - 1]
+
+
+def medir(cenario, cliente, iteracoes, aquecimento=2):
+    for _ in range(aquecimento):
+        cenario.requisitar(cliente)
+    tempos = []
+    consultas = []
+    status = set()
+    for _ in range(iteracoes):
+        medicao = Medicao()
+        inicio = time.perf_counter()
+        with medicao.ativa():
+            resposta = cenario.requisitar(cliente)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        consultas.append(medicao.consultas)
+        status.add(resposta.status_code)
+    resultado = {f'p{p}_ms': round(percentil(tempos, p), 3) for p in PERCENTIS}
+    resultado.update({
+        'media_ms': round(sum(tempos) / len(tempos), 3),
+        'consultas': max(consultas),
+        'status': sorted(status),
+        'iteracoes': iteracoes,
+    })
+    return resultado
+
+
+def executar(iteracoes=20, nomes=None, usuario=None):
+    """
+    Mede os cenários (todos ou os de `nomes`) e retorna o relatório em dicionário.
+    """
+    if usuario is None:
+        usuario, criado = User.objects.get_or_create(
+            username='benchmark', defaults={'is_staff': True, 'is_superuser': True})
+        if criado:
+            usuario.set_unusable_password()
+            usuario.save()
+    cliente = Client(raise_request_exception=False)
+    cliente.force_login(usuario)
+
+    resultados = {}
+    with override_settings(ALLOWED_HOSTS=['testserver'], INSTRUMENTACAO_ATIVA=False):
+        for cenario in montar_cenarios():
+            if nomes and cenario.nome not in nomes:
+                continue
+            resultados[cenario.nome] = medir(cenario, cliente, iteracoes)
+    return {
+        'gerado_em': timezone.now().isoformat(),
+        'banco': connection.vendor,
+        'python': platform.python_version(),
+        'linhas': {
+            'clientes': Cliente.objects.count(),
+            'dispositivos': Dispositivo.objects.count(),
+            'protocolos': Protocolo.objects.count(),
+            'atualizacoes': AtualizacaoProtocolo.objects.count(),
+        },
+        'cenarios': resultados,
+    }
+
+
+def comparar(atual, base, tolerancia=0.25):
+    """
+    Lista as regressões de `atual` em relação a `base`: p95 acima da tolerância
+    (relativa, com a diferença mínima de DIFERENCA_MINIMA_MS) ou mais consultas.
+    """
+    regressoes = []
+    for nome, medida in atual['cenarios'].items():
+        anterior = base.get('cenarios', {}).get(nome)
+        if anterior is None:
+            continue
+        limite = anterior['p95_ms'] * (1 + tolerancia)
+        if medida['p95_ms'] > limite and medida['p95_ms'] - anterior['p95_ms'] >= DIFERENCA_MINIMA_MS:
+            regressoes.append(f"{nome}: p95 {medida['p95_ms']:.1f} ms (base {anterior['p95_ms']:.1f} ms)")
+        if medida['consultas'] > anterior['consultas']:
+            regressoes.append(f"{nome}: {medida['consultas']} consultas (base {anterior['consultas']})")
+    return regressoes
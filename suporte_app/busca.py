@@ -0,0 +1,201 @@
+"""
+Busca textual de protocolos.
+
+O documento de cada protocolo fica em IndiceBuscaProtocolo e é indexado de acordo
+com o banco em uso:
+
+* PostgreSQL: índice GIN sobre to_tsvector('portuguese', documento), com stemming
+  em português e ranking por ts_rank;
+* SQLite: tabela virtual FTS5 (external content) mantida por triggers, com
+  ranking por bm25;
+* demais bancos: LIKE sobre o documento, sem ranking.
+
+O índice GIN e a tabela FTS5 com seus triggers são criados pela migração 0006.
+
+Um termo que identifica um dispositivo (MAC em qualquer formato, BUIC ou tópico
+MQTT; ver inventario.localizar) também traz todos os protocolos desse
+dispositivo, pela chave estrangeira indexada, à frente dos demais resultados.
+
+Com um escopo de clientes ativo (ver escopo.py), total e resultados contam só
+os protocolos desses clientes.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from . import escopo, inventario
+from .models import Protocolo, AtualizacaoProtocolo, IndiceBuscaProtocolo
+
+TABELA_INDICE = IndiceBuscaProtocolo._meta.db_table
+TABELA_FTS = 'suporte_app_protocolo_fts'
+
+# Quantidade de protocolos reindexados por lote
+TAMANHO_LOTE = 500
+
+
+def montar_documentos(protocolo_ids):
+    """
+    Monta o documento de busca dos protocolos informados com duas consultas:
+    uma para os protocolos (com cliente e dispositivo) e outra para as atualizações.
+    """
+    textos = {}
+    atualizacoes = (
+        AtualizacaoProtocolo.objects
+        .filter(protocolo_id__in=protocolo_ids)
+        .order_by('protocolo_id', 'data_atualizacao')
+        .values_list('protocolo_id', 'texto')
+    )
+    for protocolo_id, texto in atualizacoes:
+        textos.setdefault(protocolo_id, []).append(texto)
+
+    protocolos = (
+        Protocolo.objects
+        .filter(pk__in=protocolo_ids)
+        .order_by()
+        .values_list('pk', 'descricao', 'buic', 'topico_mqtt', 'cliente__nome', 'dispositivo__nome')
+    )
+    documentos = {}
+    for pk, *campos in protocolos:
+        partes = [campo for campo in campos if campo] + textos.get(pk, [])
+        documentos[pk] = "\n".join(partes)
+    return documentos
+
+
+def indexar(protocolo_ids):
+    """
+    Atualiza (upsert) o documento de busca dos protocolos informados.
+    """
+    protocolo_ids = list(protocolo_ids)
+    for inicio in range(0, len(protocolo_ids), TAMANHO_LOTE):
+        documentos = montar_documentos(protocolo_ids[inicio:inicio + TAMANHO_LOTE])
+        IndiceBuscaProtocolo.objects.bulk_create(
+            [IndiceBuscaProtocolo(protocolo_id=pk, documento=doc) for pk, doc in documentos.items()],
+            update_conflicts=True,
+            unique_fields=['protocolo'],
+            update_fields=['documento'],
+        )
+
+
+def reindexar_tudo(tamanho_lote=TAMANHO_LOTE):
+    """
+    Reconstrói o índice de todos os protocolos, percorrendo-os por faixas de id.
+    Retorna a quantidade de protocolos indexados.
+    """
+    total = 0
+    ultimo_id = 0
+    while True:
+        ids = list(
+            Protocolo.objects.filter(pk__gt=ultimo_id).order_by('pk').values_list('pk', flat=True)[:tamanho_lote]
+        )
+        if not ids:
+            return total
+        indexar(ids)
+        total += len(ids)
+        ultimo_id = ids[-1]
+
+
+def consulta_fts5(termo):
+    """
+    Converte o termo digitado em uma consulta FTS5 segura: cada palavra vira um
+    prefixo entre aspas, combinadas com AND implícito.
+    """
+    palavras = re.findall(r'\w+', termo)
+    return " ".join('"%s"*' % palavra for palavra in palavras)
+
+
+def _dispositivo_do_termo(termo):
+    """
+    Id do dispositivo identificado pelo termo (uma palavra só, sem espaços) ou None.
+    """
+    termo = termo.strip()
+    if not termo or len(termo) > 100 or re.search(r'\s', termo):
+        return None
+    return inventario.localizar(termo)
+
+
+def _sql_correspondencias(termo):
+    """
+    Retorna (sql, params) que seleciona (protocolo_id, rank) dos protocolos que
+    correspondem ao termo, do mais relevante para o menos relevante.
+    """
+    sql, params = _sql_texto(termo)
+    dispositivo_id = _dispositivo_do_termo(termo)
+    if dispositivo_id is None:
+        return sql, params
+    # Protocolos do dispositivo com o maior rank, sem repetir os que também casam no texto
+    return (
+        f"SELECT protocolo_id, MAX(rank) AS rank FROM ("
+        f"SELECT id AS protocolo_id, 1000000.0 AS rank FROM {Protocolo._meta.db_table} WHERE dispositivo_id = %s "
+        f"UNION ALL {sql}) todas GROUP BY protocolo_id",
+        [dispositivo_id] + params,
+    )
+
+
+def _sql_texto(termo):
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        return (
+            f"SELECT protocolo_id, ts_rank(to_tsvector('portuguese', documento), consulta) AS rank "
+            f"FROM {TABELA_INDICE}, websearch_to_tsquery('portuguese', %s) consulta "
+            f"WHERE to_tsvector('portuguese', documento) @@ consulta",
+            [termo],
+        )
+    if vendor == 'sqlite':
+        # bm25 retorna valores menores para os documentos mais relevantes
+        return (
+            f"SELECT rowid AS protocolo_id, -bm25({TABELA_FTS}) AS rank "
+            f"FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s",
+            [consulta_fts5(termo)],
+        )
+    return (
+        f"SELECT protocolo_id, 0 AS rank FROM {TABELA_INDICE} WHERE documento LIKE %s",
+        [f"%{termo}%"],
+    )
+
+
+def termo_valido(termo):
+    return bool(re.search(r'\w', termo or ''))
+
+
+def filtrar(queryset, termo):
+    """
+    Restringe um queryset de Protocolo aos protocolos que correspondem ao termo.
+    Um termo numérico também encontra o protocolo com aquele id.
+    """
+    if not termo_valido(termo):
+        return queryset.none()
+    sql, params = _sql_correspondencias(termo)
+    condicao = Q(pk__in=RawSQL(f"SELECT protocolo_id FROM ({sql}) correspondencias", params))
+    if termo.strip().isdigit():
+        condicao |= Q(pk=int(termo.strip()))
+    return queryset.filter(condicao)
+
+
+def buscar(termo, limite=20, deslocamento=0):
+    """
+    Busca ranqueada. Retorna (total, [(protocolo_id, rank), ...]) da página pedida.
+    """
+    if not termo_valido(termo):
+        return 0, []
+    sql, params = _sql_correspondencias(termo)
+    clientes = escopo.clientes_ativos()
+    if clientes is not None:
+        if not clientes:
+            return 0, []
+        sql, params = (
+            f"SELECT encontrados.protocolo_id, encontrados.rank FROM ({sql}) encontrados "
+            f"INNER JOIN {Protocolo._meta.db_table} protocolo ON protocolo.id = encontrados.protocolo_id "
+            f"WHERE protocolo.cliente_id IN ({', '.join(['%s'] * len(clientes))})",
+            params + sorted(clientes),
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM ({sql}) correspondencias", params)
+        total = cursor.fetchone()[0]
+        cursor.execute(
+            f"SELECT protocolo_id, rank FROM ({sql}) correspondencias "
+            f"ORDER BY rank DESC, protocolo_id DESC LIMIT %s OFFSET %s",
+            params + [limite, deslocamento],
+        )
+        return total, [(pk, float(rank)) for pk, rank in cursor.fetchall()]
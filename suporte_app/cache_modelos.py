@@ -0,0 +1,150 @@
+"""
+Cache de dados de referência e de fragmentos renderizados, com chaves
+versionadas por modelo.
+
+Cada modelo registrado (Cliente, Dispositivo, Protocolo e o usuário) tem um
+número de versão no cache. Um valor guardado com `obter(nome, modelos, ...)`
+leva na chave as versões dos modelos de que depende; gravar ou remover uma
+instância incrementa a versão do modelo (sinais post_save/post_delete, e
+`invalidar` nos caminhos em massa que não disparam sinais), então as chaves
+antigas simplesmente deixam de ser lidas e expiram sozinhas. Não há varredura
+nem remoção de chaves.
+
+Usos: escolhas dos filtros laterais do admin (FiltroRelacionadoEmCache e
+FiltroValoresEmCache), dispositivos de um cliente no autocompletar e
+fragmentos de templates ({% fragmento_em_cache %}, ver templatetags/fragmentos.py).
+
+O backend é o CACHES['default'] (memória local do processo por padrão; com
+vários processos use um cache compartilhado, como Redis ou Memcached, para que
+a invalidação valha para todos). Os valores são guardados por escopo de
+clientes (ver escopo.py): usuários restritos a clientes diferentes não
+compartilham entradas. Acertos e falhas por nome ficam em
+`estatisticas` e são exportados no /metrics.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import escopo
+
+_AUSENTE = object()
+
+
+def _rotulo(modelo):
+    return modelo if isinstance(modelo, str) else modelo._meta.label_lower
+
+
+def _chave_versao(modelo):
+    return f"versao:{_rotulo(modelo).lower()}"
+
+
+def _versao_inicial():
+    # Baseada no relógio: se a versão sair do cache, a nova não coincide com uma anterior
+    return time.time_ns() // 1000
+
+
+def versoes(*modelos):
+    """
+    Versões atuais dos modelos (classes ou rótulos 'app.modelo'), em uma leitura do cache.
+    """
+    chaves = [_chave_versao(modelo) for modelo in modelos]
+    atuais = cache.get_many(chaves)
+    for chave in chaves:
+        if chave not in atuais:
+            cache.add(chave, _versao_inicial(), None)
+            atuais[chave] = cache.get(chave)
+    return tuple(atuais[chave] for chave in chaves)
+
+
+def invalidar(*modelos):
+    """
+    Descarta tudo o que foi guardado dependendo dos modelos (nova versão de chave).
+    """
+    for modelo in modelos:
+        chave = _chave_versao(modelo)
+        try:
+            cache.incr(chave)
+        except ValueError:
+            cache.set(chave, _versao_inicial(), None)
+
+
+class Estatisticas:
+    """
+    Acertos e falhas por nome de valor em cache, no processo atual.
+    """
+
+    def __init__(self):
+        self.trava = threading.Lock()
+        self.contagens = {}
+
+    def registrar(self, nome, acerto):
+        with self.trava:
+            contagem = self.contagens.setdefault(nome, [0, 0])
+            contagem[0 if acerto else 1] += 1
+
+    def taxa_acerto(self, nome):
+        with self.trava:
+            acertos, falhas = self.contagens.get(nome, (0, 0))
+        return acertos / (acertos + falhas) if acertos + falhas else 0.0
+
+    def resumo(self):
+        """
+        {nome: {'acertos', 'falhas', 'taxa_acerto'}}
+        """
+        with self.trava:
+            contagens = {nome: tuple(contagem) for nome, contagem in self.contagens.items()}
+        return {
+            nome: {'acertos': acertos, 'falhas': falhas, 'taxa_acerto': acertos / (acertos + falhas)}
+            for nome, (acertos, falhas) in sorted(contagens.items())
+        }
+
+    def limpar(self):
+        with self.trava:
+            self.contagens.clear()
+
+    def exportar(self):
+        """
+        Texto no formato de exposição do Prometheus.
+        """
+        resumo = self.resumo()
+        linhas = [
+            '# HELP suporte_cache_consultas_total Leituras do cache de dados de referência e fragmentos.',
+            '# TYPE suporte_cache_consultas_total counter',
+        ]
+        for nome, dados in resumo.items():
+            linhas.append(f'suporte_cache_consultas_total{{nome="{nome}",resultado="acerto"}} {dados["acertos"]}')
+            linhas.append(f'suporte_cache_consultas_total{{nome="{nome}",resultado="falha"}} {dados["falhas"]}')
+        linhas += [
+            '# HELP suporte_cache_taxa_acerto Fração das leituras atendidas pelo cache.',
+            '# TYPE suporte_cache_taxa_acerto gauge',
+        ]
+        for nome, dados in resumo.items():
+            linhas.append(f'suporte_cache_taxa_acerto{{nome="{nome}"}} {dados["taxa_acerto"]:.4f}')
+        return '\n'.join(linhas) + '\n'
+
+
+estatisticas = Estatisticas()
+
+
+def chave(nome, modelos, *partes):
+    versao = '.'.join(str(numero) for numero in versoes(*modelos))
+    # As partes (ex.: a query string de um fragmento) e o escopo entram com hash: chave curta e sem espaços
+    variacao = hashlib.md5(repr((escopo.chave(), partes)).encode('utf-8')).hexdigest()
+    return f"referencia:{nome}:{versao}:{variacao}"
+
+
+def obter(nome, modelos, calcular, *partes, segundos=None):
+    """
+    Valor guardado para (nome, partes) com as versões atuais de `modelos`, ou o
+    resultado de `calcular()`, que é guardado (deve ser serializável).
+    """
+    chave_valor = chave(nome, modelos, *partes)
+    valor = cache.get(chave_valor, _AUSENTE)
+    estatisticas.registrar(nome, valor is not _AUSENTE)
+    if valor is _AUSENTE:
+        valor = calcular()
+        cache.set(chave_valor, valor, settings.CACHE_REFERENCIA_SEGUNDOS if segundos is None else segundos)
+    return valor
@@ -0,0 +1,119 @@
+"""
+Escopo por cliente: cada usuário só lê os clientes a que tem acesso.
+
+* Os acessos ficam em AcessoCliente (usuário -> cliente). Superusuários e
+  membros da equipe sem nenhum acesso cadastrado veem todos os clientes; os
+  demais usuários (ex.: o portal do cliente) veem só os seus, e sem acessos
+  não veem nenhum.
+* EscopoClienteMiddleware define os clientes permitidos durante a requisição
+  (uma ContextVar, válida também nas views assíncronas). O manager padrão de
+  Cliente, Dispositivo, Incidente, Protocolo e ProtocoloArquivado
+  (EscopoClienteManager) filtra por eles: `WHERE cliente_id IN (...)`, coberto pelos índices que
+  começam por cliente. O _base_manager (chaves estrangeiras, gravações) e o
+  código fora de requisições (comandos, fila de tarefas, ingestão) não são
+  filtrados.
+* A lista de clientes permitidos é guardada na sessão, com a versão de
+  AcessoCliente no cache (cache_modelos): só a primeira requisição da sessão,
+  ou a primeira depois de uma mudança nos acessos, consulta o banco.
+* Valores em cache que dependem dos dados (cache_modelos.obter, fragmentos)
+  levam o escopo na chave; o autocompletar em cache varia pelo cookie.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+CHAVE_SESSAO = 'escopo_clientes'
+
+_clientes = contextvars.ContextVar('escopo_clientes', default=None)
+
+
+def clientes_ativos():
+    """
+    frozenset dos ids de clientes permitidos no contexto atual, ou None (sem restrição).
+    """
+    return _clientes.get()
+
+
+def chave():
+    """
+    Representação estável do escopo atual, para chaves de cache.
+    """
+    clientes = _clientes.get()
+    return None if clientes is None else tuple(sorted(clientes))
+
+
+@contextmanager
+def limitar_a_clientes(clientes):
+    """
+    Restringe as leituras do bloco aos clientes informados (None: sem restrição).
+    """
+    token = _clientes.set(None if clientes is None else frozenset(clientes))
+    try:
+        yield
+    finally:
+        _clientes.reset(token)
+
+
+def sem_escopo():
+    return limitar_a_clientes(None)
+
+
+def clientes_do_usuario(usuario):
+    """
+    Ids dos clientes permitidos ao usuário (frozenset), ou None se ele vê todos.
+    """
+    # Importado aqui: models depende deste módulo
+    from .models import AcessoCliente
+
+    if not usuario.is_authenticated or usuario.is_superuser:
+        return None
+    clientes = frozenset(AcessoCliente.objects.filter(usuario=usuario).values_list('cliente_id', flat=True))
+    if not clientes and usuario.is_staff:
+        return None
+    return clientes
+
+
+def clientes_da_sessao(request):
+    """
+    clientes_do_usuario(request.user), guardado na sessão enquanto os acessos
+    (e o usuário) não mudarem.
+    """
+    # Importado aqui: cache_modelos depende deste módulo
+    from . import cache_modelos
+
+    usuario = request.user
+    if not usuario.is_authenticated or usuario.is_superuser:
+        return None
+    marca = [usuario.pk, usuario.is_staff, *cache_modelos.versoes('suporte_app.acessocliente')]
+    guardado = request.session.get(CHAVE_SESSAO)
+    if guardado is not None and guardado['marca'] == marca:
+        clientes = guardado['clientes']
+        return None if clientes is None else frozenset(clientes)
+    clientes = clientes_do_usuario(usuario)
+    request.session[CHAVE_SESSAO] = {'marca': marca, 'clientes': None if clientes is None else sorted(clientes)}
+    return clientes
+
+
+class EscopoClienteMiddleware:
+    """
+    Deve vir depois do AuthenticationMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with limitar_a_clientes(clientes_da_sessao(request)):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        clientes = await sync_to_async(clientes_da_sessao)(request)
+        with limitar_a_clientes(clientes):
+            return await self.get_response(request)
@@ -0,0 +1,203 @@
+"""
+Abertura automática de protocolos a partir das transições de estado dos dispositivos.
+
+Cada lote de transições (ver IngestorStatus.ao_gravar) é tratado com poucas
+consultas, independentemente do tamanho:
+
+* queda de um dispositivo que já tem protocolo em aberto (de qualquer data)
+  vira uma AtualizacaoProtocolo nesse protocolo (sem novo protocolo);
+* as demais quedas abrem protocolos novos com um único bulk_create;
+* quando um cliente acumula, dentro da janela, `limiar_incidente` ou mais
+  protocolos automáticos, eles são agrupados em um Incidente do cliente (a
+  janela só limita esse agrupamento);
+* a volta de um dispositivo só registra uma atualização no protocolo em aberto.
+
+bulk_create não dispara os sinais dos modelos: o índice de busca, os contadores
+do painel, o cache de referência e os eventos em tempo real são atualizados
+aqui, como os sinais fariam.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import busca, cache_modelos, metricas, tempo_real
+from .models import Dispositivo, Protocolo, AtualizacaoProtocolo, Incidente, STATUS_ABERTOS
+
+TAMANHO_LOTE = 2000
+
+
+class ResultadoEventos:
+
+    def __init__(self):
+        self.protocolos_criados = 0
+        self.atualizacoes_criadas = 0
+        self.incidentes_criados = 0
+
+
+def _formatar(instante):
+    return timezone.localtime(instante).strftime("%d/%m/%Y %H:%M:%S")
+
+
+def _protocolos_abertos(dispositivo_ids):
+    """
+    Retorna {dispositivo_id: protocolo_id} do protocolo em aberto mais recente de
+    cada dispositivo (índice parcial protocolo_abertos_disp_idx).
+    """
+    abertos = (
+        Protocolo.objects
+        .filter(dispositivo_id__in=dispositivo_ids, status__in=STATUS_ABERTOS)
+        .order_by('dispositivo_id', 'criado_em', 'pk')
+        .values_list('dispositivo_id', 'pk')
+    )
+    # Ordenado por data: o último de cada dispositivo prevalece
+    return dict(abertos)
+
+
+def _agrupar_em_incidentes(cliente_ids, limite, limiar, agora, resultado):
+    """
+    Agrupa em um incidente os protocolos automáticos recentes dos clientes que
+    atingiram o limiar de quedas dentro da janela.
+    """
+    recentes = (
+        Protocolo.objects
+        .filter(cliente_id__in=cliente_ids, origem='automatico', status__in=STATUS_ABERTOS, criado_em__gte=limite)
+        .order_by()
+        .values('cliente_id')
+        .annotate(total=Count('pk'))
+        .filter(total__gte=limiar)
+        .values_list('cliente_id', 'total')
+    )
+    em_surto = dict(recentes)
+    if not em_surto:
+        return
+
+    incidentes = dict(
+        Incidente.objects
+        .filter(cliente_id__in=em_surto, status__in=STATUS_ABERTOS, criado_em__gte=limite)
+        .order_by('cliente_id', 'criado_em')
+        .values_list('cliente_id', 'pk')
+    )
+    novos = [
+        Incidente(cliente_id=cliente_id, criado_em=agora,
+                  descricao=f"Queda simultânea de vários dispositivos do cliente (a partir de {_formatar(agora)}).")
+        for cliente_id in em_surto if cliente_id not in incidentes
+    ]
+    if novos:
+        Incidente.objects.bulk_create(novos)
+        resultado.incidentes_criados += len(novos)
+        incidentes.update(
+            Incidente.objects
+            .filter(cliente_id__in=[incidente.cliente_id for incidente in novos], criado_em=agora)
+            .values_list('cliente_id', 'pk')
+        )
+    for cliente_id, incidente_id in incidentes.items():
+        Protocolo.objects.filter(
+            cliente_id=cliente_id, origem='automatico', status__in=STATUS_ABERTOS,
+            criado_em__gte=limite, incidente__isnull=True,
+        ).update(incidente_id=incidente_id)
+
+
+def _publicar(novos, atualizacoes):
+    """
+    Publica após o commit os eventos dos protocolos abertos e das atualizações.
+    """
+    if not tempo_real.barramento().tem_assinantes():
+        return
+    eventos = [tempo_real.evento_protocolo('protocolo_criado', protocolo) for protocolo in novos]
+    if atualizacoes:
+        protocolos = (
+            Protocolo.objects.only('cliente_id', 'tecnico_responsavel_id', 'status')
+            .in_bulk({atualizacao.protocolo_id for atualizacao in atualizacoes})
+        )
+        eventos += [
+            tempo_real.evento_protocolo('atualizacao_criada', protocolos[atualizacao.protocolo_id],
+                                        atualizacao_id=atualizacao.pk, texto=atualizacao.texto[:200])
+            for atualizacao in atualizacoes if atualizacao.protocolo_id in protocolos
+        ]
+
+    def publicar():
+        barramento = tempo_real.barramento()
+        for evento in eventos:
+            barramento.publicar(evento)
+    transaction.on_commit(publicar)
+
+
+def _processar_lote(transicoes, janela, limiar, resultado):
+    agora = timezone.now()
+    limite = agora - janela
+    quedas = {dispositivo_id: instante for dispositivo_id, anterior, online, instante in transicoes
+              if online is False and anterior is not False}
+    retornos = {dispositivo_id: instante for dispositivo_id, anterior, online, instante in transicoes
+                if online is True and anterior is False}
+
+    dispositivos = {
+        pk: (cliente_id, nome)
+        for pk, cliente_id, nome in Dispositivo.objects.filter(pk__in=list(quedas) + list(retornos))
+        .order_by().values_list('pk', 'cliente_id', 'nome')
+    }
+    abertos = _protocolos_abertos(list(dispositivos))
+
+    atualizacoes = []
+    novos = []
+    for dispositivo_id, instante in quedas.items():
+        if dispositivo_id not in dispositivos:
+            continue
+        texto = f"Dispositivo ficou offline em {_formatar(instante)} (detectado automaticamente)."
+        if dispositivo_id in abertos:
+            atualizacoes.append(AtualizacaoProtocolo(protocolo_id=abertos[dispositivo_id], texto=texto))
+        else:
+            cliente_id, nome = dispositivos[dispositivo_id]
+            novos.append(Protocolo(
+                dispositivo_id=dispositivo_id, cliente_id=cliente_id, origem='automatico', criado_em=agora,
+                descricao=f"Dispositivo {nome} ficou offline em {_formatar(instante)}.",
+            ))
+    for dispositivo_id, instante in retornos.items():
+        if dispositivo_id in abertos:
+            atualizacoes.append(AtualizacaoProtocolo(
+                protocolo_id=abertos[dispositivo_id],
+                texto=f"Dispositivo voltou a ficar online em {_formatar(instante)}.",
+            ))
+
+    with transaction.atomic():
+        Protocolo.objects.bulk_create(novos)
+        if any(protocolo.pk is None for protocolo in novos):
+            # Bancos sem RETURNING no INSERT em massa não preenchem o pk
+            ids = dict(Protocolo.objects.filter(
+                dispositivo_id__in=[protocolo.dispositivo_id for protocolo in novos], origem='automatico',
+                criado_em=agora,
+            ).values_list('dispositivo_id', 'pk'))
+            for protocolo in novos:
+                protocolo.pk = ids.get(protocolo.dispositivo_id)
+        AtualizacaoProtocolo.objects.bulk_create(atualizacoes)
+        if novos:
+            _agrupar_em_incidentes({protocolo.cliente_id for protocolo in novos}, limite, limiar, agora, resultado)
+
+        # O que os sinais fariam em gravações individuais
+        metricas.contabilizar_protocolos(novos)
+        busca.indexar({protocolo.pk for protocolo in novos}
+                      | {atualizacao.protocolo_id for atualizacao in atualizacoes})
+        if novos or atualizacoes:
+            transaction.on_commit(lambda: cache_modelos.invalidar(Protocolo))
+        _publicar(novos, atualizacoes)
+
+    resultado.protocolos_criados += len(novos)
+    resultado.atualizacoes_criadas += len(atualizacoes)
+
+
+def processar_transicoes(transicoes, janela=None, limiar_incidente=None):
+    """
+    Abre ou atualiza protocolos a partir de transições
+    [(dispositivo_id, online_anterior, online_atual, instante)].
+    """
+    if janela is None:
+        janela = timedelta(minutes=settings.PROTOCOLO_AUTOMATICO_JANELA_MINUTOS)
+    if limiar_incidente is None:
+        limiar_incidente = settings.PROTOCOLO_AUTOMATICO_LIMIAR_INCIDENTE
+    resultado = ResultadoEventos()
+    transicoes = list(transicoes)
+    for inicio in range(0, len(transicoes), TAMANHO_LOTE):
+        _processar_lote(transicoes[inicio:inicio + TAMANHO_LOTE], janela, limiar_incidente, resultado)
+    return resultado
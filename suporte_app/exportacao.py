@@ -0,0 +1,221 @@
+"""
+Exportação de protocolos com a linha do tempo de atualizações (CSV ou XLSX).
+
+O resultado é gerado como stream, em memória constante, qualquer que seja o
+período exportado:
+
+* os protocolos são lidos com um único SELECT (cliente, dispositivo e técnico
+  no mesmo JOIN, só as colunas exportadas) percorrido com
+  QuerySet.iterator(chunk_size=TAMANHO_LOTE), sem carregar o resultado inteiro;
+* as atualizações são buscadas por lote de protocolos (uma consulta por lote) e
+  agregadas em uma célula por protocolo;
+* cada linha é entregue assim que o lote é lido, então o download começa na
+  hora (StreamingHttpResponse no admin, arquivo no comando exportar_protocolos).
+
+O XLSX é escrito diretamente (um ZIP com a planilha em XML, gravado em stream),
+sem dependências extras.
+"""
+import csv
+import re
+import zipfile
+from itertools import groupby, islice
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from .models import AtualizacaoProtocolo, STATUS_CHOICES
+
+TAMANHO_LOTE = 2000
+
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+# Nome no cabeçalho -> caminho no ORM (as atualizações entram por último)
+COLUNAS = (
+    ('Protocolo', 'id'),
+    ('Status', 'status'),
+    ('Criado em', 'criado_em'),
+    ('Primeira resposta', 'primeira_resposta_em'),
+    ('Concluído em', 'concluido_em'),
+    ('Cliente', 'cliente__nome'),
+    ('E-mail do cliente', 'cliente__email'),
+    ('Dispositivo', 'dispositivo__nome'),
+    ('MAC', 'dispositivo__mac_address'),
+    ('BUIC', 'buic'),
+    ('Técnico', 'tecnico_responsavel__username'),
+    ('Descrição', 'descricao'),
+)
+CABECALHO = [nome for nome, _ in COLUNAS] + ['Atualizações', 'Linha do tempo']
+
+STATUS = dict(STATUS_CHOICES)
+
+# Limite de caracteres de uma célula do Excel
+LIMITE_CELULA = 32767
+
+
+def _data_hora(valor):
+    return timezone.localtime(valor).strftime("%d/%m/%Y %H:%M") if valor else ''
+
+
+def _linha_do_tempo(atualizacoes):
+    """
+    Uma linha por atualização: "dd/mm/aaaa hh:mm técnico: texto".
+    """
+    texto = '\n'.join(
+        f"{_data_hora(data)} {tecnico or 'sem técnico'}: {conteudo}" for _, data, tecnico, conteudo in atualizacoes
+    )
+    return texto[:LIMITE_CELULA]
+
+
+def linhas(protocolos, tamanho_lote=TAMANHO_LOTE):
+    """
+    Gera as linhas (listas de valores, já formatados) dos protocolos do queryset,
+    em ordem de id, começando pelo cabeçalho.
+    """
+    yield CABECALHO
+    registros = (
+        protocolos.order_by('pk')
+        .values_list(*(caminho for _, caminho in COLUNAS))
+        .iterator(chunk_size=tamanho_lote)
+    )
+    while True:
+        lote = list(islice(registros, tamanho_lote))
+        if not lote:
+            return
+        atualizacoes = (
+            AtualizacaoProtocolo.objects.filter(protocolo_id__in=[registro[0] for registro in lote])
+            .order_by('protocolo_id', 'data_atualizacao', 'pk')
+            .values_list('protocolo_id', 'data_atualizacao', 'tecnico__username', 'texto')
+        )
+        por_protocolo = {pk: list(grupo) for pk, grupo in groupby(atualizacoes, key=lambda linha: linha[0])}
+        for registro in lote:
+            (pk, status, criado_em, primeira_resposta_em, concluido_em, *demais) = registro
+            timeline = por_protocolo.get(pk, ())
+            yield [
+                f"{pk:06d}", STATUS.get(status, status), _data_hora(criado_em), _data_hora(primeira_resposta_em),
+                _data_hora(concluido_em), *(valor or '' for valor in demais),
+                len(timeline), _linha_do_tempo(timeline),
+            ]
+
+
+class _Eco:
+    """
+    "Arquivo" que devolve o que recebe: o csv.writer formata, o gerador entrega.
+    """
+
+    def write(self, valor):
+        return valor
+
+
+def csv_stream(linhas_exportadas):
+    # BOM: o Excel só reconhece o UTF-8 com ele
+    yield '\ufeff'
+    escritor = csv.writer(_Eco())
+    for linha in linhas_exportadas:
+        yield escritor.writerow(linha)
+
+
+class _Buffer:
+    """
+    Destino do ZIP sem seek: o zipfile grava em stream (com data descriptors) e
+    o gerador esvazia o que já foi produzido.
+    """
+
+    def __init__(self):
+        self.partes = []
+        self.tamanho = 0
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        self.tamanho += len(dados)
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        dados = b''.join(self.partes)
+        self.partes, self.tamanho = [], 0
+        return dados
+
+
+# Caracteres de controle não são permitidos no XML da planilha
+_CONTROLE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_XLSX_FIXOS = (
+    ('[Content_Types].xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+     '<Default Extension="xml" ContentType="application/xml"/>'
+     '<Override PartName="/xl/workbook.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+     '<Override PartName="/xl/worksheets/sheet1.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+     '</Types>'),
+    ('_rels/.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+     'Target="xl/workbook.xml"/>'
+     '</Relationships>'),
+    ('xl/workbook.xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+     'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+     '<sheets><sheet name="Protocolos" sheetId="1" r:id="rId1"/></sheets>'
+     '</workbook>'),
+    ('xl/_rels/workbook.xml.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+     'Target="worksheets/sheet1.xml"/>'
+     '</Relationships>'),
+)
+
+
+def _celula(valor):
+    if isinstance(valor, int):
+        return f'<c t="n"><v>{valor}</v></c>'
+    texto = escape(_CONTROLE.sub('', str(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def xlsx_stream(linhas_exportadas, tamanho_bloco=64 * 1024):
+    """
+    Planilha XLSX (uma aba, células de texto em linha) entregue em blocos de ~64 KB.
+    """
+    saida = _Buffer()
+    with zipfile.ZipFile(saida, 'w', zipfile.ZIP_DEFLATED) as arquivo:
+        for nome, conteudo in _XLSX_FIXOS:
+            arquivo.writestr(nome, conteudo)
+        # force_zip64: o tamanho da planilha não é conhecido de antemão
+        with arquivo.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as planilha:
+            planilha.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            for linha in linhas_exportadas:
+                planilha.write(f"<row>{''.join(_celula(valor) for valor in linha)}</row>".encode())
+                if saida.tamanho >= tamanho_bloco:
+                    yield saida.esvaziar()
+            planilha.write(b'</sheetData></worksheet>')
+    yield saida.esvaziar()
+
+
+def exportar(protocolos, formato):
+    """
+    Gerador do arquivo (str para CSV, bytes para XLSX) com os protocolos do queryset.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato desconhecido: {formato}")
+    gerador = csv_stream if formato == 'csv' else xlsx_stream
+    return gerador(linhas(protocolos))
+
+
+def nome_arquivo(formato):
+    return f"protocolos-{timezone.localtime():%Y%m%d-%H%M}.{FORMATOS[formato][1]}"
@@ -0,0 +1,240 @@
+"""
+Fila de tarefas em segundo plano, guardada no próprio banco (modelo Tarefa).
+
+Efeitos colaterais lentos de uma gravação (reindexações em massa, e-mails)
+não rodam na requisição: ela só grava a tarefa, após o commit, e o comando
+processar_tarefas as executa.
+
+* Registro: funções decoradas com `@tarefa('nome')` (em suporte_app.tarefas);
+  os argumentos precisam ser serializáveis em JSON.
+* Enfileiramento: `enfileirar('nome', {...}, chave=...)` grava a tarefa em
+  transaction.on_commit (nada é enfileirado se a transação for desfeita). Com
+  `chave`, enquanto houver uma tarefa pendente com a mesma chave as novas são
+  ignoradas: alterações seguidas do mesmo cliente geram uma só reindexação.
+* Execução: cada trabalhador reserva um lote com SELECT ... FOR UPDATE SKIP
+  LOCKED (onde suportado), então vários processos/threads podem consumir a fila
+  sem disputar as mesmas linhas. As tarefas podem rodar mais de uma vez
+  (trabalhador interrompido, nova tentativa) e devem ser idempotentes.
+* Falhas: nova tentativa com espera exponencial (com variação aleatória) até
+  `tentativas`; depois a tarefa fica como 'falhou' para inspeção no admin.
+* Modo imediato (TAREFAS_IMEDIATAS, para testes e desenvolvimento): a tarefa é
+  executada em memória no on_commit, sem passar pelo banco.
+"""
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import uuid
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Tarefa
+
+logger = logging.getLogger('suporte_app.fila')
+
+_registro = {}
+
+
+class Definicao:
+    """
+    Função registrada como tarefa e quantas tentativas ela tem.
+    """
+
+    def __init__(self, nome, funcao, tentativas):
+        self.nome = nome
+        self.funcao = funcao
+        self.tentativas = tentativas
+
+
+def tarefa(nome, tentativas=None):
+    """
+    Decorador que registra a função como tarefa `nome`.
+    """
+    def registrar(funcao):
+        _registro[nome] = Definicao(nome, funcao, tentativas)
+        return funcao
+    return registrar
+
+
+def definicao(nome):
+    try:
+        return _registro[nome]
+    except KeyError:
+        raise LookupError(f"Tarefa desconhecida: {nome}")
+
+
+def enfileirar(nome, argumentos=None, chave=None, atraso=0):
+    """
+    Agenda a tarefa para depois do commit da transação atual (ou já, fora de uma).
+    """
+    enfileirar_varias(nome, [(argumentos, chave)], atraso=atraso)
+
+
+def enfileirar_varias(nome, itens, atraso=0):
+    """
+    Como enfileirar(), para várias tarefas [(argumentos, chave)] do mesmo tipo
+    gravadas com um só INSERT (ex.: ações em massa).
+    """
+    definicao_tarefa = definicao(nome)
+    itens = [(argumentos or {}, chave) for argumentos, chave in itens]
+    if not itens:
+        return
+    if settings.TAREFAS_IMEDIATAS:
+        # Ida e volta pelo JSON, como na fila real
+        lista = [json.loads(json.dumps(argumentos)) for argumentos, _ in itens]
+
+        def executar_agora():
+            for argumentos in lista:
+                definicao_tarefa.funcao(**argumentos)
+        transaction.on_commit(executar_agora)
+        return
+    tentativas = definicao_tarefa.tentativas or settings.TAREFAS_TENTATIVAS
+    transaction.on_commit(lambda: _gravar(nome, itens, atraso, tentativas))
+
+
+def _gravar(nome, itens, atraso, tentativas):
+    agora = timezone.now()
+    # ON CONFLICT DO NOTHING: a chave pendente repetida é ignorada sem erro
+    Tarefa.objects.bulk_create([
+        Tarefa(nome=nome, argumentos=argumentos, chave=chave, maximo_tentativas=tentativas,
+               criada_em=agora, executar_em=agora + timedelta(seconds=atraso))
+        for argumentos, chave in itens
+    ], batch_size=1000, ignore_conflicts=True)
+
+
+def espera(tentativa):
+    """
+    Segundos até a próxima tentativa: exponencial a partir de
+    TAREFAS_ESPERA_BASE_SEGUNDOS, limitada e com ±25% de variação.
+    """
+    segundos = min(settings.TAREFAS_ESPERA_BASE_SEGUNDOS * 2 ** (tentativa - 1),
+                   settings.TAREFAS_ESPERA_MAXIMA_SEGUNDOS)
+    return segundos * random.uniform(0.75, 1.25)
+
+
+def identificacao():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def reservar(trabalhador, quantidade):
+    """
+    Marca até `quantidade` tarefas vencidas como 'executando' para este trabalhador
+    e as retorna. Linhas travadas por outro trabalhador são puladas.
+    """
+    agora = timezone.now()
+    reserva = f"{trabalhador}:{uuid.uuid4().hex[:8]}"
+    # Sem SELECT FOR UPDATE (SQLite) a transação não protege nada e só causaria
+    # "database is locked" entre trabalhadores: a condição de status do UPDATE
+    # é que mantém a reserva exclusiva
+    with transaction.atomic() if connection.features.has_select_for_update else nullcontext():
+        ids = list(
+            Tarefa.objects.filter(status='pendente', executar_em__lte=agora)
+            .order_by('executar_em', 'pk')
+            .select_for_update(skip_locked=True)
+            .values_list('pk', flat=True)[:quantidade]
+        )
+        if not ids:
+            return []
+        Tarefa.objects.filter(pk__in=ids, status='pendente').update(
+            status='executando', iniciada_em=agora, trabalhador=reserva, tentativas=F('tentativas') + 1,
+        )
+    return list(Tarefa.objects.filter(status='executando', trabalhador=reserva).order_by('executar_em', 'pk'))
+
+
+def executar(tarefa_reservada):
+    """
+    Executa uma tarefa reservada e registra o resultado. Retorna True se concluiu.
+    """
+    try:
+        funcao = definicao(tarefa_reservada.nome).funcao
+        with transaction.atomic():
+            funcao(**tarefa_reservada.argumentos)
+    except Exception as erro:
+        _registrar_falha(tarefa_reservada, erro)
+        return False
+    Tarefa.objects.filter(pk=tarefa_reservada.pk).update(status='concluida', concluida_em=timezone.now(), erro='')
+    return True
+
+
+def _registrar_falha(tarefa_reservada, erro):
+    mensagem = f"{type(erro).__name__}: {erro}"
+    definitiva = isinstance(erro, LookupError) or tarefa_reservada.tentativas >= tarefa_reservada.maximo_tentativas
+    logger.log(logging.ERROR if definitiva else logging.WARNING, json.dumps({
+        'evento': 'tarefa_falhou', 'tarefa': tarefa_reservada.pk, 'nome': tarefa_reservada.nome,
+        'tentativa': tarefa_reservada.tentativas, 'definitiva': definitiva, 'erro': mensagem,
+    }, ensure_ascii=False), exc_info=definitiva)
+    tarefas = Tarefa.objects.filter(pk=tarefa_reservada.pk, status='executando')
+    if definitiva:
+        tarefas.update(status='falhou', concluida_em=timezone.now(), erro=mensagem)
+        return
+    try:
+        with transaction.atomic():
+            tarefas.update(status='pendente', erro=mensagem,
+                           executar_em=timezone.now() + timedelta(seconds=espera(tarefa_reservada.tentativas)))
+    except IntegrityError:
+        # Já há outra pendente com a mesma chave: ela fará o mesmo trabalho
+        tarefas.update(status='concluida', concluida_em=timezone.now(), erro=f"{mensagem} (substituída)")
+
+
+def recuperar_interrompidas():
+    """
+    Devolve à fila as tarefas em 'executando' há mais de TAREFAS_TEMPO_LIMITE_SEGUNDOS
+    (trabalhador interrompido). Retorna quantas.
+    """
+    limite = timezone.now() - timedelta(seconds=settings.TAREFAS_TEMPO_LIMITE_SEGUNDOS)
+    total = 0
+    for tarefa_interrompida in Tarefa.objects.filter(status='executando', iniciada_em__lt=limite):
+        _registrar_falha(tarefa_interrompida, TimeoutError("execução interrompida"))
+        total += 1
+    return total
+
+
+def processar(parar=None, lote=None, uma_vez=False, intervalo=None):
+    """
+    Laço de um trabalhador: reserva e executa lotes até `parar` (threading.Event)
+    ser sinalizado ou, com `uma_vez`, até a fila não ter tarefas vencidas.
+    Retorna {'concluidas': n, 'falhas': n}.
+    """
+    parar = parar or threading.Event()
+    lote = lote or settings.TAREFAS_LOTE
+    intervalo = settings.TAREFAS_INTERVALO_SEGUNDOS if intervalo is None else intervalo
+    trabalhador = identificacao()
+    resultado = {'concluidas': 0, 'falhas': 0}
+    while not parar.is_set():
+        # Como ao fim de uma requisição: descarta conexões quebradas ou vencidas
+        # (CONN_MAX_AGE), exceto dentro de uma transação (ex.: nos testes)
+        if not connection.in_atomic_block:
+            close_old_connections()
+        try:
+            tarefas = reservar(trabalhador, lote)
+            if not tarefas:
+                # Fila ociosa: aproveita para devolver as tarefas de trabalhadores interrompidos
+                if recuperar_interrompidas():
+                    continue
+                if uma_vez:
+                    break
+                parar.wait(intervalo)
+                continue
+            for tarefa_reservada in tarefas:
+                resultado['concluidas' if executar(tarefa_reservada) else 'falhas'] += 1
+        except DatabaseError:
+            # Banco indisponível ou disputa de trava: tenta de novo no próximo ciclo
+            # (uma tarefa que ficou em 'executando' é recuperada pelo tempo limite)
+            logger.exception(json.dumps({'evento': 'fila_indisponivel', 'trabalhador': trabalhador}))
+            parar.wait(intervalo)
+    return resultado
+
+
+def limpar(dias):
+    """
+    Remove as tarefas concluídas há mais de `dias` dias. Retorna quantas.
+    """
+    limite = timezone.now() - timedelta(days=dias)
+    return Tarefa.objects.filter(status='concluida', concluida_em__lt=limite).delete()[0]
@@ -1,5 +1,40 @@
 from django import forms
-from .models import Protocolo
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from .models import Dispositivo, Protocolo, STATUS_CHOICES
+
+class SelecaoRemota(forms.Select):
+    """
+    Select que renderiza só a opção selecionada; as demais são buscadas no
+    endpoint JSON indicado (data-url) conforme o usuário digita. `depende_de`
+    é o nome do campo cujo valor é enviado junto (ex.: o cliente do dispositivo).
+    """
+
+    def __init__(self, url_name, depende_de=None, attrs=None):
+        super().__init__(attrs)
+        self.url_name = url_name
+        self.depende_de = depende_de
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs['data-autocompletar'] = reverse(self.url_name)
+        if self.depende_de:
+            attrs['data-depende-de'] = self.depende_de
+        return attrs
+
+    def optgroups(self, name, value, attrs=None):
+        """
+        Consulta apenas os valores selecionados em vez de percorrer o queryset inteiro.
+        """
+        selecionados = [valor for valor in value if valor]
+        opcoes = [(None, [self.create_option(name, '', '---------', not selecionados, 0)], 0)]
+        if selecionados:
+            queryset = self.choices.queryset.filter(pk__in=selecionados)
+            for indice, objeto in enumerate(queryset, start=1):
+                opcao = self.create_option(name, str(objeto.pk), str(objeto), True, indice, attrs=attrs)
+                opcoes.append((None, [opcao], indice))
+        return opcoes
 
 class ProtocoloForm(forms.ModelForm):
     """
@@ -18,11 +53,58 @@ class ProtocoloForm(forms.ModelForm):
             'status': 'Status',
         }
         widgets = {
-            'cliente': forms.Select(attrs={'class': 'form-control'}),
-            'dispositivo': forms.Select(attrs={'class': 'form-control'}),
+            'cliente': SelecaoRemota('autocompletar_clientes', attrs={'class': 'form-control'}),
+            'dispositivo': SelecaoRemota('autocompletar_dispositivos', depende_de='cliente',
+                                         attrs={'class': 'form-control'}),
             'descricao': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
             'buic': forms.TextInput(attrs={'class': 'form-control'}),
             'topico_mqtt': forms.TextInput(attrs={'class': 'form-control'}),
             'payload_exemplo': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'status': forms.Select(attrs={'class': 'form-control'}),
-        }
\ No newline at end of file
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # O rótulo de cada dispositivo inclui o nome do cliente: carrega tudo em uma consulta
+        self.fields['dispositivo'].queryset = Dispositivo.objects.com_cliente()
+
+class ProtocoloAdminForm(forms.ModelForm):
+    """
+    Formulário do admin de protocolos: leva a versão do protocolo exibido, para
+    a gravação detectar alterações feitas por outra pessoa enquanto isso.
+    """
+    # Não é o campo do modelo (não editável): só transporta a versão exibida
+    versao_lida = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
+    class Meta:
+        model = Protocolo
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['versao_lida'].initial = self.instance.versao
+
+    def campos_alterados(self):
+        """
+        Campos do protocolo alterados pelo usuário (a versão não conta).
+        """
+        return [campo for campo in self.changed_data if campo != 'versao_lida']
+
+class ImportacaoDispositivosForm(forms.Form):
+    """
+    Formulário de upload para a importação em massa de clientes e dispositivos.
+    """
+    arquivo = forms.FileField(label='Arquivo', help_text='CSV com cabeçalho ou JSONL (um objeto por linha).')
+    formato = forms.ChoiceField(label='Formato', choices=(('csv', 'CSV'), ('jsonl', 'JSONL')))
+
+class TriagemActionForm(ActionForm):
+    """
+    Campos extras da barra de ações da lista de protocolos (ações de triagem em massa).
+    """
+    status = forms.ChoiceField(label='Status', required=False, choices=(('', '---------'),) + STATUS_CHOICES)
+    tecnico = forms.ModelChoiceField(
+        label='Técnico', required=False,
+        queryset=get_user_model().objects.filter(is_active=True, is_staff=True).order_by('username'),
+    )
+    texto = forms.CharField(label='Atualização', required=False, max_length=2000)
@@ -0,0 +1,251 @@
+"""
+Importação em massa de clientes e dispositivos a partir de CSV ou JSONL.
+
+O arquivo é lido como stream e processado em lotes: cada lote resolve os clientes
+por e-mail com uma consulta, cria os que faltam e grava os dispositivos com um
+único INSERT ... ON CONFLICT (mac_address) DO UPDATE, dentro de uma transação.
+Linhas inválidas vão para o relatório de erros sem interromper o lote, e a
+memória usada depende apenas do tamanho do lote, não do tamanho do arquivo.
+
+Colunas aceitas: cliente_email, cliente_nome, cliente_telefone, nome, tipo,
+mac_address, localizacao e online.
+
+Com um escopo de clientes ativo (usuário restrito, ver escopo.py), as linhas de
+clientes fora dele (inclusive clientes novos) ou de MACs já cadastrados em
+outro cliente são rejeitadas no relatório de erros.
+"""
+import csv
+import io
+import json
+import time
+from itertools import islice
+
+from django.db import DatabaseError, IntegrityError, transaction
+
+from . import busca, cache_modelos, escopo, inventario, metricas
+from .models import Cliente, Dispositivo, Protocolo, normalizar_mac
+
+TAMANHO_LOTE = 1000
+
+# Quantidade de erros mantidos em memória para exibição (o relatório completo é gravado à parte)
+ERROS_EM_MEMORIA = 100
+
+CAMPOS_DISPOSITIVO = ('nome', 'tipo', 'localizacao', 'online')
+VALORES_VERDADEIROS = ('1', 'true', 'sim', 's', 'yes', 'online')
+
+
+def ler_registros(arquivo, formato):
+    """
+    Gera (numero_da_linha, registro) a partir de um arquivo texto CSV ou JSONL.
+    """
+    if formato == 'csv':
+        leitor = csv.DictReader(arquivo)
+        for numero, registro in enumerate(leitor, start=2):  # linha 1 é o cabeçalho
+            yield numero, registro
+    elif formato == 'jsonl':
+        for numero, linha in enumerate(arquivo, start=1):
+            if not linha.strip():
+                continue
+            try:
+                registro = json.loads(linha)
+            except ValueError as erro:
+                registro = erro
+            yield numero, registro
+    else:
+        raise ValueError(f"Formato desconhecido: {formato}")
+
+
+def abrir_texto(arquivo_binario):
+    """
+    Envolve um arquivo binário (ex.: upload) para leitura como texto UTF-8 em stream.
+    """
+    return io.TextIOWrapper(arquivo_binario, encoding='utf-8-sig', newline='')
+
+
+class ResultadoImportacao:
+    """
+    Contadores de uma importação e os primeiros erros encontrados.
+    """
+
+    def __init__(self):
+        self.lidos = 0
+        self.importados = 0
+        self.clientes_criados = 0
+        self.quantidade_erros = 0
+        self.erros = []
+        self.inicio = time.monotonic()
+        self.segundos = 0.0
+
+    @property
+    def linhas_por_segundo(self):
+        return self.lidos / self.segundos if self.segundos else 0.0
+
+    def registrar_erro(self, numero, mensagem, registro, relatorio=None):
+        self.quantidade_erros += 1
+        if len(self.erros) < ERROS_EM_MEMORIA:
+            self.erros.append((numero, mensagem))
+        if relatorio is not None:
+            relatorio.writerow([numero, mensagem, json.dumps(registro, ensure_ascii=False, default=str)])
+
+    def finalizar(self):
+        self.segundos = time.monotonic() - self.inicio
+        return self
+
+
+def _validar(registro):
+    """
+    Valida e normaliza um registro. Retorna um dicionário limpo ou levanta ValueError.
+    """
+    if not isinstance(registro, dict):
+        raise ValueError("Linha inválida (JSON malformado ou não é um objeto).")
+    limpo = {chave: (str(valor).strip() if valor is not None else '') for chave, valor in registro.items()}
+    for campo in ('cliente_email', 'nome', 'mac_address'):
+        if not limpo.get(campo):
+            raise ValueError(f"Campo obrigatório ausente: {campo}")
+    limpo['cliente_email'] = limpo['cliente_email'].lower()
+    limpo['mac_address'] = normalizar_mac(limpo['mac_address'])
+    online = registro.get('online')
+    limpo['online'] = online if isinstance(online, bool) else limpo.get('online', '').lower() in VALORES_VERDADEIROS
+    return limpo
+
+
+def _resolver_clientes(registros):
+    """
+    Retorna {email: cliente_id} para os registros do lote, criando em massa os
+    clientes que ainda não existem.
+    """
+    emails = {registro['cliente_email'] for registro in registros}
+    # O e-mail é único entre todos os clientes: o escopo esconderia os já existentes
+    with escopo.sem_escopo():
+        clientes = dict(Cliente.objects.filter(email__in=emails).values_list('email', 'pk'))
+        novos = {}
+        for registro in registros:
+            email = registro['cliente_email']
+            if email not in clientes and email not in novos:
+                novos[email] = Cliente(
+                    email=email,
+                    nome=registro.get('cliente_nome') or email,
+                    telefone=registro.get('cliente_telefone', ''),
+                )
+        if novos:
+            Cliente.objects.bulk_create(novos.values(), ignore_conflicts=True)
+            clientes.update(Cliente.objects.filter(email__in=novos).values_list('email', 'pk'))
+    return clientes, len(novos)
+
+
+def _no_escopo(linhas, resultado, relatorio):
+    """
+    Com um escopo de clientes ativo, rejeita as linhas de clientes fora dele (ou
+    ainda inexistentes) e as de MACs cadastrados em outro cliente. Retorna as demais.
+    """
+    permitidos = escopo.clientes_ativos()
+    if permitidos is None:
+        return linhas
+    with escopo.sem_escopo():
+        clientes = dict(Cliente.objects.filter(
+            email__in={registro['cliente_email'] for _, registro in linhas}).values_list('email', 'pk'))
+        donos = dict(Dispositivo.objects.filter(
+            mac_address__in={registro['mac_address'] for _, registro in linhas}
+        ).values_list('mac_address', 'cliente_id'))
+    restantes = []
+    for numero, registro in linhas:
+        cliente_id = clientes.get(registro['cliente_email'])
+        if cliente_id not in permitidos or donos.get(registro['mac_address'], cliente_id) not in permitidos:
+            resultado.registrar_erro(numero, "Cliente fora do seu acesso.", registro, relatorio)
+        else:
+            restantes.append((numero, registro))
+    return restantes
+
+
+def _gravar_dispositivos(registros, clientes):
+    dispositivos = [
+        Dispositivo(
+            cliente_id=clientes[registro['cliente_email']],
+            mac_address=registro['mac_address'],
+            nome=registro['nome'],
+            tipo=registro.get('tipo', ''),
+            localizacao=registro.get('localizacao', ''),
+            online=registro['online'],
+        )
+        for registro in registros
+    ]
+    Dispositivo.objects.bulk_create(
+        dispositivos,
+        update_conflicts=True,
+        unique_fields=['mac_address'],
+        update_fields=['cliente', *CAMPOS_DISPOSITIVO],
+    )
+
+
+def _importar_lote(linhas, resultado, relatorio):
+    """
+    Grava um lote já validado. Se o lote falhar no banco, regrava linha a linha
+    (cada uma em seu savepoint) para isolar os registros com problema.
+    """
+    linhas = _no_escopo(linhas, resultado, relatorio)
+    if not linhas:
+        return
+    # O último registro de um mesmo MAC prevalece, como em um upsert sequencial
+    por_mac = {}
+    for numero, registro in linhas:
+        por_mac[registro['mac_address']] = (numero, registro)
+    linhas = list(por_mac.values())
+    registros = [registro for _, registro in linhas]
+
+    existentes = list(
+        Dispositivo.objects.filter(mac_address__in=por_mac).values_list('pk', flat=True)
+    )
+    try:
+        with transaction.atomic():
+            clientes, criados = _resolver_clientes(registros)
+            _gravar_dispositivos(registros, clientes)
+        resultado.clientes_criados += criados
+        resultado.importados += len(registros)
+    except (IntegrityError, DatabaseError):
+        for numero, registro in linhas:
+            try:
+                with transaction.atomic():
+                    clientes, criados = _resolver_clientes([registro])
+                    _gravar_dispositivos([registro], clientes)
+                resultado.clientes_criados += criados
+                resultado.importados += 1
+            except (IntegrityError, DatabaseError) as erro:
+                resultado.registrar_erro(numero, f"Erro ao gravar: {erro}", registro, relatorio)
+
+    # bulk_create não dispara sinais: descarta os caches de localização e de
+    # referência e reindexa a busca dos protocolos de dispositivos alterados
+    inventario.limpar_cache()
+    cache_modelos.invalidar(Cliente, Dispositivo)
+    if existentes:
+        busca.indexar(Protocolo.objects.filter(dispositivo__in=existentes).values_list('pk', flat=True).iterator())
+
+
+def importar(registros, tamanho_lote=TAMANHO_LOTE, relatorio=None, progresso=None):
+    """
+    Importa os (numero_da_linha, registro) informados em lotes de `tamanho_lote`.
+
+    `relatorio` é um csv.writer opcional que recebe (linha, erro, registro) de cada
+    linha rejeitada; `progresso` é chamado com o ResultadoImportacao após cada lote.
+    """
+    resultado = ResultadoImportacao()
+    registros = iter(registros)
+    while True:
+        lote = list(islice(registros, tamanho_lote))
+        if not lote:
+            break
+        validos = []
+        for numero, registro in lote:
+            resultado.lidos += 1
+            try:
+                validos.append((numero, _validar(registro)))
+            except ValueError as erro:
+                resultado.registrar_erro(numero, str(erro), registro if isinstance(registro, dict) else None,
+                                         relatorio)
+        if validos:
+            _importar_lote(validos, resultado, relatorio)
+        if progresso:
+            progresso(resultado.finalizar())
+    if resultado.importados:
+        # bulk_create não dispara sinais: recalcula os contadores de dispositivos por tipo
+        metricas.reconstruir(dimensoes=('tipo',))
+    return resultado.finalizar()
@@ -0,0 +1,383 @@
+"""
+Ingestão do status dos dispositivos a partir de mensagens MQTT.
+
+O worker (python manage.py ingerir_mqtt) assina os tópicos de status e:
+
+* resolve cada mensagem para um dispositivo por um índice em memória
+  (tópico MQTT, BUIC ou MAC), sem consultar o banco por mensagem;
+* acumula as mudanças em uma janela de tempo, mantendo só o último estado de
+  cada dispositivo;
+* ao fim da janela grava tudo em lote: um UPDATE ... WHERE id IN (...) por
+  estado (online/offline/heartbeat), em vez de um UPDATE por mensagem. Se a
+  gravação falhar (ex.: conexão perdida), o erro é registrado no log e o lote
+  volta para a janela seguinte;
+* recarrega o índice a cada MQTT_INDICE_RECARGA_SEGUNDOS e, quando chegam
+  mensagens de dispositivos desconhecidos (ex.: cadastrados depois do início),
+  no máximo a cada MQTT_INDICE_RECARGA_MINIMA_SEGUNDOS.
+
+O broker é abstraído: BrokerMqtt usa a biblioteca aiomqtt (dependência opcional)
+e BrokerEmMemoria é um broker em processo usado nos testes e no teste de carga.
+"""
+import asyncio
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from . import cache_modelos
+from .models import Dispositivo, normalizar_buic, normalizar_mac
+
+TAMANHO_LOTE = 1000
+
+VALORES_ONLINE = ('1', 'true', 'on', 'online', 'up', 'conectado')
+VALORES_OFFLINE = ('0', 'false', 'off', 'offline', 'down', 'desconectado')
+
+logger = logging.getLogger('suporte_app.ingestao')
+
+
+def _renovar_conexao():
+    # Como entre requisições: descarta a conexão perdida ou vencida (CONN_MAX_AGE).
+    # Dentro de uma transação (ex.: testes) a conexão pertence a quem a abriu
+    if not connection.in_atomic_block:
+        close_old_connections()
+
+
+def interpretar_payload(payload):
+    """
+    Extrai (online, identificadores) de um payload de status. Aceita JSON
+    ({"online": true}, {"status": "offline", "mac": "..."}) ou texto simples
+    ("online", "0"). `online` é None quando o payload não traz estado (heartbeat).
+    """
+    if isinstance(payload, bytes):
+        payload = payload.decode('utf-8', errors='replace')
+    texto = payload.strip()
+    identificadores = {}
+    valor = texto
+    if texto.startswith('{'):
+        try:
+            dados = json.loads(texto)
+        except ValueError:
+            return None, identificadores
+        identificadores = {chave: str(dados[chave]) for chave in ('mac', 'mac_address', 'buic') if dados.get(chave)}
+        valor = dados.get('online', dados.get('status'))
+    if isinstance(valor, bool):
+        return valor, identificadores
+    valor = str(valor).strip().lower() if valor is not None else ''
+    if valor in VALORES_ONLINE:
+        return True, identificadores
+    if valor in VALORES_OFFLINE:
+        return False, identificadores
+    return None, identificadores
+
+
+class IndiceDispositivos:
+    """
+    Índice em memória de tópico MQTT / BUIC / MAC para o id do dispositivo, com o
+    último estado online conhecido de cada um.
+    """
+
+    def __init__(self):
+        self.por_topico = {}
+        self.por_buic = {}
+        self.por_mac = {}
+        self.online = {}
+
+    def carregar(self):
+        # Identificadores normalizados no próprio dispositivo (ver inventario.py): uma só consulta
+        dispositivos = Dispositivo.objects.order_by().values_list('pk', 'mac_address', 'buic', 'topico_mqtt', 'online')
+        for pk, mac, buic, topico, online in dispositivos.iterator(chunk_size=5000):
+            self.adicionar_mac(pk, mac)
+            if buic:
+                self.por_buic[buic] = pk
+            if topico:
+                self.por_topico[topico] = pk
+            self.online[pk] = online
+        return self
+
+    def adicionar_mac(self, pk, mac):
+        try:
+            self.por_mac[normalizar_mac(mac)] = pk
+        except ValueError:
+            pass
+
+    def _por_identificador(self, valor):
+        valor = valor.strip()
+        dispositivo_id = self.por_buic.get(normalizar_buic(valor))
+        if dispositivo_id is None:
+            try:
+                dispositivo_id = self.por_mac.get(normalizar_mac(valor))
+            except ValueError:
+                pass
+        return dispositivo_id
+
+    def resolver(self, topico, identificadores=None):
+        """
+        Retorna o id do dispositivo da mensagem ou None. Tenta, nesta ordem: o
+        tópico exato, os identificadores do payload e cada nível do tópico como
+        BUIC ou MAC (ex.: dispositivos/AABBCCDDEEFF/status).
+        """
+        dispositivo_id = self.por_topico.get(topico)
+        if dispositivo_id is not None:
+            return dispositivo_id
+        for valor in (identificadores or {}).values():
+            dispositivo_id = self._por_identificador(valor)
+            if dispositivo_id is not None:
+                return dispositivo_id
+        for nivel in topico.split('/'):
+            dispositivo_id = self._por_identificador(nivel) if nivel else None
+            if dispositivo_id is not None:
+                return dispositivo_id
+        return None
+
+
+class BrokerEmMemoria:
+    """
+    Broker em processo: publicar() coloca mensagens numa fila consumida por
+    mensagens(). fechar() encerra o consumo depois das mensagens pendentes.
+    """
+
+    def __init__(self, tamanho_maximo=0):
+        self.fila = asyncio.Queue(maxsize=tamanho_maximo)
+
+    async def publicar(self, topico, payload):
+        await self.fila.put((topico, payload))
+
+    async def fechar(self):
+        await self.fila.put(None)
+
+    async def mensagens(self):
+        while True:
+            item = await self.fila.get()
+            if item is None:
+                return
+            yield item
+
+
+class BrokerMqtt:
+    """
+    Assinatura real em um broker MQTT (requer o pacote aiomqtt).
+    """
+
+    def __init__(self, host, porta, topicos):
+        self.host = host
+        self.porta = porta
+        self.topicos = topicos
+
+    async def mensagens(self):
+        try:
+            import aiomqtt
+        except ImportError:
+            raise RuntimeError("O pacote 'aiomqtt' é necessário para conectar a um broker MQTT.")
+        async with aiomqtt.Client(self.host, self.porta) as cliente:
+            for topico in self.topicos:
+                await cliente.subscribe(topico)
+            async for mensagem in cliente.messages:
+                yield str(mensagem.topic), mensagem.payload
+
+
+class IngestorStatus:
+    """
+    Consome as mensagens de um broker e grava o status dos dispositivos em lotes.
+
+    `ao_gravar`, se informado, é chamado (na thread do ORM) com a lista de
+    transições [(dispositivo_id, online_anterior, online_atual, instante)] de cada lote.
+    """
+
+    def __init__(self, broker, indice, janela=1.0, tamanho_lote=TAMANHO_LOTE, ao_gravar=None,
+                 recarga_indice=None, recarga_minima=None):
+        self.broker = broker
+        self.indice = indice
+        self.janela = janela
+        self.tamanho_lote = tamanho_lote
+        self.ao_gravar = ao_gravar
+        self.recarga_indice = settings.MQTT_INDICE_RECARGA_SEGUNDOS if recarga_indice is None else recarga_indice
+        self.recarga_minima = settings.MQTT_INDICE_RECARGA_MINIMA_SEGUNDOS if recarga_minima is None else recarga_minima
+        self.indice_carregado_em = time.monotonic()
+        # Mensagens sem dispositivo desde a última carga do índice
+        self.desconhecidas = 0
+        self.pendentes = {}
+        self.mensagens = 0
+        self.ignoradas = 0
+        self.linhas_gravadas = 0
+        self.lotes_gravados = 0
+
+    @property
+    def amplificacao_escrita(self):
+        """
+        Linhas gravadas por mensagem recebida (1.0 equivale a um UPDATE por mensagem).
+        """
+        return self.linhas_gravadas / self.mensagens if self.mensagens else 0.0
+
+    def processar(self, topico, payload, instante=None):
+        """
+        Registra uma mensagem na janela atual (sem acesso ao banco).
+        """
+        self.mensagens += 1
+        online, identificadores = interpretar_payload(payload)
+        dispositivo_id = self.indice.resolver(topico, identificadores)
+        if dispositivo_id is None:
+            self.ignoradas += 1
+            self.desconhecidas += 1
+            return
+        instante = instante or timezone.now()
+        anterior = self.pendentes.get(dispositivo_id)
+        if online is None and anterior:
+            # Heartbeat sem estado: mantém o estado pendente da janela
+            online = anterior[0]
+        self.pendentes[dispositivo_id] = (online, instante)
+
+    def gravar(self, pendentes, instante=None):
+        """
+        Grava um conjunto de estados e retorna as transições. Os dispositivos são
+        agrupados pelo novo estado, então cada lote vira no máximo três UPDATEs
+        (online, offline, só heartbeat) com `WHERE id IN (...)`. ultimo_contato
+        recebe o instante da gravação (precisão de uma janela).
+
+        O índice só passa a ter os novos estados depois que os UPDATEs (em uma
+        transação) foram gravados: se falharem, nada muda e o erro é propagado.
+        """
+        instante = instante or timezone.now()
+        grupos = {True: [], False: [], None: []}
+        transicoes = []
+        for dispositivo_id, (online, recebido_em) in pendentes.items():
+            anterior = self.indice.online.get(dispositivo_id)
+            if online is not None and online != anterior:
+                transicoes.append((dispositivo_id, anterior, online, recebido_em))
+            grupos[online].append(dispositivo_id)
+
+        lotes = 0
+        with transaction.atomic():
+            for online, ids in grupos.items():
+                campos = {'ultimo_contato': instante}
+                if online is not None:
+                    campos['online'] = online
+                for inicio in range(0, len(ids), self.tamanho_lote):
+                    Dispositivo.objects.filter(pk__in=ids[inicio:inicio + self.tamanho_lote]).update(**campos)
+                    lotes += 1
+        for dispositivo_id, (online, _) in pendentes.items():
+            if online is not None:
+                self.indice.online[dispositivo_id] = online
+        self.lotes_gravados += lotes
+        self.linhas_gravadas += len(pendentes)
+        if transicoes:
+            # O estado online aparece nas listas em cache (ex.: dispositivos do cliente)
+            cache_modelos.invalidar(Dispositivo)
+        if self.ao_gravar and transicoes:
+            try:
+                self.ao_gravar(transicoes)
+            except Exception:
+                # Os estados já foram gravados: o lote não volta para a fila
+                logger.exception(json.dumps({'evento': 'ingestao_falha_transicoes', 'transicoes': len(transicoes)}))
+        return transicoes
+
+    def _gravar_com_conexao_renovada(self, pendentes):
+        _renovar_conexao()
+        try:
+            return self.gravar(pendentes)
+        finally:
+            _renovar_conexao()
+
+    def _devolver(self, pendentes):
+        """
+        Junta um lote que não foi gravado à janela atual (o estado mais recente prevalece).
+        """
+        for dispositivo_id, (online, recebido_em) in pendentes.items():
+            atual = self.pendentes.get(dispositivo_id)
+            if atual is None:
+                self.pendentes[dispositivo_id] = (online, recebido_em)
+            elif atual[0] is None:
+                # Heartbeat posterior: mantém o estado do lote devolvido
+                self.pendentes[dispositivo_id] = (online, atual[1])
+
+    async def descarregar(self):
+        if not self.pendentes:
+            return []
+        pendentes, self.pendentes = self.pendentes, {}
+        try:
+            return await sync_to_async(self._gravar_com_conexao_renovada)(pendentes)
+        except Exception:
+            logger.exception(json.dumps({'evento': 'ingestao_falha_gravacao', 'dispositivos': len(pendentes)}))
+            self._devolver(pendentes)
+            return []
+
+    async def recarregar_indice(self, forcar=False):
+        """
+        Recarrega o índice quando vencido ou, se chegaram mensagens de dispositivos
+        desconhecidos, depois do intervalo mínimo. Retorna se recarregou.
+        """
+        decorrido = time.monotonic() - self.indice_carregado_em
+        if not (forcar or decorrido >= self.recarga_indice
+                or (self.desconhecidas and decorrido >= self.recarga_minima)):
+            return False
+        try:
+            self.indice = await sync_to_async(self._carregar_indice)()
+        except Exception:
+            logger.exception(json.dumps({'evento': 'ingestao_falha_indice'}))
+            return False
+        finally:
+            self.indice_carregado_em = time.monotonic()
+        self.desconhecidas = 0
+        return True
+
+    def _carregar_indice(self):
+        _renovar_conexao()
+        return type(self.indice)().carregar()
+
+    async def executar(self):
+        """
+        Consome o broker até o fim do stream, descarregando a cada `janela` segundos.
+        """
+        parar = asyncio.Event()
+
+        async def descarregar_periodicamente():
+            while not parar.is_set():
+                try:
+                    await asyncio.wait_for(parar.wait(), timeout=self.janela)
+                except asyncio.TimeoutError:
+                    pass
+                await self.descarregar()
+                # Depois da gravação: o índice novo já tem os estados gravados
+                await self.recarregar_indice()
+
+        tarefa = asyncio.create_task(descarregar_periodicamente())
+        try:
+            async for topico, payload in self.broker.mensagens():
+                self.processar(topico, payload)
+                if self.mensagens % 1000 == 0:
+                    # Cede o loop para a gravação periódica mesmo sob fluxo contínuo
+                    await asyncio.sleep(0)
+        finally:
+            parar.set()
+            await tarefa
+            await self.descarregar()
+
+
+async def medir_carga(indice, mensagens, janela=0.2):
+    """
+    Publica `mensagens` (lista de (topico, payload)) num broker em memória e as
+    ingere. Retorna estatísticas de vazão e de amplificação de escrita.
+    """
+    broker = BrokerEmMemoria(tamanho_maximo=10000)
+    ingestor = IngestorStatus(broker, indice, janela=janela)
+    inicio = time.monotonic()
+
+    async def publicar():
+        for topico, payload in mensagens:
+            await broker.publicar(topico, payload)
+        await broker.fechar()
+
+    await asyncio.gather(publicar(), ingestor.executar())
+    segundos = time.monotonic() - inicio
+    return {
+        'mensagens': ingestor.mensagens,
+        'ignoradas': ingestor.ignoradas,
+        'segundos': segundos,
+        'mensagens_por_segundo': ingestor.mensagens / segundos if segundos else 0.0,
+        'linhas_gravadas': ingestor.linhas_gravadas,
+        'lotes_gravados': ingestor.lotes_gravados,
+        'amplificacao_escrita': ingestor.amplificacao_escrita,
+    }
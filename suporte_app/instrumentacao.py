@@ -0,0 +1,270 @@
+"""
+Instrumentação de requisições: consultas ao banco, tempo e latência por rota.
+
+* InstrumentacaoMiddleware mede toda requisição e alimenta o histograma de
+  latência por nome de URL (custo de alguns microssegundos).
+* Uma fração das requisições (INSTRUMENTACAO_AMOSTRAGEM) é instrumentada em
+  detalhe com connection.execute_wrapper: quantidade de consultas, tempo no
+  banco e consultas repetidas (mesmo SQL com parâmetros diferentes, o sintoma
+  de N+1). Essas requisições recebem o cabeçalho Server-Timing e geram uma linha
+  de log em JSON; as lentas ou com muitas consultas saem como WARNING.
+* A view `metricas_prometheus` expõe os histogramas (e os acertos do cache de
+  referência) no formato texto do Prometheus. Os valores são do processo (cada
+  worker expõe os seus).
+* `orcamento_consultas` é usado nos testes para falhar quando um trecho
+  excede a quantidade de consultas permitida.
+"""
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+from . import cache_modelos
+
+logger = logging.getLogger('suporte_app.instrumentacao')
+
+# Limites (segundos) dos buckets do histograma de latência
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Quantidade de consultas repetidas listadas no log/erro
+REPETIDAS_EXIBIDAS = 5
+
+_RE_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_RE_LISTA = re.compile(r'\((?:\s*(?:\?|%s)\s*,)+\s*(?:\?|%s)\s*\)')
+_RE_ESPACOS = re.compile(r'\s+')
+
+
+def assinatura_sql(sql):
+    """
+    Normaliza o SQL para agrupar consultas iguais com parâmetros diferentes:
+    literais viram '?' e listas de IN viram '(...)'.
+    """
+    sql = _RE_TEXTO.sub('?', sql)
+    sql = _RE_NUMERO.sub('?', sql)
+    sql = _RE_LISTA.sub('(...)', sql)
+    return _RE_ESPACOS.sub(' ', sql).strip()
+
+
+class Medicao:
+    """
+    Consultas executadas em um trecho (usada como execute_wrapper).
+    """
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_banco = 0.0
+        self.assinaturas = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tempo_banco += time.perf_counter() - inicio
+            self.consultas += 1
+            self.assinaturas[assinatura_sql(sql)] += 1
+
+    def repetidas(self, limite=REPETIDAS_EXIBIDAS):
+        """
+        [(assinatura, vezes)] das consultas executadas mais de uma vez.
+        """
+        return [(sql, vezes) for sql, vezes in self.assinaturas.most_common(limite) if vezes > 1]
+
+    @contextmanager
+    def ativa(self):
+        with ExitStack() as pilha:
+            for alias in connections:
+                pilha.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+
+class Histogramas:
+    """
+    Histogramas de latência e totais de consultas por rota, no processo atual.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.trava = threading.Lock()
+        self.latencia = {}
+        self.consultas = {}
+
+    def registrar(self, rota, segundos, medicao=None):
+        with self.trava:
+            contagens = self.latencia.get(rota)
+            if contagens is None:
+                contagens = self.latencia[rota] = {'buckets': [0] * len(self.buckets), 'soma': 0.0, 'total': 0}
+            for indice, limite in enumerate(self.buckets):
+                if segundos <= limite:
+                    contagens['buckets'][indice] += 1
+            contagens['soma'] += segundos
+            contagens['total'] += 1
+            if medicao is not None:
+                amostras = self.consultas.setdefault(rota, {'consultas': 0, 'tempo_banco': 0.0, 'amostras': 0})
+                amostras['consultas'] += medicao.consultas
+                amostras['tempo_banco'] += medicao.tempo_banco
+                amostras['amostras'] += 1
+
+    def limpar(self):
+        with self.trava:
+            self.latencia.clear()
+            self.consultas.clear()
+
+    def exportar(self):
+        """
+        Texto no formato de exposição do Prometheus.
+        """
+        linhas = [
+            '# HELP suporte_requisicao_segundos Latência das requisições por rota.',
+            '# TYPE suporte_requisicao_segundos histogram',
+        ]
+        with self.trava:
+            for rota, contagens in sorted(self.latencia.items()):
+                for limite, quantidade in zip(self.buckets, contagens['buckets']):
+                    linhas.append(f'suporte_requisicao_segundos_bucket{{rota="{rota}",le="{limite}"}} {quantidade}')
+                linhas.append(f'suporte_requisicao_segundos_bucket{{rota="{rota}",le="+Inf"}} {contagens["total"]}')
+                linhas.append(f'suporte_requisicao_segundos_sum{{rota="{rota}"}} {contagens["soma"]:.6f}')
+                linhas.append(f'suporte_requisicao_segundos_count{{rota="{rota}"}} {contagens["total"]}')
+            linhas += [
+                '# HELP suporte_requisicao_consultas_total Consultas ao banco nas requisições amostradas.',
+                '# TYPE suporte_requisicao_consultas_total counter',
+            ]
+            for rota, amostras in sorted(self.consultas.items()):
+                linhas.append(f'suporte_requisicao_consultas_total{{rota="{rota}"}} {amostras["consultas"]}')
+            linhas += [
+                '# HELP suporte_requisicao_banco_segundos_total Tempo no banco nas requisições amostradas.',
+                '# TYPE suporte_requisicao_banco_segundos_total counter',
+            ]
+            for rota, amostras in sorted(self.consultas.items()):
+                linhas.append(f'suporte_requisicao_banco_segundos_total{{rota="{rota}"}} {amostras["tempo_banco"]:.6f}')
+            linhas += [
+                '# HELP suporte_requisicao_amostras_total Requisições instrumentadas em detalhe.',
+                '# TYPE suporte_requisicao_amostras_total counter',
+            ]
+            for rota, amostras in sorted(self.consultas.items()):
+                linhas.append(f'suporte_requisicao_amostras_total{{rota="{rota}"}} {amostras["amostras"]}')
+        return '\n'.join(linhas) + '\n'
+
+
+histogramas = Histogramas()
+
+
+def _rota(request):
+    """
+    Nome da URL (com namespace) ou 'desconhecida' para 404s, mantendo a
+    cardinalidade dos rótulos limitada.
+    """
+    resolucao = getattr(request, 'resolver_match', None)
+    if resolucao is None:
+        return 'desconhecida'
+    return resolucao.view_name or 'desconhecida'
+
+
+class InstrumentacaoMiddleware:
+    """
+    Deve ser o primeiro middleware, para medir a requisição inteira. Funciona em
+    WSGI e ASGI; no ASGI só a latência é medida (as consultas rodam em threads
+    de sync_to_async, fora do alcance do execute_wrapper deste contexto).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.INSTRUMENTACAO_ATIVA:
+            return self.get_response(request)
+
+        amostrada = random.random() < settings.INSTRUMENTACAO_AMOSTRAGEM
+        inicio = time.perf_counter()
+        if amostrada:
+            medicao = Medicao()
+            with medicao.ativa():
+                response = self.get_response(request)
+        else:
+            medicao = None
+            response = self.get_response(request)
+        segundos = time.perf_counter() - inicio
+
+        rota = _rota(request)
+        histogramas.registrar(rota, segundos, medicao)
+        if medicao is not None:
+            self.relatar(request, response, rota, segundos, medicao)
+        return response
+
+    async def __acall__(self, request):
+        inicio = time.perf_counter()
+        response = await self.get_response(request)
+        if settings.INSTRUMENTACAO_ATIVA:
+            # Em respostas em stream (ex.: SSE) mede o tempo até o início da resposta
+            histogramas.registrar(_rota(request), time.perf_counter() - inicio)
+        return response
+
+    def relatar(self, request, response, rota, segundos, medicao):
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={medicao.tempo_banco * 1000:.1f};desc="{medicao.consultas} consultas"',
+            f'app;dur={(segundos - medicao.tempo_banco) * 1000:.1f}',
+            f'total;dur={segundos * 1000:.1f}',
+        ])
+        lenta = (segundos * 1000 >= settings.INSTRUMENTACAO_LENTA_MS
+                 or medicao.consultas > settings.INSTRUMENTACAO_MAXIMO_CONSULTAS)
+        registro = {
+            'evento': 'requisicao_lenta' if lenta else 'requisicao',
+            'metodo': request.method,
+            'caminho': request.path,
+            'rota': rota,
+            'status': response.status_code,
+            'duracao_ms': round(segundos * 1000, 2),
+            'banco_ms': round(medicao.tempo_banco * 1000, 2),
+            'consultas': medicao.consultas,
+            'repetidas': [{'sql': sql, 'vezes': vezes} for sql, vezes in medicao.repetidas()],
+        }
+        logger.log(logging.WARNING if lenta else logging.INFO, json.dumps(registro, ensure_ascii=False))
+
+
+def metricas_prometheus(request):
+    """
+    Endpoint /metrics. Se INSTRUMENTACAO_METRICAS_TOKEN estiver definido, exige
+    o cabeçalho `Authorization: Bearer <token>`.
+    """
+    token = settings.INSTRUMENTACAO_METRICAS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    # Junto com as latências, os acertos do cache de referência (cache_modelos.py)
+    texto = histogramas.exportar() + cache_modelos.estatisticas.exportar()
+    return HttpResponse(texto, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@contextmanager
+def orcamento_consultas(maximo):
+    """
+    Falha (AssertionError) se o bloco executar mais de `maximo` consultas,
+    listando as repetidas. Funciona com unittest e pytest:
+
+        with orcamento_consultas(5):
+            client.get(url)
+    """
+    medicao = Medicao()
+    with medicao.ativa():
+        yield medicao
+    if medicao.consultas > maximo:
+        repetidas = ''.join(f"\n  {vezes}x {sql}" for sql, vezes in medicao.repetidas())
+        raise AssertionError(
+            f"{medicao.consultas} consultas executadas; o orçamento é {maximo}."
+            + (f" Consultas repetidas:{repetidas}" if repetidas else "")
+        )
@@ -0,0 +1,136 @@
+"""
+Localização de dispositivos pelos identificadores do equipamento.
+
+Cada dispositivo guarda seus identificadores normalizados, com índice único:
+MAC canônico (AA:BB:CC:DD:EE:FF), BUIC (maiúsculas) e tópico MQTT. Eles vêm do
+cadastro e dos protocolos: o protocolo gravado por último com um BUIC/tópico
+passa a identificar o seu dispositivo (atribuir_identificadores).
+
+`localizar(valor)` resolve um MAC (em qualquer formato), BUIC ou tópico para o
+id do dispositivo com uma consulta indexada e guarda o resultado (inclusive
+"não encontrado") em um cache em memória do processo, então as chamadas
+seguintes são uma consulta a dicionário. O cache expira em
+INVENTARIO_CACHE_SEGUNDOS e é descartado quando um dispositivo é gravado ou
+removido neste processo. A ingestão MQTT usa o índice completo
+(ingestao.IndiceDispositivos), carregado de uma vez.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from . import cache_modelos
+from .models import Dispositivo, normalizar_buic, normalizar_mac
+
+_AUSENTE = object()
+
+
+def chaves(valor):
+    """
+    Formas normalizadas de `valor` como (mac, buic, topico); mac é None se não for um MAC.
+    """
+    valor = (valor or '').strip()
+    try:
+        mac = normalizar_mac(valor)
+    except ValueError:
+        mac = None
+    return mac, normalizar_buic(valor), valor or None
+
+
+class CacheLocalizacao:
+    """
+    Cache LRU com validade: identificador normalizado -> (id ou None, expira_em).
+    """
+
+    def __init__(self):
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave):
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is None:
+                return _AUSENTE
+            valor, expira_em = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                return _AUSENTE
+            self._itens.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor):
+        with self._trava:
+            self._itens[chave] = (valor, time.monotonic() + settings.INVENTARIO_CACHE_SEGUNDOS)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > settings.INVENTARIO_CACHE_MAXIMO:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+
+
+_cache = CacheLocalizacao()
+
+
+def limpar_cache():
+    _cache.limpar()
+
+
+def localizar(valor):
+    """
+    Id do dispositivo identificado por `valor` (tópico MQTT, BUIC ou MAC, nesta
+    ordem de prioridade) ou None.
+    """
+    mac, buic, topico = chaves(valor)
+    if topico is None:
+        return None
+    chave = (mac, buic, topico)
+    dispositivo_id = _cache.obter(chave)
+    if dispositivo_id is not _AUSENTE:
+        return dispositivo_id
+
+    condicao = Q(topico_mqtt=topico) | Q(buic=buic)
+    if mac:
+        condicao |= Q(mac_address=mac)
+    encontrados = {}
+    for pk, mac_dispositivo, buic_dispositivo, topico_dispositivo in (
+            Dispositivo.objects.filter(condicao).order_by().values_list('pk', 'mac_address', 'buic', 'topico_mqtt')):
+        if topico_dispositivo == topico:
+            encontrados['topico'] = pk
+        if buic_dispositivo == buic:
+            encontrados['buic'] = pk
+        if mac and mac_dispositivo == mac:
+            encontrados['mac'] = pk
+    dispositivo_id = encontrados.get('topico', encontrados.get('buic', encontrados.get('mac')))
+    _cache.guardar(chave, dispositivo_id)
+    return dispositivo_id
+
+
+def atribuir_identificadores(dispositivo_id, buic=None, topico=None):
+    """
+    Faz o BUIC/tópico (ex.: informados em um protocolo) identificarem o dispositivo,
+    retirando-os de outro dispositivo que os tivesse. Não consulta mais nada se
+    o dispositivo já os tem.
+    """
+    campos = {}
+    if normalizar_buic(buic):
+        campos['buic'] = normalizar_buic(buic)
+    if (topico or '').strip():
+        campos['topico_mqtt'] = topico.strip()
+    if not campos:
+        return
+    atual = Dispositivo.objects.filter(pk=dispositivo_id).values(*campos).first()
+    if atual is None or all(atual[campo] == valor for campo, valor in campos.items()):
+        return
+    with transaction.atomic():
+        for campo, valor in campos.items():
+            Dispositivo.objects.filter(**{campo: valor}).exclude(pk=dispositivo_id).update(**{campo: None})
+        Dispositivo.objects.filter(pk=dispositivo_id).update(**campos)
+    # update() não dispara os sinais que limpam os caches
+    limpar_cache()
+    transaction.on_commit(limpar_cache)
+    transaction.on_commit(lambda: cache_modelos.invalidar(Dispositivo))
@@ -0,0 +1,66 @@
+"""
+Linha do tempo (atualizações) de um protocolo, da mais recente para a mais antiga.
+
+A paginação é por cursor sobre (data_atualizacao, id): cada página é um
+`WHERE (data, id) < cursor ORDER BY data DESC, id DESC LIMIT n` sobre o índice
+(protocolo, data_atualizacao), com o mesmo custo em qualquer ponto do histórico.
+"""
+from django.db.models import Prefetch, Q
+from django.utils.dateparse import parse_datetime
+
+from .models import AtualizacaoProtocolo
+
+POR_PAGINA = 20
+POR_PAGINA_MAXIMO = 100
+
+ORDEM = ('-data_atualizacao', '-pk')
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def codificar_cursor(atualizacao):
+    return f"{atualizacao.data_atualizacao.isoformat()}_{atualizacao.pk}"
+
+
+def decodificar_cursor(cursor):
+    data, _, pk = cursor.rpartition('_')
+    data = parse_datetime(data) if data else None
+    if data is None or not pk.isdigit():
+        raise CursorInvalido(cursor)
+    return data, int(pk)
+
+
+def atualizacoes():
+    return AtualizacaoProtocolo.objects.select_related('tecnico').order_by(*ORDEM)
+
+
+def prefetch_primeira_pagina(limite=POR_PAGINA):
+    """
+    Prefetch da primeira página (mais um item, para saber se há mais) em
+    `protocolo.atualizacoes_recentes`.
+    """
+    return Prefetch('atualizacoes', queryset=atualizacoes()[:limite + 1], to_attr='atualizacoes_recentes')
+
+
+def dividir(itens, limite):
+    """
+    Separa os `limite` primeiros itens e o cursor da próxima página (ou None).
+    """
+    itens = list(itens)
+    if len(itens) <= limite:
+        return itens, None
+    itens = itens[:limite]
+    return itens, codificar_cursor(itens[-1])
+
+
+def pagina(protocolo_id, cursor=None, limite=POR_PAGINA):
+    """
+    Retorna (atualizacoes, proximo_cursor) das atualizações anteriores ao cursor.
+    """
+    queryset = atualizacoes().filter(protocolo_id=protocolo_id)
+    if cursor:
+        data, pk = decodificar_cursor(cursor)
+        queryset = queryset.filter(Q(data_atualizacao__lt=data) | Q(data_atualizacao=data, pk__lt=pk))
+    return dividir(queryset[:limite + 1], limite)
@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from suporte_app import arquivamento
+
+
+class Command(BaseCommand):
+    help = (
+        "Move protocolos concluídos há mais de N dias (com atualizações e transições) para as tabelas "
+        "de arquivo, em lotes curtos. Pode ser interrompido e executado de novo a qualquer momento."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.ARQUIVAMENTO_DIAS,
+                            help="Dias desde a conclusão (padrão: ARQUIVAMENTO_DIAS).")
+        parser.add_argument('--lote', type=int, default=settings.ARQUIVAMENTO_LOTE,
+                            help="Protocolos por transação.")
+        parser.add_argument('--pausa', type=float, default=0,
+                            help="Segundos de espera entre os lotes.")
+        parser.add_argument('--maximo', type=int, help="Arquiva no máximo esta quantidade nesta execução.")
+        parser.add_argument('--simular', action='store_true',
+                            help="Só informa quantos protocolos seriam arquivados.")
+
+    def handle(self, *args, **options):
+        if options['simular']:
+            total = arquivamento.candidatos(options['dias']).count()
+            self.stdout.write(f"{total} protocolos concluídos há mais de {options['dias']} dias.")
+            return
+
+        inicio = time.monotonic()
+
+        def progresso(arquivados):
+            self.stdout.write(f"{arquivados} protocolos arquivados...")
+
+        total = arquivamento.arquivar(
+            dias=options['dias'], tamanho_lote=options['lote'], pausa=options['pausa'],
+            maximo=options['maximo'], progresso=progresso if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} protocolos arquivados em {time.monotonic() - inicio:.1f}s."
+        ))
@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from suporte_app import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede latência (p50/p95/p99) e consultas das páginas principais sobre a base atual, "
+        "grava o resultado em JSON e aponta regressões em relação a uma execução base."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteracoes', type=int, default=20, help="Requisições medidas por cenário.")
+        parser.add_argument('--cenario', action='append', default=[],
+                            help="Restringe a este cenário (pode repetir).")
+        parser.add_argument('--saida', help="Arquivo JSON onde gravar o resultado.")
+        parser.add_argument('--base', help="Resultado JSON anterior para comparação.")
+        parser.add_argument('--tolerancia', type=float, default=0.25,
+                            help="Piora relativa do p95 aceita antes de apontar regressão (padrão: 0.25).")
+
+    def handle(self, *args, **options):
+        relatorio = benchmark.executar(iteracoes=options['iteracoes'], nomes=options['cenario'])
+
+        linhas = relatorio['linhas']
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{relatorio['banco']}: {linhas['protocolos']} protocolos, {linhas['dispositivos']} dispositivos, "
+            f"{linhas['clientes']} clientes"
+        ))
+        self.stdout.write(f"{'cenário':<26}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'consultas':>11}  status")
+        for nome, medida in relatorio['cenarios'].items():
+            self.stdout.write(
+                f"{nome:<26}{medida['p50_ms']:>10.1f}{medida['p95_ms']:>10.1f}{medida['p99_ms']:>10.1f}"
+                f"{medida['consultas']:>11}  {','.join(map(str, medida['status']))}"
+            )
+
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Resultado gravado em {options['saida']}.")
+
+        if options['base']:
+            with open(options['base'], encoding='utf-8') as arquivo:
+                base = json.load(arquivo)
+            regressoes = benchmark.comparar(relatorio, base, tolerancia=options['tolerancia'])
+            if regressoes:
+                raise CommandError("Regressões em relação à base:\n  " + "\n  ".join(regressoes))
+            self.stdout.write(self.style.SUCCESS("Sem regressões em relação à base."))
@@ -0,0 +1,40 @@
+import json
+import random
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from suporte_app.ingestao import IndiceDispositivos, medir_carga
+
+
+class Command(BaseCommand):
+    help = ("Teste de carga da ingestão MQTT com o broker em memória, sobre os dispositivos "
+            "do banco. As gravações são desfeitas ao final.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mensagens', type=int, default=100000)
+        parser.add_argument('--janela', type=float, default=0.2)
+        parser.add_argument('--semente', type=int, default=1)
+
+    def handle(self, *args, **options):
+        indice = IndiceDispositivos().carregar()
+        macs = list(indice.por_mac)
+        if not macs:
+            raise CommandError("Nenhum dispositivo com MAC válido no banco (use gerar_dados_sinteticos ou importar_dispositivos).")
+        aleatorio = random.Random(options['semente'])
+        mensagens = [
+            (f"dispositivos/{mac.replace(':', '')}/status", json.dumps({'online': aleatorio.random() < 0.9}))
+            for mac in (aleatorio.choice(macs) for _ in range(options['mensagens']))
+        ]
+
+        with transaction.atomic():
+            estatisticas = async_to_sync(medir_carga)(indice, mensagens, janela=options['janela'])
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{estatisticas['mensagens']} mensagens em {estatisticas['segundos']:.2f}s "
+            f"({estatisticas['mensagens_por_segundo']:.0f} msg/s); "
+            f"{estatisticas['linhas_gravadas']} linhas em {estatisticas['lotes_gravados']} lotes "
+            f"(amplificação de escrita {estatisticas['amplificacao_escrita']:.3f} linhas/mensagem)."
+        )
@@ -0,0 +1,43 @@
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from suporte_app.tempo_real import medir_conexoes
+
+
+class Command(BaseCommand):
+    help = ("Teste de carga do endpoint de eventos em tempo real: abre N conexões SSE ociosas "
+            "na aplicação ASGI (em processo, sem servidor HTTP) e publica um evento para todas.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conexoes', type=int, default=5000)
+        parser.add_argument('--memoria', action='store_true',
+                            help="Mede a memória por conexão com tracemalloc (abertura mais lenta).")
+
+    def handle(self, *args, **options):
+        usuario, criado = User.objects.get_or_create(username='benchmark', defaults={'is_staff': True})
+        if criado:
+            usuario.set_unusable_password()
+            usuario.save()
+        cliente = Client()
+        cliente.force_login(usuario)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={cliente.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            resultado = async_to_sync(medir_conexoes)(
+                ASGIHandler(), options['conexoes'], cabecalhos=[(b'cookie', cookie.encode())],
+                medir_memoria=options['memoria'])
+
+        memoria = resultado['memoria_por_conexao_kb']
+        self.stdout.write(
+            f"{resultado['conexoes']} conexões abertas em {resultado['segundos_abertura']:.2f}s "
+            f"(status {resultado['status']}); "
+            + (f"{memoria:.1f} KB por conexão, " if memoria is not None else "")
+            + f"{resultado['threads_adicionais']} threads adicionais.\n"
+            f"Evento entregue a {resultado['entregues']} conexões em {resultado['fanout_ms']:.1f} ms; "
+            f"{resultado['assinantes_apos_fechar']} assinaturas restantes após fechar."
+        )
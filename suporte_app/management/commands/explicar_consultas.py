@@ -0,0 +1,71 @@
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+
+from suporte_app.models import Cliente, Dispositivo, Protocolo, AtualizacaoProtocolo, STATUS_ABERTOS
+
+
+class Command(BaseCommand):
+    help = "Executa EXPLAIN nas consultas do admin e das views para conferir o uso dos índices."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyze', action='store_true',
+                            help="Usa EXPLAIN ANALYZE (executa as consultas; apenas PostgreSQL).")
+        parser.add_argument('--consulta', action='append', default=[],
+                            help="Restringe às consultas com este nome (pode repetir).")
+        parser.add_argument('--sql', action='store_true', help="Exibe também o SQL de cada consulta.")
+
+    def handle(self, *args, **options):
+        opcoes_explain = {}
+        if options['analyze'] and connection.vendor == 'postgresql':
+            opcoes_explain = {'analyze': True, 'buffers': True}
+
+        for nome, queryset in self.consultas():
+            if options['consulta'] and nome not in options['consulta']:
+                continue
+            self.stdout.write(self.style.MIGRATE_HEADING(f"== {nome}"))
+            if options['sql']:
+                self.stdout.write(str(queryset.query))
+            self.stdout.write(queryset.explain(**opcoes_explain))
+            self.stdout.write("")
+
+    def consultas(self):
+        """
+        Retorna (nome, queryset) para cada consulta quente do sistema, montadas
+        da mesma forma que o admin e as views as montam.
+        """
+        request = self.request_admin()
+        tecnico_id = Protocolo.objects.filter(tecnico_responsavel__isnull=False) \
+            .values_list('tecnico_responsavel', flat=True).first()
+        cliente_id = Cliente.objects.values_list('pk', flat=True).first()
+        protocolo_id = Protocolo.objects.values_list('pk', flat=True).first()
+
+        yield 'admin_protocolos', self.changelist(Protocolo, request)
+        yield 'admin_protocolos_status', self.changelist(Protocolo, request, status='aberto')
+        yield 'admin_protocolos_tecnico', self.changelist(Protocolo, request, tecnico_responsavel=tecnico_id)
+        yield 'admin_protocolos_cliente', self.changelist(Protocolo, request, cliente=cliente_id)
+        yield 'protocolos_abertos_tecnico', Protocolo.objects.filter(
+            tecnico_responsavel=tecnico_id, status__in=STATUS_ABERTOS).order_by('-id')[:25]
+        yield 'protocolos_cliente_recentes', Protocolo.objects.filter(
+            cliente=cliente_id).order_by('-criado_em')[:25]
+        yield 'admin_clientes', self.changelist(Cliente, request)
+        yield 'admin_dispositivos', self.changelist(Dispositivo, request)
+        yield 'protocolo_detalhe', Protocolo.objects.filter(pk=protocolo_id)
+        yield 'protocolo_atualizacoes', AtualizacaoProtocolo.objects.filter(
+            protocolo=protocolo_id).order_by('data_atualizacao')
+
+    def changelist(self, model, request, **filtros):
+        """
+        Queryset da primeira página da listagem do admin para o modelo.
+        """
+        model_admin = admin.site._registry[model]
+        queryset = model_admin.get_queryset(request).filter(**filtros)
+        ordering = model_admin.get_ordering(request) or model._meta.ordering
+        return queryset.order_by(*ordering)[:model_admin.list_per_page]
+
+    def request_admin(self):
+        request = RequestFactory().get('/admin/')
+        request.user = User.objects.filter(is_superuser=True).first() or User(is_superuser=True, is_staff=True)
+        return request
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from suporte_app import exportacao
+from suporte_app.api import ErroParametro, RecursoProtocolo
+from suporte_app.models import Protocolo
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta protocolos com a linha do tempo de atualizações (CSV ou XLSX), em stream e com memória "
+        "constante. Aceita os mesmos filtros da API de protocolos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=sorted(exportacao.FORMATOS), default='csv')
+        parser.add_argument('--saida', help="Arquivo de destino (padrão: saída padrão, só para CSV).")
+        parser.add_argument('--status')
+        parser.add_argument('--cliente', help="Id do cliente.")
+        parser.add_argument('--tecnico', help="Id do técnico responsável.")
+        parser.add_argument('--dispositivo', help="Id do dispositivo.")
+        parser.add_argument('--criado-de', help="Data (AAAA-MM-DD) ou data e hora ISO 8601.")
+        parser.add_argument('--criado-ate', help="Data (AAAA-MM-DD) ou data e hora ISO 8601.")
+
+    def handle(self, *args, **options):
+        formato = options['formato']
+        if formato == 'xlsx' and not options['saida']:
+            raise CommandError("Informe --saida para exportar em XLSX.")
+        recurso = RecursoProtocolo()
+        try:
+            protocolos = recurso.filtrar(Protocolo.objects.all(), {nome: options[nome] for nome in recurso.filtros})
+        except ErroParametro as erro:
+            raise CommandError(str(erro))
+
+        conteudo = exportacao.exportar(protocolos, formato)
+        if not options['saida']:
+            for parte in conteudo:
+                self.stdout.write(parte, ending='')
+            return
+        modo = {'mode': 'wb'} if formato == 'xlsx' else {'mode': 'w', 'encoding': 'utf-8', 'newline': ''}
+        with open(options['saida'], **modo) as arquivo:
+            for parte in conteudo:
+                arquivo.write(parte)
+        self.stdout.write(self.style.SUCCESS(f"Exportação gravada em {options['saida']}."))
@@ -0,0 +1,173 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from suporte_app import busca, metricas
+from suporte_app.models import Cliente, Dispositivo, Protocolo, AtualizacaoProtocolo
+
+TIPOS = ('sensor', 'camera', 'gateway', 'controlador', 'medidor')
+LOCAIS = ('recepção', 'estoque', 'escritório', 'portaria', 'garagem', 'laboratório')
+PROBLEMAS = (
+    "Dispositivo não responde ao ping",
+    "Leituras fora da faixa esperada",
+    "Perda intermitente de conexão MQTT",
+    "Firmware desatualizado após reinício",
+    "Bateria com carga baixa",
+    "Cliente relata falha no envio de alertas",
+)
+ANDAMENTOS = (
+    "Contato com o cliente para coleta de informações",
+    "Reinício remoto solicitado",
+    "Visita técnica agendada",
+    "Equipamento substituído",
+    "Configuração de rede revisada",
+)
+# Proporção dos status dos protocolos gerados
+PESOS_STATUS = (('aberto', 2), ('em_andamento', 2), ('concluido', 6))
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera um conjunto de dados sintético (clientes, dispositivos, protocolos e atualizações) "
+        "com inserções em massa, para testes de carga e benchmarks. Com a mesma --semente, gera os "
+        "mesmos dados. Ex.: --clientes 1000 --dispositivos-por-cliente 10 --protocolos 1000000"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=100)
+        parser.add_argument('--dispositivos-por-cliente', type=int, default=5)
+        parser.add_argument('--protocolos', type=int, default=10000)
+        parser.add_argument('--atualizacoes-por-protocolo', type=int, default=2)
+        parser.add_argument('--tecnicos', type=int, default=10)
+        parser.add_argument('--dias', type=int, default=180, help="Período (dias) das datas de criação.")
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument('--lote', type=int, default=5000, help="Linhas por INSERT em massa.")
+
+    def handle(self, *args, **options):
+        self.aleatorio = random.Random(options['semente'])
+        self.lote = options['lote']
+        inicio = time.monotonic()
+
+        tecnicos = self.gerar_tecnicos(options['tecnicos'])
+        dispositivos = self.gerar_clientes_e_dispositivos(options['clientes'], options['dispositivos_por_cliente'])
+        self.stdout.write(f"{len(dispositivos)} dispositivos prontos ({time.monotonic() - inicio:.1f}s).")
+        if dispositivos:
+            self.gerar_protocolos(options['protocolos'], options['atualizacoes_por_protocolo'],
+                                  dispositivos, tecnicos, options['dias'])
+        metricas.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"Dados gerados em {time.monotonic() - inicio:.1f}s."))
+
+    def gerar_tecnicos(self, quantidade):
+        existentes = set(User.objects.filter(username__startswith='tecnico_sint_').values_list('username', flat=True))
+        novos = [
+            User(username=f'tecnico_sint_{n}', is_staff=True)
+            for n in range(quantidade) if f'tecnico_sint_{n}' not in existentes
+        ]
+        for usuario in novos:
+            usuario.set_unusable_password()
+        User.objects.bulk_create(novos)
+        return list(User.objects.filter(username__startswith='tecnico_sint_').values_list('pk', flat=True))
+
+    def gerar_clientes_e_dispositivos(self, quantidade, por_cliente):
+        """
+        Retorna [(dispositivo_id, cliente_id)] dos dispositivos criados. Os e-mails
+        e MACs continuam a numeração de execuções anteriores.
+        """
+        primeiro_cliente = Cliente.objects.filter(email__endswith='@sintetico.exemplo').count()
+        primeiro_mac = Dispositivo.objects.filter(mac_address__startswith='02:').count()
+        clientes_por_lote = max(self.lote // max(por_cliente, 1), 1)
+        dispositivos = []
+        for inicio in range(0, quantidade, clientes_por_lote):
+            numeros = range(primeiro_cliente + inicio, primeiro_cliente + min(inicio + clientes_por_lote, quantidade))
+            with transaction.atomic():
+                clientes = [
+                    Cliente(nome=f"Cliente {n:07d}", email=f"cliente{n:07d}@sintetico.exemplo",
+                            telefone=f"(11) 9{n % 10000:04d}-{n % 9973:04d}")
+                    for n in numeros
+                ]
+                Cliente.objects.bulk_create(clientes)
+                ids = (
+                    Cliente.objects.filter(email__in=[cliente.email for cliente in clientes])
+                    .order_by('pk').values_list('pk', flat=True)
+                )
+                novos = []
+                for cliente_id in ids:
+                    for _ in range(por_cliente):
+                        numero = primeiro_mac
+                        primeiro_mac += 1
+                        tipo = self.aleatorio.choice(TIPOS)
+                        novos.append(Dispositivo(
+                            cliente_id=cliente_id,
+                            nome=f"{tipo}-{numero:07d}",
+                            tipo=tipo,
+                            mac_address='02:' + ':'.join(f'{(numero >> deslocamento) & 0xFF:02X}'
+                                                         for deslocamento in (32, 24, 16, 8, 0)),
+                            localizacao=self.aleatorio.choice(LOCAIS),
+                            online=self.aleatorio.random() < 0.9,
+                        ))
+                Dispositivo.objects.bulk_create(novos, batch_size=self.lote)
+                dispositivos.extend(
+                    Dispositivo.objects.filter(mac_address__in=[d.mac_address for d in novos])
+                    .order_by('pk').values_list('pk', 'cliente_id')
+                )
+        return dispositivos
+
+    def gerar_protocolos(self, quantidade, atualizacoes, dispositivos, tecnicos, dias):
+        agora = timezone.now()
+        status_possiveis = [status for status, peso in PESOS_STATUS for _ in range(peso)]
+        gerados = 0
+        while gerados < quantidade:
+            tamanho = min(self.lote, quantidade - gerados)
+            protocolos = [self.novo_protocolo(dispositivos, tecnicos, status_possiveis, agora, dias)
+                          for _ in range(tamanho)]
+            with transaction.atomic():
+                Protocolo.objects.bulk_create(protocolos)
+                ids = [protocolo.pk for protocolo in protocolos]
+                if None in ids:
+                    # Bancos sem RETURNING no INSERT em massa: os últimos ids inseridos
+                    ids = sorted(Protocolo.objects.order_by('-pk').values_list('pk', flat=True)[:tamanho])
+                # Protocolos ainda abertos só têm atualizações sem técnico (sem primeira resposta)
+                novas = [
+                    AtualizacaoProtocolo(
+                        protocolo_id=protocolo_id,
+                        texto=self.aleatorio.choice(ANDAMENTOS),
+                        tecnico_id=protocolo.tecnico_responsavel_id,
+                    )
+                    for protocolo_id, protocolo in zip(ids, protocolos) for _ in range(atualizacoes)
+                ]
+                AtualizacaoProtocolo.objects.bulk_create(novas, batch_size=self.lote)
+                # data_atualizacao é auto_now_add: alinha com a criação do protocolo em um UPDATE
+                AtualizacaoProtocolo.objects.filter(protocolo_id__in=ids).update(
+                    data_atualizacao=Subquery(Protocolo.objects.filter(pk=OuterRef('protocolo_id')).values('criado_em')[:1])
+                )
+                busca.indexar(ids)
+            gerados += tamanho
+            self.stdout.write(f"{gerados}/{quantidade} protocolos...")
+
+    def novo_protocolo(self, dispositivos, tecnicos, status_possiveis, agora, dias):
+        dispositivo_id, cliente_id = self.aleatorio.choice(dispositivos)
+        status = self.aleatorio.choice(status_possiveis)
+        criado_em = agora - timedelta(seconds=self.aleatorio.randint(0, dias * 86400))
+        primeira_resposta_em = concluido_em = None
+        if status != 'aberto':
+            primeira_resposta_em = min(criado_em + timedelta(minutes=self.aleatorio.expovariate(1 / 45)), agora)
+        if status == 'concluido':
+            concluido_em = min(primeira_resposta_em + timedelta(hours=self.aleatorio.expovariate(1 / 20)), agora)
+        numero = self.aleatorio.randint(0, 10 ** 8)
+        return Protocolo(
+            dispositivo_id=dispositivo_id,
+            cliente_id=cliente_id,
+            tecnico_responsavel_id=self.aleatorio.choice(tecnicos) if tecnicos and status != 'aberto' else None,
+            buic=f"BU{numero:08d}" if self.aleatorio.random() < 0.3 else None,
+            descricao=f"{self.aleatorio.choice(PROBLEMAS)} (ref. {numero}).",
+            status=status,
+            criado_em=criado_em,
+            primeira_resposta_em=primeira_resposta_em,
+            concluido_em=concluido_em,
+        )
@@ -0,0 +1,54 @@
+import csv
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from suporte_app import importacao
+
+
+class Command(BaseCommand):
+    help = "Importa clientes e dispositivos em massa de um arquivo CSV ou JSONL."
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help="Caminho do arquivo (.csv ou .jsonl).")
+        parser.add_argument('--formato', choices=('csv', 'jsonl'),
+                            help="Formato do arquivo (padrão: deduzido pela extensão).")
+        parser.add_argument('--lote', type=int, default=importacao.TAMANHO_LOTE,
+                            help="Quantidade de linhas gravadas por transação.")
+        parser.add_argument('--erros', help="Grava o relatório de linhas rejeitadas neste CSV.")
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        caminho = Path(options['arquivo'])
+        if not caminho.exists():
+            raise CommandError(f"Arquivo não encontrado: {caminho}")
+        formato = options['formato'] or ('jsonl' if caminho.suffix.lower() in ('.jsonl', '.ndjson') else 'csv')
+
+        arquivo_erros = open(options['erros'], 'w', newline='', encoding='utf-8') if options['erros'] else None
+        try:
+            relatorio = None
+            if arquivo_erros:
+                relatorio = csv.writer(arquivo_erros)
+                relatorio.writerow(['linha', 'erro', 'registro'])
+            with open(caminho, encoding='utf-8-sig', newline='') as arquivo:
+                resultado = importacao.importar(
+                    importacao.ler_registros(arquivo, formato),
+                    tamanho_lote=options['lote'],
+                    relatorio=relatorio,
+                    progresso=self.progresso,
+                )
+        finally:
+            if arquivo_erros:
+                arquivo_erros.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado.importados} dispositivos importados, {resultado.clientes_criados} clientes criados, "
+            f"{resultado.quantidade_erros} linhas rejeitadas em {resultado.segundos:.1f}s "
+            f"({resultado.linhas_por_segundo:.0f} linhas/s)."
+        ))
+        for numero, mensagem in resultado.erros[:20]:
+            self.stderr.write(f"Linha {numero}: {mensagem}")
+
+    def progresso(self, resultado):
+        if self.verbosity >= 2:
+            self.stdout.write(f"{resultado.lidos} linhas lidas ({resultado.linhas_por_segundo:.0f} linhas/s)")
@@ -0,0 +1,41 @@
+
+from django.conf import settings
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+
+from suporte_app import metricas
+from suporte_app.eventos import processar_transicoes
+from suporte_app.ingestao import BrokerMqtt, IndiceDispositivos, IngestorStatus
+
+
+class Command(BaseCommand):
+    help = "Assina os tópicos MQTT de status e mantém Dispositivo.online/ultimo_contato atualizados."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default=settings.MQTT_HOST)
+        parser.add_argument('--porta', type=int, default=settings.MQTT_PORT)
+        parser.add_argument('--topico', action='append', dest='topicos',
+                            help="Tópico a assinar (pode repetir; padrão: MQTT_TOPICOS_STATUS).")
+        parser.add_argument('--janela', type=float, default=settings.MQTT_JANELA_SEGUNDOS,
+                            help="Segundos entre gravações em lote.")
+        parser.add_argument('--sem-protocolos', action='store_true',
+                            help="Não abre protocolos automaticamente quando um dispositivo fica offline.")
+
+    def handle(self, *args, **options):
+        indice = IndiceDispositivos().carregar()
+        self.stdout.write(f"Índice carregado: {len(indice.por_mac)} MACs, {len(indice.por_buic)} BUICs, "
+                          f"{len(indice.por_topico)} tópicos.")
+        broker = BrokerMqtt(options['host'], options['porta'], options['topicos'] or settings.MQTT_TOPICOS_STATUS)
+
+        def ao_gravar(transicoes):
+            metricas.registrar_transicoes(transicoes)
+            if not options['sem_protocolos']:
+                processar_transicoes(transicoes)
+
+        ingestor = IngestorStatus(broker, indice, janela=options['janela'], ao_gravar=ao_gravar)
+        try:
+            async_to_sync(ingestor.executar)()
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"{ingestor.mensagens} mensagens, {ingestor.ignoradas} ignoradas, "
+                          f"{ingestor.linhas_gravadas} linhas gravadas.")
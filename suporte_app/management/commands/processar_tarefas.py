@@ -0,0 +1,61 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from suporte_app import fila
+
+
+class Command(BaseCommand):
+    help = (
+        "Executa as tarefas de segundo plano da fila (reindexações, e-mails). Vários processos "
+        "podem rodar ao mesmo tempo; termina com SIGINT/SIGTERM depois dos lotes em andamento."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concorrencia', type=int, default=settings.TAREFAS_CONCORRENCIA,
+                            help="Threads trabalhadoras (padrão: TAREFAS_CONCORRENCIA).")
+        parser.add_argument('--lote', type=int, default=settings.TAREFAS_LOTE,
+                            help="Tarefas reservadas por vez em cada thread.")
+        parser.add_argument('--uma-vez', action='store_true',
+                            help="Esvazia as tarefas vencidas e termina (ex.: cron).")
+        parser.add_argument('--limpar', type=int, metavar='DIAS',
+                            help="Remove as tarefas concluídas há mais de DIAS dias e termina.")
+
+    def handle(self, *args, **options):
+        if options['limpar'] is not None:
+            total = fila.limpar(options['limpar'])
+            self.stdout.write(self.style.SUCCESS(f"{total} tarefas concluídas removidas."))
+            return
+
+        concorrencia = options['concorrencia']
+        if connection.vendor == 'sqlite' and concorrencia > 1:
+            # Transações concorrentes de escrita falham com "database is locked" no SQLite
+            self.stderr.write("SQLite serializa as escritas: usando uma única thread.")
+            concorrencia = 1
+
+        parar = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            for sinal in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(sinal, lambda *_: parar.set())
+
+        resultados = []
+
+        def trabalhar():
+            try:
+                resultados.append(fila.processar(parar=parar, lote=options['lote'], uma_vez=options['uma_vez']))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=trabalhar, name=f'tarefas-{numero}')
+                   for numero in range(concorrencia)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        concluidas = sum(resultado['concluidas'] for resultado in resultados)
+        falhas = sum(resultado['falhas'] for resultado in resultados)
+        self.stdout.write(self.style.SUCCESS(f"{concluidas} tarefas concluídas, {falhas} falhas."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from suporte_app import metricas
+
+
+class Command(BaseCommand):
+    help = "Recalcula do zero os contadores do painel de operações (execução periódica, ex.: cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dimensao', action='append', dest='dimensoes',
+                            choices=('status', 'tecnico', 'cliente', 'dia', 'tipo'),
+                            help="Recalcula apenas esta dimensão (pode repetir).")
+
+    def handle(self, *args, **options):
+        total = metricas.reconstruir(dimensoes=options['dimensoes'])
+        self.stdout.write(self.style.SUCCESS(f"{total} contadores recalculados."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from suporte_app import busca
+
+
+class Command(BaseCommand):
+    help = "Reconstrói o índice de busca textual de todos os protocolos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=busca.TAMANHO_LOTE,
+                            help="Quantidade de protocolos por lote.")
+
+    def handle(self, *args, **options):
+        total = busca.reindexar_tudo(tamanho_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"{total} protocolos indexados."))
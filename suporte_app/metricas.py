@@ -0,0 +1,264 @@
+"""
+Métricas pré-agregadas do painel de operações.
+
+Os contadores ficam na tabela Metrica, por dimensão:
+
+* status  -> protocolos por status ('aberto')
+* tecnico -> protocolos por técnico e status ('7:aberto'; técnico vazio = sem técnico)
+* cliente -> protocolos por cliente e status ('12:concluido')
+* dia     -> protocolos abertos por dia ('2025-08-08')
+* tipo    -> dispositivos por tipo e estado ('sensor:online')
+
+Eles são ajustados incrementalmente pelos sinais dos modelos (e pelos caminhos
+em massa que não disparam sinais) e podem ser reconstruídos do zero com o
+comando reconstruir_metricas. O painel lê só essa tabela, cujo tamanho não
+depende da quantidade de protocolos, e guarda o resultado em cache com uma
+versão que é incrementada a cada alteração dos contadores.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Cliente, Dispositivo, Protocolo, Metrica, STATUS_CHOICES
+
+CHAVE_VERSAO = 'metricas:versao'
+
+# Quantidade de técnicos/clientes exibidos no painel e dias do histórico
+LIMITE_RANKING = 20
+DIAS_HISTORICO = 30
+
+
+def chaves_protocolo(status, tecnico_id, cliente_id, criado_em=None):
+    chaves = [
+        ('status', status),
+        ('tecnico', f"{tecnico_id or ''}:{status}"),
+        ('cliente', f"{cliente_id or ''}:{status}"),
+    ]
+    if criado_em is not None:
+        chaves.append(('dia', timezone.localtime(criado_em).date().isoformat()))
+    return chaves
+
+
+def chaves_dispositivo(tipo, online):
+    return [('tipo', f"{tipo}:{'online' if online else 'offline'}")]
+
+
+def invalidar():
+    """
+    Invalida o painel em cache (nova versão de chave).
+    """
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        cache.set(CHAVE_VERSAO, 1, None)
+
+
+def ajustar(deltas):
+    """
+    Soma os deltas {(dimensao, chave): n} aos contadores com UPDATE ... SET valor = valor + n,
+    criando os contadores que ainda não existem. Chaves da mesma dimensão com o
+    mesmo delta são ajustadas juntas (um UPDATE por grupo nas operações em massa).
+    """
+    grupos = {}
+    for (dimensao, chave), delta in deltas.items():
+        if delta:
+            grupos.setdefault((dimensao, delta), []).append(chave)
+    if not grupos:
+        return
+    for (dimensao, delta), chaves in grupos.items():
+        if len(chaves) == 1:
+            _ajustar_contador(dimensao, chaves[0], delta)
+            continue
+        # Garante os contadores (zerados, sem erro para os que já existem) e soma de uma vez
+        Metrica.objects.bulk_create([Metrica(dimensao=dimensao, chave=chave, valor=0) for chave in chaves],
+                                    batch_size=1000, ignore_conflicts=True)
+        for inicio in range(0, len(chaves), 1000):
+            Metrica.objects.filter(dimensao=dimensao, chave__in=chaves[inicio:inicio + 1000]).update(
+                valor=F('valor') + delta)
+    transaction.on_commit(invalidar)
+
+
+def _ajustar_contador(dimensao, chave, delta):
+    contador = Metrica.objects.filter(dimensao=dimensao, chave=chave)
+    if contador.update(valor=F('valor') + delta):
+        return
+    try:
+        with transaction.atomic():
+            Metrica.objects.create(dimensao=dimensao, chave=chave, valor=delta)
+    except IntegrityError:
+        contador.update(valor=F('valor') + delta)
+
+
+def contabilizar_protocolos(protocolos, sinal=1):
+    """
+    Ajusta os contadores para protocolos criados (sinal=1) ou removidos (sinal=-1)
+    em massa, sem passar pelos sinais dos modelos.
+    """
+    deltas = Counter()
+    for protocolo in protocolos:
+        for chave in chaves_protocolo(protocolo.status, protocolo.tecnico_responsavel_id,
+                                      protocolo.cliente_id, protocolo.criado_em):
+            deltas[chave] += sinal
+    ajustar(deltas)
+
+
+def registrar_transicoes(transicoes):
+    """
+    Ajusta os contadores de dispositivos por tipo a partir das transições
+    [(dispositivo_id, online_anterior, online_atual, instante)] da ingestão MQTT.
+    """
+    transicoes = [t for t in transicoes if t[1] is not None and t[1] != t[2]]
+    if not transicoes:
+        return
+    tipos = dict(
+        Dispositivo.objects.filter(pk__in=[t[0] for t in transicoes]).order_by().values_list('pk', 'tipo')
+    )
+    deltas = Counter()
+    for dispositivo_id, anterior, online, _ in transicoes:
+        if dispositivo_id in tipos:
+            deltas[chaves_dispositivo(tipos[dispositivo_id], anterior)[0]] -= 1
+            deltas[chaves_dispositivo(tipos[dispositivo_id], online)[0]] += 1
+    ajustar(deltas)
+
+
+def _contagens_protocolos():
+    contagens = Counter()
+    por_grupo = (
+        Protocolo.objects.order_by()
+        .values_list('status', 'tecnico_responsavel_id', 'cliente_id')
+        .annotate(total=Count('pk'))
+    )
+    for status, tecnico_id, cliente_id, total in por_grupo:
+        for chave in chaves_protocolo(status, tecnico_id, cliente_id):
+            contagens[chave] += total
+    por_dia = (
+        Protocolo.objects.order_by()
+        .annotate(dia=TruncDate('criado_em'))
+        .values_list('dia')
+        .annotate(total=Count('pk'))
+    )
+    for dia, total in por_dia:
+        contagens[('dia', dia.isoformat())] += total
+    return contagens
+
+
+def _contagens_dispositivos():
+    contagens = Counter()
+    por_tipo = Dispositivo.objects.order_by().values_list('tipo', 'online').annotate(total=Count('pk'))
+    for tipo, online, total in por_tipo:
+        contagens[chaves_dispositivo(tipo, online)[0]] += total
+    return contagens
+
+
+def reconstruir(dimensoes=None):
+    """
+    Recalcula os contadores com GROUP BY e substitui os atuais em uma transação.
+    `dimensoes` restringe a reconstrução (ex.: ('tipo',)).
+    """
+    contagens = Counter()
+    if dimensoes is None or set(dimensoes) - {'tipo'}:
+        contagens.update(_contagens_protocolos())
+    if dimensoes is None or 'tipo' in dimensoes:
+        contagens.update(_contagens_dispositivos())
+    if dimensoes is not None:
+        contagens = Counter({chave: total for chave, total in contagens.items() if chave[0] in dimensoes})
+
+    with transaction.atomic():
+        antigas = Metrica.objects.all()
+        if dimensoes is not None:
+            antigas = antigas.filter(dimensao__in=dimensoes)
+        antigas.delete()
+        Metrica.objects.bulk_create(
+            [Metrica(dimensao=dimensao, chave=chave, valor=total) for (dimensao, chave), total in contagens.items()],
+            batch_size=1000,
+        )
+        transaction.on_commit(invalidar)
+    return len(contagens)
+
+
+def _agrupar(contadores, por_id=False):
+    """
+    Converte {'7:aberto': 3, '7:concluido': 1} em {7: {'aberto': 3, 'concluido': 1}}.
+    Com por_id, o grupo vira inteiro (ou None para "sem técnico/cliente").
+    """
+    grupos = {}
+    for chave, valor in contadores.items():
+        grupo, _, subchave = chave.rpartition(':')
+        if por_id:
+            grupo = int(grupo) if grupo.isdigit() else None
+        grupos.setdefault(grupo, {})[subchave] = valor
+    return grupos
+
+
+def _ranking(linhas, nomes, rotulo_vazio):
+    """
+    Monta o ranking [{id, nome, aberto, em_andamento, concluido, total}] ordenado
+    pelos protocolos em aberto.
+    """
+    ranking = []
+    for identificador, por_status in linhas.items():
+        item = {'id': identificador, 'nome': nomes.get(identificador, rotulo_vazio if not identificador else "?")}
+        for status, _ in STATUS_CHOICES:
+            item[status] = por_status.get(status, 0)
+        item['total'] = sum(por_status.values())
+        ranking.append(item)
+    ranking.sort(key=lambda item: (item['aberto'] + item['em_andamento'], item['total']), reverse=True)
+    return ranking[:LIMITE_RANKING]
+
+
+def montar_painel():
+    """
+    Lê os contadores e monta os dados do painel (sem consultar Protocolo/Dispositivo).
+    """
+    por_dimensao = {'status': {}, 'tecnico': {}, 'cliente': {}, 'dia': {}, 'tipo': {}}
+    for dimensao, chave, valor in Metrica.objects.values_list('dimensao', 'chave', 'valor'):
+        por_dimensao.setdefault(dimensao, {})[chave] = valor
+
+    tecnicos = _agrupar(por_dimensao['tecnico'], por_id=True)
+    clientes = _agrupar(por_dimensao['cliente'], por_id=True)
+    nomes_tecnicos = dict(User.objects.filter(pk__in=[pk for pk in tecnicos if pk]).values_list('pk', 'username'))
+    nomes_clientes = dict(Cliente.objects.filter(pk__in=[pk for pk in clientes if pk]).values_list('pk', 'nome'))
+
+    tipos = []
+    for tipo, estados in sorted(_agrupar(por_dimensao['tipo']).items()):
+        total = estados.get('online', 0) + estados.get('offline', 0)
+        tipos.append({
+            'tipo': tipo,
+            'online': estados.get('online', 0),
+            'offline': estados.get('offline', 0),
+            'proporcao_online': estados.get('online', 0) / total if total else 0.0,
+        })
+
+    hoje = timezone.localdate()
+    dias = [(hoje - timedelta(days=n)).isoformat() for n in range(DIAS_HISTORICO - 1, -1, -1)]
+    return {
+        'por_status': [
+            {'status': status, 'rotulo': rotulo, 'total': por_dimensao['status'].get(status, 0)}
+            for status, rotulo in STATUS_CHOICES
+        ],
+        'por_tecnico': _ranking(tecnicos, nomes_tecnicos, "Sem técnico"),
+        'por_cliente': _ranking(clientes, nomes_clientes, "Sem cliente"),
+        'por_tipo': tipos,
+        'por_dia': [{'dia': dia, 'total': por_dimensao['dia'].get(dia, 0)} for dia in dias],
+        'gerado_em': timezone.now(),
+    }
+
+
+def painel():
+    """
+    Dados do painel, do cache quando disponíveis.
+    """
+    versao = cache.get_or_set(CHAVE_VERSAO, 1, None)
+    chave = f"metricas:painel:{versao}"
+    dados = cache.get(chave)
+    if dados is None:
+        dados = montar_painel()
+        cache.set(chave, dados, settings.METRICAS_CACHE_SEGUNDOS)
+    return dados
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100, verbose_name='Nome')),
+                ('email', models.EmailField(max_length=254, unique=True, verbose_name='E-mail')),
+                ('telefone', models.CharField(max_length=20, verbose_name='Telefone')),
+            ],
+            options={
+                'verbose_name': 'Cliente',
+                'verbose_name_plural': 'Clientes',
+                'ordering': ['nome'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Dispositivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100, verbose_name='Nome do Dispositivo')),
+                ('tipo', models.CharField(max_length=50, verbose_name='Tipo')),
+                ('mac_address', models.CharField(max_length=50, unique=True, verbose_name='Endereço MAC')),
+                ('localizacao', models.CharField(max_length=100, verbose_name='Localização')),
+                ('online', models.BooleanField(default=False, verbose_name='Online')),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='suporte_app.cliente', verbose_name='Cliente')),
+            ],
+            options={
+                'verbose_name': 'Dispositivo',
+                'verbose_name_plural': 'Dispositivos',
+                'ordering': ['cliente__nome', 'nome'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Protocolo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('buic', models.CharField(blank=True, help_text='Código BUIC do dispositivo', max_length=100, null=True, verbose_name='BUIC')),
+                ('topico_mqtt', models.CharField(blank=True, max_length=100, null=True, verbose_name='Tópico MQTT')),
+                ('payload_exemplo', models.TextField(blank=True, null=True, verbose_name='Payload de Exemplo')),
+                ('descricao', models.TextField(help_text='Descreva detalhadamente o problema reportado', verbose_name='Descrição do Problema')),
+                ('status', models.CharField(choices=[('aberto', 'Aberto'), ('em_andamento', 'Em Andamento'), ('concluido', 'Concluído')], default='aberto', max_length=20, verbose_name='Status')),
+                ('cliente', models.ForeignKey(blank=True, help_text='Cliente para o qual o protocolo está sendo aberto', null=True, on_delete=django.db.models.deletion.CASCADE, to='suporte_app.cliente', verbose_name='Cliente')),
+                ('dispositivo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='suporte_app.dispositivo', verbose_name='Dispositivo')),
+                ('tecnico_responsavel', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Técnico Responsável')),
+            ],
+            options={
+                'verbose_name': 'Protocolo',
+                'verbose_name_plural': 'Protocolos',
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AtualizacaoProtocolo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('texto', models.TextField(help_text='Descreva o que foi feito ou observado', verbose_name='Atualização')),
+                ('data_atualizacao', models.DateTimeField(auto_now_add=True, verbose_name='Data da Atualização')),
+                ('tecnico', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Técnico')),
+                ('protocolo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='atualizacoes', to='suporte_app.protocolo', verbose_name='Protocolo')),
+            ],
+            options={
+                'verbose_name': 'Atualização do Protocolo',
+                'verbose_name_plural': 'Atualizações do Protocolo',
+                'ordering': ['data_atualizacao'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suporte_app', '0001_initial'),
+    ]
+
+    operations = [
+        # Criado como nulo para permitir o preenchimento dos registros existentes
+        # na migração seguinte.
+        migrations.AddField(
+            model_name='protocolo',
+            name='criado_em',
+            field=models.DateTimeField(db_index=True, editable=False, null=True, verbose_name='Data de Criação'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+from django.db.models import Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Now
+
+
+def preencher_criado_em(apps, schema_editor):
+    """
+    Preenche criado_em com a data da primeira atualização de cada protocolo.
+    Protocolos sem atualizações recebem a data atual. Executa um único UPDATE.
+    """
+    Protocolo = apps.get_model('suporte_app', 'Protocolo')
+    AtualizacaoProtocolo = apps.get_model('suporte_app', 'AtualizacaoProtocolo')
+
+    primeira_atualizacao = (
+        AtualizacaoProtocolo.objects
+        .filter(protocolo=OuterRef('pk'))
+        .order_by()
+        .values('protocolo')
+        .annotate(primeira=Min('data_atualizacao'))
+        .values('primeira')
+    )
+    Protocolo.objects.using(schema_editor.connection.alias).filter(criado_em__isnull=True).update(
+        criado_em=Coalesce(Subquery(primeira_atualizacao), Now())
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suporte_app', '0002_protocolo_criado_em'),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_criado_em, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suporte_app', '0003_preencher_protocolo_criado_em'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='protocolo',
+            name='criado_em',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False, verbose_name='Data de Criação'),
+        ),
+    ]
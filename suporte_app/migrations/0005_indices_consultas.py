@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suporte_app', '0004_alter_protocolo_criado_em'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='atualizacaoprotocolo',
+            index=models.Index(fields=['protocolo', 'data_atualizacao'], name='atualizacao_protocolo_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['nome'], name='cliente_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dispositivo',
+            index=models.Index(fields=['cliente', 'nome'], name='dispositivo_cliente_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='protocolo',
+            index=models.Index(condition=models.Q(('status__in', ('aberto', 'em_andamento'))), fields=['tecnico_responsavel', '-id'], name='protocolo_abertos_tecnico_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='protocolo',
+            index=models.Index(fields=['tecnico_responsavel', 'status', '-id'], name='protocolo_tecnico_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='protocolo',
+            index=models.Index(fields=['status', '-id'], name='protocolo_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='protocolo',
+            index=models.Index(fields=['cliente', '-criado_em'], name='protocolo_cliente_recente_idx'),
+        ),
+    ]
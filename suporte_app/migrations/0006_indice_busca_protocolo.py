@@ -0,0 +1,71 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Cópia do DDL da época desta migração: não depende do código atual de suporte_app.busca
+TABELA_INDICE = 'suporte_app_indicebuscaprotocolo'
+TABELA_FTS = 'suporte_app_protocolo_fts'
+INDICE_GIN = 'indice_busca_documento_gin'
+
+SQL_POSTGRESQL = [
+    f"CREATE INDEX IF NOT EXISTS {INDICE_GIN} ON {TABELA_INDICE} "
+    f"USING GIN (to_tsvector('portuguese', documento))",
+]
+
+SQL_SQLITE = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} USING fts5("
+    f"documento, content='{TABELA_INDICE}', content_rowid='protocolo_id', "
+    f"tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ai AFTER INSERT ON {TABELA_INDICE} BEGIN "
+    f"INSERT INTO {TABELA_FTS}(rowid, documento) VALUES (new.protocolo_id, new.documento); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ad AFTER DELETE ON {TABELA_INDICE} BEGIN "
+    f"INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, documento) "
+    f"VALUES ('delete', old.protocolo_id, old.documento); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_au AFTER UPDATE ON {TABELA_INDICE} BEGIN "
+    f"INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, documento) "
+    f"VALUES ('delete', old.protocolo_id, old.documento); "
+    f"INSERT INTO {TABELA_FTS}(rowid, documento) VALUES (new.protocolo_id, new.documento); END",
+]
+
+
+def criar_indice_textual(apps, schema_editor):
+    """
+    Cria o índice textual específico do banco (PostgreSQL e SQLite; nos demais a busca usa LIKE).
+    """
+    comandos = {'postgresql': SQL_POSTGRESQL, 'sqlite': SQL_SQLITE}.get(schema_editor.connection.vendor, [])
+    for sql in comandos:
+        schema_editor.execute(sql)
+
+
+def remover_indice_textual(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f"DROP INDEX IF EXISTS {INDICE_GIN}")
+    elif vendor == 'sqlite':
+        for sufixo in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {TABELA_FTS}_{sufixo}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABELA_FTS}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suporte_app', '0005_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceBuscaProtocolo',
+            fields=[
+                ('protocolo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='indice_busca', serialize=False, to='suporte_app.protocolo', verbose_name='Protocolo')),
+                ('documento', models.TextField(verbose_name='Documento')),
+            ],
+            options={
+                'verbose_name': 'Índice de Busca',
+                'verbose_name_plural': 'Índices de Busca',
+            },
+        ),
+        # Índice GIN (PostgreSQL) ou tabela FTS5 (SQLite); depois rode `reindexar_busca`
+        migrations.RunPython(criar_indice_textual, remover_indice_textual),
+    ]
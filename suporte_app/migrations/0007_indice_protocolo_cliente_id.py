@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suporte_app', '0006_indice_busca_protocolo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='protocolo',
+            index=models.Index(fields=['cliente', '-id'], name='protocolo_cliente_id_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suporte_app', '0007_indice_protocolo_cliente_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dispositivo',
+            name='ultimo_contato',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Último Contato'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suporte_app', '0008_dispositivo_ultimo_contato'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='protocolo',
+            name='origem',
+            field=models.CharField(choices=[('manual', 'Manual'), ('automatico', 'Automático')], default='manual', editable=False, max_length=20, verbose_name='Origem'),
+        ),
+        migrations.CreateModel(
+            name='Incidente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('descricao', models.TextField(verbose_name='Descrição')),
+                ('status', models.CharField(choices=[('aberto', 'Aberto'), ('em_andamento', 'Em Andamento'), ('concluido', 'Concluído')], default='aberto', max_length=20, verbose_name='Status')),
+                ('criado_em', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Data de Criação')),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='suporte_app.cliente', verbose_name='Cliente')),
+            ],
+            options={
+                'verbose_name': 'Incidente',
+                'verbose_name_plural': 'Incidentes',
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='protocolo',
+            name='incidente',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='protocolos', to='suporte_app.incidente', verbose_name='Incidente'),
+        ),
+        migrations.AddIndex(
+            model_name='protocolo',
+            index=models.Index(condition=models.Q(('status__in', ('aberto', 'em_andamento'))), fields=['dispositivo', '-criado_em'], name='protocolo_abertos_disp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='incidente',
+            index=models.Index(fields=['cliente', 'status', '-criado_em'], name='incidente_cliente_status_idx'),
+        ),
+    ]
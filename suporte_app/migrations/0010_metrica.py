@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suporte_app', '0009_protocolos_automaticos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Metrica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimensao', models.CharField(max_length=30, verbose_name='Dimensão')),
+                ('chave', models.CharField(max_length=200, verbose_name='Chave')),
+                ('valor', models.BigIntegerField(default=0, verbose_name='Valor')),
+            ],
+            options={
+                'verbose_name': 'Métrica',
+                'verbose_name_plural': 'Métricas',
+                'constraints': [models.UniqueConstraint(fields=('dimensao', 'chave'), name='metrica_dimensao_chave_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:01
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, Min, OuterRef, Subquery
+
+
+def preencher_marcos_sla(apps, schema_editor):
+    """
+    Preenche os marcos de SLA a partir das atualizações existentes, com dois UPDATEs:
+    primeira_resposta_em = primeira atualização feita por um técnico e
+    concluido_em = última atualização dos protocolos já concluídos.
+    """
+    Protocolo = apps.get_model('suporte_app', 'Protocolo')
+    AtualizacaoProtocolo = apps.get_model('suporte_app', 'AtualizacaoProtocolo')
+    protocolos = Protocolo.objects.using(schema_editor.connection.alias)
+
+    def data_atualizacao(agregado, **filtros):
+        return Subquery(
+            AtualizacaoProtocolo.objects
+            .filter(protocolo=OuterRef('pk'), **filtros)
+            .order_by()
+            .values('protocolo')
+            .annotate(data=agregado('data_atualizacao'))
+            .values('data')
+        )
+
+    protocolos.filter(primeira_resposta_em__isnull=True).update(
+        primeira_resposta_em=data_atualizacao(Min, tecnico__isnull=False)
+    )
+    protocolos.filter(status='concluido', concluido_em__isnull=True).update(
+        concluido_em=data_atualizacao(Max)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suporte_app', '0010_metrica'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='protocolo',
+            name='concluido_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Concluído em'),
+        ),
+        migrations.AddField(
+            model_name='protocolo',
+            name='primeira_resposta_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Primeira Resposta'),
+        ),
+        migrations.CreateModel(
+            name='TransicaoStatusProtocolo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status_anterior', models.CharField(choices=[('aberto', 'Aberto'), ('em_andamento', 'Em Andamento'), ('concluido', 'Concluído')], max_length=20, verbose_name='Status Anterior')),
+                ('status_novo', models.CharField(choices=[('aberto', 'Aberto'), ('em_andamento', 'Em Andamento'), ('concluido', 'Concluído')], max_length=20, verbose_name='Novo Status')),
+                ('criado_em', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Data')),
+                ('autor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Autor')),
+                ('protocolo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transicoes', to='suporte_app.protocolo', verbose_name='Protocolo')),
+            ],
+            options={
+                'verbose_name': 'Transição de Status',
+                'verbose_name_plural': 'Transições de Status',
+                'ordering': ['criado_em'],
+                'indexes': [models.Index(fields=['protocolo', 'criado_em'], name='transicao_protocolo_data_idx')],
+            },
+        ),
+        migrations.RunPython(preencher_marcos_sla, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:12
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suporte_app', '0011_transicoes_status_sla'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(django.db.models.functions.text.Upper('nome'), name='cliente_nome_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dispositivo',
+            index=models.Index(django.db.models.functions.text.Upper('nome'), name='dispositivo_nome_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='protocolo',
+            index=models.Index(django.db.models.functions.text.Upper('buic'), name='protocolo_buic_upper_idx'),
+        ),
+    ]
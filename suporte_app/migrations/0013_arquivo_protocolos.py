@@ -0,0 +1,129 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suporte_app', '0012_indices_autocompletar'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AtualizacaoProtocoloArquivada',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('texto', models.TextField(verbose_name='Atualização')),
+                ('data_atualizacao', models.DateTimeField(verbose_name='Data da Atualização')),
+            ],
+            options={
+                'verbose_name': 'Atualização Arquivada',
+                'verbose_name_plural': 'Atualizações Arquivadas',
+                'ordering': ['data_atualizacao'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProtocoloArquivado',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('buic', models.CharField(blank=True, max_length=100, null=True, verbose_name='BUIC')),
+                ('topico_mqtt', models.CharField(blank=True, max_length=100, null=True, verbose_name='Tópico MQTT')),
+                ('payload_exemplo', models.TextField(blank=True, null=True, verbose_name='Payload de Exemplo')),
+                ('descricao', models.TextField(verbose_name='Descrição do Problema')),
+                ('status', models.CharField(choices=[('aberto', 'Aberto'), ('em_andamento', 'Em Andamento'), ('concluido', 'Concluído')], max_length=20, verbose_name='Status')),
+                ('criado_em', models.DateTimeField(verbose_name='Data de Criação')),
+                ('origem', models.CharField(choices=[('manual', 'Manual'), ('automatico', 'Automático')], max_length=20, verbose_name='Origem')),
+                ('primeira_resposta_em', models.DateTimeField(blank=True, null=True, verbose_name='Primeira Resposta')),
+                ('concluido_em', models.DateTimeField(blank=True, null=True, verbose_name='Concluído em')),
+                ('arquivado_em', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Arquivado em')),
+            ],
+            options={
+                'verbose_name': 'Protocolo Arquivado',
+                'verbose_name_plural': 'Protocolos Arquivados',
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TransicaoStatusArquivada',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('status_anterior', models.CharField(choices=[('aberto', 'Aberto'), ('em_andamento', 'Em Andamento'), ('concluido', 'Concluído')], max_length=20, verbose_name='Status Anterior')),
+                ('status_novo', models.CharField(choices=[('aberto', 'Aberto'), ('em_andamento', 'Em Andamento'), ('concluido', 'Concluído')], max_length=20, verbose_name='Novo Status')),
+                ('criado_em', models.DateTimeField(verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'Transição Arquivada',
+                'verbose_name_plural': 'Transições Arquivadas',
+                'ordering': ['criado_em'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='protocolo',
+            index=models.Index(condition=models.Q(('status', 'concluido')), fields=['concluido_em', 'id'], name='protocolo_concluido_idx'),
+        ),
+        migrations.AddField(
+            model_name='atualizacaoprotocoloarquivada',
+            name='tecnico',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Técnico'),
+        ),
+        migrations.AddField(
+            model_name='protocoloarquivado',
+            name='cliente',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='suporte_app.cliente', verbose_name='Cliente'),
+        ),
+        migrations.AddField(
+            model_name='protocoloarquivado',
+            name='dispositivo',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='suporte_app.dispositivo', verbose_name='Dispositivo'),
+        ),
+        migrations.AddField(
+            model_name='protocoloarquivado',
+            name='incidente',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='suporte_app.incidente', verbose_name='Incidente'),
+        ),
+        migrations.AddField(
+            model_name='protocoloarquivado',
+            name='tecnico_responsavel',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Técnico Responsável'),
+        ),
+        migrations.AddField(
+            model_name='atualizacaoprotocoloarquivada',
+            name='protocolo',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='atualizacoes', to='suporte_app.protocoloarquivado', verbose_name='Protocolo'),
+        ),
+        migrations.AddField(
+            model_name='transicaostatusarquivada',
+            name='autor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Autor'),
+        ),
+        migrations.AddField(
+            model_name='transicaostatusarquivada',
+            name='protocolo',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transicoes', to='suporte_app.protocoloarquivado', verbose_name='Protocolo'),
+        ),
+        migrations.AddIndex(
+            model_name='protocoloarquivado',
+            index=models.Index(fields=['cliente', '-id'], name='arquivado_cliente_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='protocoloarquivado',
+            index=models.Index(fields=['tecnico_responsavel', '-id'], name='arquivado_tecnico_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='protocoloarquivado',
+            index=models.Index(fields=['-criado_em'], name='arquivado_criado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='atualizacaoprotocoloarquivada',
+            index=models.Index(fields=['protocolo', 'data_atualizacao'], name='arquivada_protocolo_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transicaostatusarquivada',
+            index=models.Index(fields=['protocolo', 'criado_em'], name='transicao_arq_protocolo_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:33
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suporte_app', '0013_arquivo_protocolos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarefa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100, verbose_name='Nome')),
+                ('argumentos', models.JSONField(blank=True, default=dict, verbose_name='Argumentos')),
+                ('chave', models.CharField(blank=True, max_length=200, null=True, verbose_name='Chave de Idempotência')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('executando', 'Executando'), ('concluida', 'Concluída'), ('falhou', 'Falhou')], default='pendente', max_length=20, verbose_name='Status')),
+                ('tentativas', models.PositiveIntegerField(default=0, verbose_name='Tentativas')),
+                ('maximo_tentativas', models.PositiveIntegerField(default=5, verbose_name='Máximo de Tentativas')),
+                ('executar_em', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Executar em')),
+                ('criada_em', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Criada em')),
+                ('iniciada_em', models.DateTimeField(blank=True, null=True, verbose_name='Iniciada em')),
+                ('concluida_em', models.DateTimeField(blank=True, null=True, verbose_name='Concluída em')),
+                ('trabalhador', models.CharField(blank=True, max_length=100, verbose_name='Trabalhador')),
+                ('erro', models.TextField(blank=True, verbose_name='Último Erro')),
+            ],
+            options={
+                'verbose_name': 'Tarefa',
+                'verbose_name_plural': 'Tarefas',
+                'ordering': ['-id'],
+                'indexes': [models.Index(condition=models.Q(('status', 'pendente')), fields=['executar_em', 'id'], name='tarefa_pendente_idx'), models.Index(condition=models.Q(('status', 'executando')), fields=['iniciada_em'], name='tarefa_executando_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'pendente')), fields=('chave',), name='tarefa_chave_pendente_unica')],
+            },
+        ),
+    ]
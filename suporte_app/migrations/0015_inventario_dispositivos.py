@@ -0,0 +1,140 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:05
+
+from collections import Counter, defaultdict
+
+from django.db import migrations, models
+from django.db.models import F
+
+from suporte_app.models import normalizar_buic, normalizar_mac
+
+LOTE = 1000
+
+
+def _tipo(tipo, online):
+    return f"{tipo}:{'online' if online else 'offline'}"
+
+
+def deduplicar_macs(apps, schema_editor):
+    """
+    Converte os MACs para o formato canônico e junta os dispositivos que só
+    diferiam na grafia do MAC: fica o de menor id, com o estado online do que
+    teve o contato mais recente, e os protocolos (inclusive arquivados) dos
+    demais passam para ele. MACs fora do padrão ficam como estão (até 17
+    caracteres, a nova largura da coluna).
+    """
+    alias = schema_editor.connection.alias
+    Dispositivo = apps.get_model('suporte_app', 'Dispositivo')
+    Protocolo = apps.get_model('suporte_app', 'Protocolo')
+    ProtocoloArquivado = apps.get_model('suporte_app', 'ProtocoloArquivado')
+    Metrica = apps.get_model('suporte_app', 'Metrica')
+    Tarefa = apps.get_model('suporte_app', 'Tarefa')
+    dispositivos = Dispositivo.objects.using(alias)
+
+    grupos = defaultdict(list)
+    longos = []
+    colunas = ('pk', 'mac_address', 'tipo', 'online', 'ultimo_contato')
+    for linha in dispositivos.order_by('pk').values_list(*colunas).iterator(chunk_size=5000):
+        try:
+            grupos[normalizar_mac(linha[1])].append(linha)
+        except ValueError:
+            if len(linha[1].strip()) > 17:
+                longos.append(linha[0])
+    if longos:
+        raise RuntimeError(
+            "Dispositivos com MAC inválido e maior que 17 caracteres (corrija antes de migrar): "
+            + ", ".join(map(str, longos[:50]))
+        )
+
+    deltas = Counter()
+    reindexar = []
+    renomear = []
+    for mac, linhas in grupos.items():
+        mantido, *duplicados = linhas
+        if duplicados:
+            ids = [linha[0] for linha in duplicados]
+            mais_recente = max(linhas, key=lambda linha: (linha[4] is not None, linha[4] or 0, linha[0]))
+            reindexar += Protocolo.objects.using(alias).filter(dispositivo_id__in=ids).values_list('pk', flat=True)
+            Protocolo.objects.using(alias).filter(dispositivo_id__in=ids).update(dispositivo_id=mantido[0])
+            ProtocoloArquivado.objects.using(alias).filter(dispositivo_id__in=ids).update(dispositivo_id=mantido[0])
+            dispositivos.filter(pk__in=ids).delete()
+            for _, _, tipo, online, _ in duplicados:
+                deltas[('tipo', _tipo(tipo, online))] -= 1
+            if mais_recente[3] != mantido[3]:
+                dispositivos.filter(pk=mantido[0]).update(online=mais_recente[3], ultimo_contato=mais_recente[4])
+                deltas[('tipo', _tipo(mantido[2], mantido[3]))] -= 1
+                deltas[('tipo', _tipo(mantido[2], mais_recente[3]))] += 1
+        if mantido[1] != mac:
+            renomear.append((mantido[0], mac))
+
+    for pk, mac in renomear:
+        dispositivos.filter(pk=pk).update(mac_address=mac)
+    # Os contadores do painel acompanham os dispositivos removidos (sem sinais aqui)
+    for (dimensao, chave), delta in deltas.items():
+        if delta:
+            Metrica.objects.using(alias).filter(dimensao=dimensao, chave=chave).update(valor=F('valor') + delta)
+    # O nome do dispositivo faz parte do documento de busca dos protocolos transferidos
+    Tarefa.objects.using(alias).bulk_create([
+        Tarefa(nome='reindexar_protocolos', argumentos={'protocolo_ids': reindexar[inicio:inicio + LOTE]},
+               maximo_tentativas=5)
+        for inicio in range(0, len(reindexar), LOTE)
+    ])
+
+
+def preencher_identificadores(apps, schema_editor):
+    """
+    Copia para o dispositivo o BUIC e o tópico MQTT do protocolo mais recente
+    que os informou. Um BUIC/tópico visto em mais de um dispositivo fica com o
+    do protocolo mais recente, como no índice da ingestão.
+    """
+    alias = schema_editor.connection.alias
+    Dispositivo = apps.get_model('suporte_app', 'Dispositivo')
+    Protocolo = apps.get_model('suporte_app', 'Protocolo')
+
+    # identificador -> (protocolo mais recente que o informou, dispositivo)
+    donos = {'buic': {}, 'topico_mqtt': {}}
+    protocolos = (
+        Protocolo.objects.using(alias)
+        .exclude(buic__isnull=True, topico_mqtt__isnull=True)
+        .order_by('pk')
+        .values_list('pk', 'dispositivo_id', 'buic', 'topico_mqtt')
+    )
+    for pk, dispositivo_id, buic, topico in protocolos.iterator(chunk_size=5000):
+        if normalizar_buic(buic):
+            donos['buic'][normalizar_buic(buic)] = (pk, dispositivo_id)
+        if (topico or '').strip():
+            donos['topico_mqtt'][topico.strip()] = (pk, dispositivo_id)
+
+    # Um dispositivo que recebeu vários BUICs/tópicos fica com o mais recente de cada
+    identificadores = defaultdict(dict)
+    for campo, por_valor in donos.items():
+        for valor, (pk, dispositivo_id) in por_valor.items():
+            atual = identificadores[dispositivo_id].get(campo)
+            if atual is None or atual[0] < pk:
+                identificadores[dispositivo_id][campo] = (pk, valor)
+    atualizados = [
+        Dispositivo(pk=dispositivo_id, **{campo: campos[campo][1] if campo in campos else None for campo in donos})
+        for dispositivo_id, campos in identificadores.items()
+    ]
+    Dispositivo.objects.using(alias).bulk_update(atualizados, list(donos), batch_size=LOTE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suporte_app', '0014_fila_tarefas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dispositivo',
+            name='buic',
+            field=models.CharField(blank=True, max_length=100, null=True, verbose_name='BUIC'),
+        ),
+        migrations.AddField(
+            model_name='dispositivo',
+            name='topico_mqtt',
+            field=models.CharField(blank=True, max_length=100, null=True, verbose_name='Tópico MQTT'),
+        ),
+        migrations.RunPython(deduplicar_macs, migrations.RunPython.noop),
+        migrations.RunPython(preencher_identificadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:05
+
+import suporte_app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suporte_app', '0015_inventario_dispositivos'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dispositivo',
+            name='mac_address',
+            field=suporte_app.models.EnderecoMacField(unique=True, verbose_name='Endereço MAC'),
+        ),
+        migrations.AlterField(
+            model_name='dispositivo',
+            name='buic',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True, verbose_name='BUIC'),
+        ),
+        migrations.AlterField(
+            model_name='dispositivo',
+            name='topico_mqtt',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True, verbose_name='Tópico MQTT'),
+        ),
+        # O autocompletar passou a usar o BUIC do dispositivo
+        migrations.RemoveIndex(
+            model_name='protocolo',
+            name='protocolo_buic_upper_idx',
+        ),
+    ]
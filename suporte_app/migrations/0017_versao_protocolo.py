@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suporte_app', '0016_identificadores_dispositivo_unicos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='protocolo',
+            name='versao',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='Versão'),
+        ),
+        migrations.AddField(
+            model_name='protocoloarquivado',
+            name='versao',
+            field=models.PositiveIntegerField(default=1, verbose_name='Versão'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suporte_app', '0017_versao_protocolo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AcessoCliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'verbose_name': 'Acesso a Cliente',
+                'verbose_name_plural': 'Acessos a Clientes',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='dispositivo',
+            index=models.Index(fields=['cliente', '-id'], name='dispositivo_cliente_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='protocolo',
+            index=models.Index(fields=['cliente', 'status', '-id'], name='protocolo_cliente_status_idx'),
+        ),
+        migrations.AddField(
+            model_name='acessocliente',
+            name='cliente',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='acessos', to='suporte_app.cliente', verbose_name='Cliente'),
+        ),
+        migrations.AddField(
+            model_name='acessocliente',
+            name='usuario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='acessos_clientes', to=settings.AUTH_USER_MODEL, verbose_name='Usuário'),
+        ),
+        migrations.AddConstraint(
+            model_name='acessocliente',
+            constraint=models.UniqueConstraint(fields=('usuario', 'cliente'), name='acesso_cliente_usuario_unico'),
+        ),
+    ]
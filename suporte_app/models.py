@@ -1,5 +1,12 @@
-from django.db import models
+import re
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, models, transaction
+from django.db.models.functions import Coalesce, Upper
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from . import escopo
 
 # Opções de status para o protocolo.
 STATUS_CHOICES = (
@@ -8,6 +15,138 @@ STATUS_CHOICES = (
     ('concluido', 'Concluído'),
 )
 
+# Status considerados "em aberto" (protocolo ainda não concluído).
+STATUS_ABERTOS = ('aberto', 'em_andamento')
+
+# Origem do protocolo: aberto por um técnico ou a partir de um evento do dispositivo.
+ORIGEM_CHOICES = (
+    ('manual', 'Manual'),
+    ('automatico', 'Automático'),
+)
+
+def normalizar_mac(valor):
+    """
+    Normaliza um endereço MAC para o formato AA:BB:CC:DD:EE:FF.
+    Aceita separadores ':', '-', '.' ou nenhum. Levanta ValueError se inválido.
+    """
+    digitos = re.sub(r'[^0-9a-fA-F]', '', valor or '')
+    if len(digitos) != 12 or re.search(r'[^0-9a-fA-F:\-. ]', (valor or '').strip()):
+        raise ValueError(f"Endereço MAC inválido: {valor!r}")
+    digitos = digitos.upper()
+    return ':'.join(digitos[i:i + 2] for i in range(0, 12, 2))
+
+
+def normalizar_buic(valor):
+    """
+    BUIC como é gravado no dispositivo: sem espaços nas pontas, em maiúsculas (None se vazio).
+    """
+    valor = (valor or '').strip().upper()
+    return valor or None
+
+
+class EnderecoMacField(models.CharField):
+    """
+    Endereço MAC guardado sempre no formato canônico AA:BB:CC:DD:EE:FF (largura
+    fixa de 17 caracteres), então 'aa-bb-…' e 'aabb…' são o mesmo valor único.
+    Valores em outro formato são convertidos ao gravar e nas consultas
+    (filter(mac_address='aabbccddeeff') funciona); formulários rejeitam MACs inválidos.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('max_length', 17)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        nome, caminho, args, kwargs = super().deconstruct()
+        if kwargs.get('max_length') == 17:
+            del kwargs['max_length']
+        return nome, caminho, args, kwargs
+
+    @staticmethod
+    def canonico(valor):
+        # Prefixos e valores antigos fora do padrão passam como estão (ex.: faixas do autocompletar)
+        try:
+            return normalizar_mac(valor)
+        except ValueError:
+            return valor
+
+    def to_python(self, value):
+        value = super().to_python(value)
+        if value in self.empty_values:
+            return value
+        try:
+            return normalizar_mac(value)
+        except ValueError:
+            raise ValidationError("Endereço MAC inválido.", code='invalid')
+
+    def get_prep_value(self, value):
+        # Sem o to_python do CharField: consultas com valores fora do padrão não devem falhar
+        value = models.Field.get_prep_value(self, value)
+        return value if value is None else self.canonico(str(value))
+
+    def pre_save(self, model_instance, add):
+        valor = getattr(model_instance, self.attname)
+        if isinstance(valor, str):
+            valor = self.canonico(valor)
+            setattr(model_instance, self.attname, valor)
+        return valor
+
+class EscopoClienteManager(models.Manager):
+    """
+    Manager padrão dos modelos de um cliente: com um escopo ativo (ver escopo.py),
+    só retorna as linhas dos clientes permitidos. `campo` é o caminho até o id do cliente.
+    """
+
+    def __init__(self, campo='cliente_id'):
+        super().__init__()
+        self.campo = campo
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        clientes = escopo.clientes_ativos()
+        if clientes is not None:
+            queryset = queryset.filter(**{f'{self.campo}__in': clientes})
+        return queryset
+
+class ClienteQuerySet(models.QuerySet):
+    """
+    Consultas agregadas de clientes, usadas pelo admin e pelas listagens.
+    """
+
+    def com_contagens(self):
+        """
+        Anota, em uma única consulta, a quantidade de dispositivos (total, online e
+        offline) e de protocolos em aberto de cada cliente.
+        """
+        protocolos_abertos = (
+            Protocolo.objects
+            .filter(cliente=models.OuterRef('pk'), status__in=STATUS_ABERTOS)
+            .order_by()
+            .values('cliente')
+            .annotate(total=models.Count('pk'))
+            .values('total')
+        )
+        return self.annotate(
+            quantidade_dispositivos=models.Count('dispositivo'),
+            dispositivos_online=models.Count('dispositivo', filter=models.Q(dispositivo__online=True)),
+            dispositivos_offline=models.Count('dispositivo', filter=models.Q(dispositivo__online=False)),
+            protocolos_abertos=Coalesce(
+                models.Subquery(protocolos_abertos, output_field=models.IntegerField()), 0
+            ),
+        )
+
+class DispositivoQuerySet(models.QuerySet):
+    """
+    Consultas de dispositivos. O rótulo do dispositivo usa o nome do cliente,
+    então toda listagem que o exibe deve usar com_cliente().
+    """
+
+    def com_cliente(self):
+        return self.select_related('cliente')
+
+ClienteManager = EscopoClienteManager.from_queryset(ClienteQuerySet)
+DispositivoManager = EscopoClienteManager.from_queryset(DispositivoQuerySet)
+
 class Cliente(models.Model):
     """
     Modelo para representar um cliente.
@@ -16,14 +155,48 @@ class Cliente(models.Model):
     email = models.EmailField(unique=True, verbose_name="E-mail")
     telefone = models.CharField(max_length=20, verbose_name="Telefone")
 
+    objects = ClienteManager(campo='pk')
+
     class Meta:
         verbose_name = "Cliente"
         verbose_name_plural = "Clientes"
         ordering = ['nome']
+        indexes = [
+            models.Index(fields=['nome'], name='cliente_nome_idx'),
+            # Autocompletar por prefixo do nome (ver autocompletar.py)
+            models.Index(Upper('nome'), name='cliente_nome_upper_idx'),
+        ]
 
     def __str__(self):
         return self.nome
 
+    def validate_unique(self, exclude=None):
+        """
+        Verifica a unicidade contra todos os clientes, não só os do escopo atual.
+        """
+        with escopo.sem_escopo():
+            super().validate_unique(exclude)
+
+class AcessoCliente(models.Model):
+    """
+    Cliente que um usuário pode ver (ver suporte_app.escopo). Superusuários e
+    membros da equipe sem acessos cadastrados veem todos.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='acessos_clientes',
+                                verbose_name="Usuário")
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='acessos', verbose_name="Cliente")
+
+    class Meta:
+        verbose_name = "Acesso a Cliente"
+        verbose_name_plural = "Acessos a Clientes"
+        constraints = [
+            # Também o índice da leitura dos clientes de um usuário (usuario, cliente_id)
+            models.UniqueConstraint(fields=['usuario', 'cliente'], name='acesso_cliente_usuario_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario} -> {self.cliente}"
+
 class Dispositivo(models.Model):
     """
     Modelo para representar um dispositivo associado a um cliente.
@@ -31,18 +204,84 @@ class Dispositivo(models.Model):
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, verbose_name="Cliente")
     nome = models.CharField(max_length=100, verbose_name="Nome do Dispositivo")
     tipo = models.CharField(max_length=50, verbose_name="Tipo")
-    mac_address = models.CharField(max_length=50, unique=True, verbose_name="Endereço MAC")
+    mac_address = EnderecoMacField(unique=True, verbose_name="Endereço MAC")
+    # Identificadores do equipamento (preenchidos também pelos protocolos; ver inventario.py)
+    buic = models.CharField(max_length=100, unique=True, null=True, blank=True, verbose_name="BUIC")
+    topico_mqtt = models.CharField(max_length=100, unique=True, null=True, blank=True, verbose_name="Tópico MQTT")
     localizacao = models.CharField(max_length=100, verbose_name="Localização")
     online = models.BooleanField(default=False, verbose_name="Online")
+    # Última mensagem de status recebida via MQTT (atualizado pelo ingerir_mqtt)
+    ultimo_contato = models.DateTimeField(null=True, blank=True, verbose_name="Último Contato")
+
+    objects = DispositivoManager()
 
     class Meta:
         verbose_name = "Dispositivo"
         verbose_name_plural = "Dispositivos"
         ordering = ['cliente__nome', 'nome']
+        indexes = [
+            # Listagem de dispositivos por cliente, já na ordem de exibição
+            models.Index(fields=['cliente', 'nome'], name='dispositivo_cliente_nome_idx'),
+            # Paginação por cursor (id) da API no escopo de um cliente
+            models.Index(fields=['cliente', '-id'], name='dispositivo_cliente_id_idx'),
+            # Autocompletar por prefixo do nome (ver autocompletar.py)
+            models.Index(Upper('nome'), name='dispositivo_nome_upper_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nome} - {self.cliente.nome}"
 
+    def clean(self):
+        super().clean()
+        self.buic = normalizar_buic(self.buic)
+        self.topico_mqtt = (self.topico_mqtt or '').strip() or None
+
+    def validate_unique(self, exclude=None):
+        # MAC, BUIC e tópico são únicos entre todos os clientes
+        with escopo.sem_escopo():
+            super().validate_unique(exclude)
+
+    def save(self, *args, **kwargs):
+        """
+        Grava BUIC e tópico normalizados (vazio vira NULL, que não conflita no índice único).
+        """
+        self.buic = normalizar_buic(self.buic)
+        self.topico_mqtt = (self.topico_mqtt or '').strip() or None
+        super().save(*args, **kwargs)
+
+class Incidente(models.Model):
+    """
+    Agrupa os protocolos abertos automaticamente quando vários dispositivos de um
+    mesmo cliente caem ao mesmo tempo (ex.: queda de energia ou de rede no local).
+    """
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, verbose_name="Cliente")
+    descricao = models.TextField(verbose_name="Descrição")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='aberto', verbose_name="Status")
+    criado_em = models.DateTimeField(default=timezone.now, editable=False, verbose_name="Data de Criação")
+
+    objects = EscopoClienteManager()
+
+    class Meta:
+        verbose_name = "Incidente"
+        verbose_name_plural = "Incidentes"
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['cliente', 'status', '-criado_em'], name='incidente_cliente_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Incidente #{self.id} - {self.cliente.nome}"
+
+class ConflitoEdicao(DatabaseError):
+    """
+    O protocolo foi gravado por outra pessoa depois de lido: a gravação não foi feita.
+    """
+
+    def __init__(self, protocolo_id, versao_lida):
+        super().__init__(f"Protocolo #{protocolo_id} alterado por outra pessoa (versão lida: {versao_lida}).")
+        self.protocolo_id = protocolo_id
+        self.versao_lida = versao_lida
+
 class Protocolo(models.Model):
     """
     Modelo principal para o registro de protocolos.
@@ -67,15 +306,163 @@ class Protocolo(models.Model):
     # Técnico/atendente que abriu o protocolo (usuário logado no Django)
     tecnico_responsavel = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, 
                                           verbose_name="Técnico Responsável")
+    # Data de abertura do protocolo (indexada para ordenação e filtro por data no admin)
+    criado_em = models.DateTimeField(default=timezone.now, db_index=True, editable=False,
+                                     verbose_name="Data de Criação")
+    origem = models.CharField(max_length=20, choices=ORIGEM_CHOICES, default='manual', editable=False,
+                              verbose_name="Origem")
+    # Incidente ao qual o protocolo foi agrupado (apenas protocolos automáticos)
+    incidente = models.ForeignKey(Incidente, on_delete=models.SET_NULL, null=True, blank=True,
+                                  related_name='protocolos', verbose_name="Incidente")
+    # Marcos de SLA (mantidos por save() e pelas atualizações de técnicos)
+    primeira_resposta_em = models.DateTimeField(null=True, blank=True, editable=False,
+                                                verbose_name="Primeira Resposta")
+    concluido_em = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Concluído em")
+    # Controle de concorrência otimista: incrementada a cada gravação dos campos editáveis
+    versao = models.PositiveIntegerField(default=1, editable=False, verbose_name="Versão")
+
+    objects = EscopoClienteManager()
+
+    # Estado lido do banco que save() compara com o atual (transições, métricas, eventos)
+    CAMPOS_ESTADO = ('status', 'tecnico_responsavel_id', 'cliente_id', 'criado_em', 'versao')
 
     class Meta:
         verbose_name = "Protocolo"
         verbose_name_plural = "Protocolos"
         ordering = ['-id']  # Ordenar pelos mais recentes
+        indexes = [
+            # Fila de protocolos em aberto por técnico (índice parcial onde suportado)
+            models.Index(fields=['tecnico_responsavel', '-id'], name='protocolo_abertos_tecnico_idx',
+                         condition=models.Q(status__in=STATUS_ABERTOS)),
+            # Filtros do admin por técnico/status, na ordenação padrão
+            models.Index(fields=['tecnico_responsavel', 'status', '-id'], name='protocolo_tecnico_status_idx'),
+            models.Index(fields=['status', '-id'], name='protocolo_status_idx'),
+            # Protocolos de um cliente, dos mais recentes para os mais antigos
+            models.Index(fields=['cliente', '-criado_em'], name='protocolo_cliente_recente_idx'),
+            # Paginação por cursor (id) da API filtrada por cliente
+            models.Index(fields=['cliente', '-id'], name='protocolo_cliente_id_idx'),
+            # Filtro por status no escopo de um cliente (portal e admin restritos)
+            models.Index(fields=['cliente', 'status', '-id'], name='protocolo_cliente_status_idx'),
+            # Deduplicação de protocolos automáticos por dispositivo em aberto
+            models.Index(fields=['dispositivo', '-criado_em'], name='protocolo_abertos_disp_idx',
+                         condition=models.Q(status__in=STATUS_ABERTOS)),
+            # Candidatos ao arquivamento (concluídos há mais de N dias)
+            models.Index(fields=['concluido_em', 'id'], name='protocolo_concluido_idx',
+                         condition=models.Q(status='concluido')),
+        ]
 
     def __str__(self):
         return f"Protocolo #{self.id} - {self.cliente.nome} ({self.dispositivo.nome})"
+
+    def clean(self):
+        """
+        O dispositivo precisa pertencer ao cliente do protocolo.
+        """
+        super().clean()
+        if self.cliente_id and self.dispositivo_id and self.dispositivo.cliente_id != self.cliente_id:
+            raise ValidationError({'dispositivo': "O dispositivo selecionado não pertence a este cliente."})
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._guardar_estado()
+        return instancia
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using, fields, from_queryset)
+        self._guardar_estado(fields)
+
+    def _guardar_estado(self, campos=None):
+        """
+        Guarda os valores de CAMPOS_ESTADO como estão no banco (todos os carregados,
+        ou só os de `campos`), para save() comparar sem reler a linha.
+        """
+        estado = dict(getattr(self, '_estado_banco', {}))
+        for campo in self.CAMPOS_ESTADO:
+            if campo in self.__dict__ and (campos is None or {campo, campo.removesuffix('_id')} & set(campos)):
+                estado[campo] = self.__dict__[campo]
+        self._estado_banco = estado
+
+    def _estado_lido(self):
+        """
+        Estado do protocolo no banco quando foi lido. Instâncias que não vieram de
+        uma consulta (ex.: bulk_create) ou com campos adiados consultam a linha.
+        """
+        estado = getattr(self, '_estado_banco', {})
+        if len(estado) == len(self.CAMPOS_ESTADO):
+            return dict(estado)
+        return Protocolo._base_manager.filter(pk=self.pk).values(*self.CAMPOS_ESTADO).first()
+
+    def save(self, *args, **kwargs):
+        """
+        Grava o protocolo e, na mesma transação, registra a mudança de status em
+        TransicaoStatusProtocolo e atualiza primeira_resposta_em/concluido_em.
+        O autor da mudança é lido do atributo `autor` (definido pela view/admin).
+
+        Protocolos existentes são gravados com compare-and-swap, sem travar nem
+        reler a linha: `UPDATE ... SET versao = n + 1 WHERE id = ... AND versao = n`,
+        em que n é a `versao` da instância (a que o usuário leu). Se o UPDATE não
+        alterou nenhuma linha, outra gravação veio antes: nada é gravado e levanta
+        ConflitoEdicao. O status anterior é o que foi carregado com a instância.
+        """
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic(using=kwargs.get('using')):
+            anterior = None
+            if self.pk and not self._state.adding:
+                anterior = self._estado_lido()
+            # Usado também pelos sinais de métricas (post_save)
+            self._estado_anterior = anterior
+
+            self._versao_lida = None
+            sla = (self.primeira_resposta_em, self.concluido_em)
+            if anterior is not None:
+                self._versao_lida = self.versao
+                self.versao += 1
+                if update_fields is not None:
+                    kwargs['update_fields'] = update_fields = set(update_fields) | {'versao'}
+
+            status_anterior = anterior['status'] if anterior else None
+            mudou_status = status_anterior != self.status and (update_fields is None or 'status' in update_fields)
+            agora = timezone.now()
+            if mudou_status:
+                if self.status != 'aberto' and self.primeira_resposta_em is None:
+                    self.primeira_resposta_em = agora
+                if self.status != 'concluido':
+                    self.concluido_em = None
+                elif anterior is not None or self.concluido_em is None:
+                    # Na criação, mantém a data de conclusão informada (ex.: importação)
+                    self.concluido_em = agora
+                if update_fields is not None:
+                    kwargs['update_fields'] = set(update_fields) | {'primeira_resposta_em', 'concluido_em'}
+
+            try:
+                super().save(*args, **kwargs)
+            except ConflitoEdicao:
+                self.versao = self._versao_lida
+                self.primeira_resposta_em, self.concluido_em = sla
+                raise
+            self._guardar_estado(kwargs.get('update_fields'))
+
+            if mudou_status and anterior is not None:
+                TransicaoStatusProtocolo.objects.create(
+                    protocolo=self, status_anterior=status_anterior, status_novo=self.status,
+                    autor=getattr(self, 'autor', None), criado_em=agora,
+                )
     
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        """
+        O UPDATE só vale se a versão no banco ainda for a lida (ver save()).
+        """
+        if getattr(self, '_versao_lida', None) is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        if super()._do_update(base_qs.filter(versao=self._versao_lida), using, pk_val, values, update_fields,
+                              forced_update):
+            return True
+        # Nenhuma linha alterada: a versão mudou, ou o protocolo foi excluído (aí segue para o INSERT)
+        if base_qs.filter(pk=pk_val).exists():
+            raise ConflitoEdicao(pk_val, self._versao_lida)
+        return False
+
     @property
     def numero_protocolo(self):
         """
@@ -99,6 +486,207 @@ class AtualizacaoProtocolo(models.Model):
         verbose_name = "Atualização do Protocolo"
         verbose_name_plural = "Atualizações do Protocolo"
         ordering = ['data_atualizacao']
+        indexes = [
+            # Linha do tempo de um protocolo em ordem cronológica
+            models.Index(fields=['protocolo', 'data_atualizacao'], name='atualizacao_protocolo_data_idx'),
+        ]
 
     def __str__(self):
-        return f"Atualização em #{self.protocolo.id} - {self.data_atualizacao.strftime('%d/%m/%Y %H:%M')}"
\ No newline at end of file
+        return f"Atualização em #{self.protocolo.id} - {self.data_atualizacao.strftime('%d/%m/%Y %H:%M')}"
+
+class TransicaoStatusProtocolo(models.Model):
+    """
+    Histórico (somente inclusão) das mudanças de status de um protocolo. A
+    abertura não gera registro: ela é o criado_em do protocolo.
+    """
+    protocolo = models.ForeignKey(Protocolo, on_delete=models.CASCADE, related_name='transicoes',
+                                  verbose_name="Protocolo")
+    status_anterior = models.CharField(max_length=20, choices=STATUS_CHOICES, verbose_name="Status Anterior")
+    status_novo = models.CharField(max_length=20, choices=STATUS_CHOICES, verbose_name="Novo Status")
+    autor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Autor")
+    criado_em = models.DateTimeField(default=timezone.now, verbose_name="Data")
+
+    class Meta:
+        verbose_name = "Transição de Status"
+        verbose_name_plural = "Transições de Status"
+        ordering = ['criado_em']
+        indexes = [
+            models.Index(fields=['protocolo', 'criado_em'], name='transicao_protocolo_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.protocolo_id}: {self.status_anterior} -> {self.status_novo}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Transições de status não podem ser alteradas.")
+        super().save(*args, **kwargs)
+
+class ProtocoloArquivado(models.Model):
+    """
+    Protocolo concluído movido para o arquivo pelo comando arquivar_protocolos
+    (ver suporte_app.arquivamento). Mantém o id e os campos do protocolo original;
+    só é consultado quando pedido explicitamente (admin do arquivo, API com
+    ?arquivados=).
+    """
+    id = models.IntegerField(primary_key=True, verbose_name="ID")
+    dispositivo = models.ForeignKey(Dispositivo, on_delete=models.CASCADE, related_name='+',
+                                    verbose_name="Dispositivo")
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, null=True, blank=True, related_name='+',
+                                verbose_name="Cliente")
+    buic = models.CharField(max_length=100, blank=True, null=True, verbose_name="BUIC")
+    topico_mqtt = models.CharField(max_length=100, blank=True, null=True, verbose_name="Tópico MQTT")
+    payload_exemplo = models.TextField(blank=True, null=True, verbose_name="Payload de Exemplo")
+    descricao = models.TextField(verbose_name="Descrição do Problema")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, verbose_name="Status")
+    tecnico_responsavel = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+                                            verbose_name="Técnico Responsável")
+    criado_em = models.DateTimeField(verbose_name="Data de Criação")
+    origem = models.CharField(max_length=20, choices=ORIGEM_CHOICES, verbose_name="Origem")
+    incidente = models.ForeignKey(Incidente, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+                                  verbose_name="Incidente")
+    primeira_resposta_em = models.DateTimeField(null=True, blank=True, verbose_name="Primeira Resposta")
+    concluido_em = models.DateTimeField(null=True, blank=True, verbose_name="Concluído em")
+    versao = models.PositiveIntegerField(default=1, verbose_name="Versão")
+    arquivado_em = models.DateTimeField(default=timezone.now, verbose_name="Arquivado em")
+
+    objects = EscopoClienteManager()
+
+    class Meta:
+        verbose_name = "Protocolo Arquivado"
+        verbose_name_plural = "Protocolos Arquivados"
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['cliente', '-id'], name='arquivado_cliente_id_idx'),
+            models.Index(fields=['tecnico_responsavel', '-id'], name='arquivado_tecnico_id_idx'),
+            models.Index(fields=['-criado_em'], name='arquivado_criado_idx'),
+        ]
+
+    def __str__(self):
+        return f"Protocolo arquivado #{self.id}"
+
+    @property
+    def numero_protocolo(self):
+        return f"{self.id:06d}"
+
+class AtualizacaoProtocoloArquivada(models.Model):
+    """
+    Atualização de um protocolo arquivado (mesmo id da original).
+    """
+    id = models.IntegerField(primary_key=True, verbose_name="ID")
+    protocolo = models.ForeignKey(ProtocoloArquivado, on_delete=models.CASCADE, related_name='atualizacoes',
+                                  verbose_name="Protocolo")
+    texto = models.TextField(verbose_name="Atualização")
+    data_atualizacao = models.DateTimeField(verbose_name="Data da Atualização")
+    tecnico = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+                                verbose_name="Técnico")
+
+    class Meta:
+        verbose_name = "Atualização Arquivada"
+        verbose_name_plural = "Atualizações Arquivadas"
+        ordering = ['data_atualizacao']
+        indexes = [
+            models.Index(fields=['protocolo', 'data_atualizacao'], name='arquivada_protocolo_data_idx'),
+        ]
+
+class TransicaoStatusArquivada(models.Model):
+    """
+    Transição de status de um protocolo arquivado (mesmo id da original).
+    """
+    id = models.IntegerField(primary_key=True, verbose_name="ID")
+    protocolo = models.ForeignKey(ProtocoloArquivado, on_delete=models.CASCADE, related_name='transicoes',
+                                  verbose_name="Protocolo")
+    status_anterior = models.CharField(max_length=20, choices=STATUS_CHOICES, verbose_name="Status Anterior")
+    status_novo = models.CharField(max_length=20, choices=STATUS_CHOICES, verbose_name="Novo Status")
+    autor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+                              verbose_name="Autor")
+    criado_em = models.DateTimeField(verbose_name="Data")
+
+    class Meta:
+        verbose_name = "Transição Arquivada"
+        verbose_name_plural = "Transições Arquivadas"
+        ordering = ['criado_em']
+        indexes = [
+            models.Index(fields=['protocolo', 'criado_em'], name='transicao_arq_protocolo_idx'),
+        ]
+
+class IndiceBuscaProtocolo(models.Model):
+    """
+    Documento de busca textual de um protocolo: descrição, BUIC, tópico MQTT, nomes
+    do cliente e do dispositivo e o texto de todas as atualizações. O índice
+    full-text sobre este documento é criado por banco (ver suporte_app.busca).
+    """
+    protocolo = models.OneToOneField(Protocolo, on_delete=models.CASCADE, primary_key=True,
+                                     related_name='indice_busca', verbose_name="Protocolo")
+    documento = models.TextField(verbose_name="Documento")
+
+    class Meta:
+        verbose_name = "Índice de Busca"
+        verbose_name_plural = "Índices de Busca"
+
+class Metrica(models.Model):
+    """
+    Contador pré-agregado do painel de operações (ver suporte_app.metricas).
+    Ex.: dimensao='cliente', chave='12:aberto' -> protocolos abertos do cliente 12.
+    """
+    dimensao = models.CharField(max_length=30, verbose_name="Dimensão")
+    chave = models.CharField(max_length=200, verbose_name="Chave")
+    valor = models.BigIntegerField(default=0, verbose_name="Valor")
+
+    class Meta:
+        verbose_name = "Métrica"
+        verbose_name_plural = "Métricas"
+        constraints = [
+            models.UniqueConstraint(fields=['dimensao', 'chave'], name='metrica_dimensao_chave_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.dimensao}[{self.chave}] = {self.valor}"
+
+# Situações de uma tarefa da fila (ver suporte_app.fila)
+TAREFA_STATUS_CHOICES = (
+    ('pendente', 'Pendente'),
+    ('executando', 'Executando'),
+    ('concluida', 'Concluída'),
+    ('falhou', 'Falhou'),
+)
+
+class Tarefa(models.Model):
+    """
+    Tarefa da fila de segundo plano (ver suporte_app.fila), executada pelo
+    comando processar_tarefas.
+    """
+    nome = models.CharField(max_length=100, verbose_name="Nome")
+    argumentos = models.JSONField(default=dict, blank=True, verbose_name="Argumentos")
+    # Enquanto houver uma tarefa pendente com a mesma chave, novas são ignoradas
+    chave = models.CharField(max_length=200, null=True, blank=True, verbose_name="Chave de Idempotência")
+    status = models.CharField(max_length=20, choices=TAREFA_STATUS_CHOICES, default='pendente', verbose_name="Status")
+    tentativas = models.PositiveIntegerField(default=0, verbose_name="Tentativas")
+    maximo_tentativas = models.PositiveIntegerField(default=5, verbose_name="Máximo de Tentativas")
+    executar_em = models.DateTimeField(default=timezone.now, verbose_name="Executar em")
+    criada_em = models.DateTimeField(default=timezone.now, verbose_name="Criada em")
+    iniciada_em = models.DateTimeField(null=True, blank=True, verbose_name="Iniciada em")
+    concluida_em = models.DateTimeField(null=True, blank=True, verbose_name="Concluída em")
+    trabalhador = models.CharField(max_length=100, blank=True, verbose_name="Trabalhador")
+    erro = models.TextField(blank=True, verbose_name="Último Erro")
+
+    class Meta:
+        verbose_name = "Tarefa"
+        verbose_name_plural = "Tarefas"
+        ordering = ['-id']
+        indexes = [
+            # Próximas tarefas a executar (só as pendentes entram no índice)
+            models.Index(fields=['executar_em', 'id'], name='tarefa_pendente_idx',
+                         condition=models.Q(status='pendente')),
+            # Tarefas presas em 'executando' (trabalhador interrompido)
+            models.Index(fields=['iniciada_em'], name='tarefa_executando_idx',
+                         condition=models.Q(status='executando')),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['chave'], name='tarefa_chave_pendente_unica',
+                                    condition=models.Q(status='pendente')),
+        ]
+
+    def __str__(self):
+        return f"{self.nome} #{self.id} ({self.status})"
+
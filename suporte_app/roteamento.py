@@ -0,0 +1,124 @@
+"""
+Leituras na réplica (DATABASE_REPLICA_URL) com leitura-após-escrita para quem escreveu.
+
+* Só as requisições GET/HEAD/OPTIONS leem da réplica (listagens do admin,
+  páginas de detalhe, relatórios, API). Comandos, tarefas da fila e qualquer
+  leitura dentro de transaction.atomic() usam o primário.
+* Toda escrita vai para o primário. Uma requisição que escreve (método POST etc.
+  ou uma gravação durante um GET) passa a ler do primário até o fim e recebe um
+  cookie que mantém as próximas requisições desse navegador no primário por
+  BANCO_REPLICA_FIXAR_SEGUNDOS, cobrindo o atraso de replicação: quem acabou de
+  salvar vê o que salvou.
+* Sem réplica configurada o roteador não muda nada.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+COOKIE = 'banco_primario'
+
+METODOS_LEITURA = ('GET', 'HEAD', 'OPTIONS')
+
+
+class Estado:
+    """
+    Decisão de roteamento da requisição atual (mutável: as threads de
+    sync_to_async recebem uma cópia do contexto, mas o mesmo objeto).
+    """
+
+    def __init__(self, replica):
+        self.replica = replica
+        self.escreveu = False
+
+
+_estado = contextvars.ContextVar('roteamento_banco', default=None)
+
+
+def replica_configurada():
+    return REPLICA in settings.DATABASES
+
+
+@contextmanager
+def ler_da_replica(permitir=True):
+    """
+    Define se as leituras do bloco podem ir para a réplica (usado pelo
+    middleware; fora dele, tudo vai para o primário).
+    """
+    estado = Estado(permitir)
+    token = _estado.set(estado)
+    try:
+        yield estado
+    finally:
+        _estado.reset(token)
+
+
+class RoteadorReplica:
+    """
+    DATABASE_ROUTERS: leituras permitidas vão para a réplica, o resto para o primário.
+    """
+    replica = REPLICA
+
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        if (estado is None or not estado.replica or estado.escreveu
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return self.replica
+
+    def db_for_write(self, model, **hints):
+        # Explícito: sem isso o Django gravaria no banco de onde a instância foi lida
+        estado = _estado.get()
+        if estado is not None:
+            estado.escreveu = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica e primário têm os mesmos dados
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != self.replica
+
+
+class RoteamentoBancoMiddleware:
+    """
+    Deve vir logo após a instrumentação, antes de qualquer acesso ao banco.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_configurada():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def permite_replica(self, request):
+        return request.method in METODOS_LEITURA and COOKIE not in request.COOKIES
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with ler_da_replica(self.permite_replica(request)) as estado:
+            response = self.get_response(request)
+        return self.fixar(request, response, estado)
+
+    async def __acall__(self, request):
+        with ler_da_replica(self.permite_replica(request)) as estado:
+            response = await self.get_response(request)
+        return self.fixar(request, response, estado)
+
+    def fixar(self, request, response, estado):
+        """
+        Depois de uma escrita, mantém o navegador no primário por alguns segundos.
+        """
+        if estado.escreveu or request.method not in METODOS_LEITURA:
+            response.set_cookie(COOKIE, '1', max_age=settings.BANCO_REPLICA_FIXAR_SEGUNDOS,
+                                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,195 @@
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import busca, cache_modelos, fila, inventario, metricas, tempo_real
+from .models import AcessoCliente, Cliente, Dispositivo, Protocolo, AtualizacaoProtocolo
+
+
+@receiver(post_save, sender=Protocolo)
+def indexar_protocolo(sender, instance, raw=False, **kwargs):
+    """
+    Mantém o documento de busca do protocolo atualizado a cada gravação.
+    """
+    if not raw:
+        busca.indexar([instance.pk])
+
+
+def _exclusao_em_cascata(origin, modelo):
+    """
+    Indica se a exclusão partiu de outro modelo (`origin`: instância ou queryset).
+    """
+    if origin is None:
+        return False
+    return (origin.model if isinstance(origin, QuerySet) else type(origin)) is not modelo
+
+
+@receiver(post_save, sender=AtualizacaoProtocolo)
+@receiver(post_delete, sender=AtualizacaoProtocolo)
+def indexar_atualizacao(sender, instance, raw=False, origin=None, **kwargs):
+    # Na exclusão em cascata (do protocolo, do dispositivo ou do cliente) o
+    # protocolo também é removido: reindexá-lo recriaria o documento órfão
+    if raw or _exclusao_em_cascata(origin, AtualizacaoProtocolo):
+        return
+    if Protocolo.objects.filter(pk=instance.protocolo_id).exists():
+        busca.indexar([instance.protocolo_id])
+
+
+@receiver(post_save, sender=Cliente)
+def indexar_protocolos_do_cliente(sender, instance, created=False, raw=False, **kwargs):
+    """
+    O nome do cliente faz parte do documento: reindexa os protocolos dele em
+    segundo plano (podem ser milhares). A chave junta alterações seguidas.
+    """
+    if not raw and not created:
+        fila.enfileirar('reindexar_protocolos_cliente', {'cliente_id': instance.pk},
+                        chave=f'reindexar:cliente:{instance.pk}')
+
+
+@receiver(post_save, sender=Dispositivo)
+def indexar_protocolos_do_dispositivo(sender, instance, created=False, raw=False, **kwargs):
+    if not raw and not created:
+        fila.enfileirar('reindexar_protocolos_dispositivo', {'dispositivo_id': instance.pk},
+                        chave=f'reindexar:dispositivo:{instance.pk}')
+
+
+@receiver(post_save, sender=Dispositivo)
+@receiver(post_delete, sender=Dispositivo)
+def limpar_cache_inventario(sender, instance, raw=False, **kwargs):
+    # Já (esta transação vê o valor novo) e de novo após o commit (antes dele,
+    # outra requisição ainda poderia guardar o valor antigo)
+    inventario.limpar_cache()
+    transaction.on_commit(inventario.limpar_cache)
+
+
+@receiver(post_save, sender=Cliente)
+@receiver(post_delete, sender=Cliente)
+@receiver(post_save, sender=Dispositivo)
+@receiver(post_delete, sender=Dispositivo)
+@receiver(post_save, sender=Protocolo)
+@receiver(post_delete, sender=Protocolo)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=AcessoCliente)
+@receiver(post_delete, sender=AcessoCliente)
+def invalidar_cache_do_modelo(sender, instance, **kwargs):
+    """
+    Nova versão das chaves do modelo no cache de referência (cache_modelos.py).
+    A de AcessoCliente também renova os escopos guardados nas sessões (escopo.py).
+    """
+    # Já e de novo após o commit, como o cache do inventário
+    cache_modelos.invalidar(sender)
+    transaction.on_commit(lambda: cache_modelos.invalidar(sender))
+
+
+@receiver(post_save, sender=Protocolo)
+def registrar_identificadores_dispositivo(sender, instance, raw=False, **kwargs):
+    """
+    O BUIC e o tópico MQTT informados no protocolo passam a identificar o dispositivo.
+    """
+    if not raw and (instance.buic or instance.topico_mqtt):
+        inventario.atribuir_identificadores(instance.dispositivo_id, instance.buic, instance.topico_mqtt)
+
+
+@receiver(post_save, sender=Protocolo)
+def contabilizar_protocolo(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Move o protocolo entre os contadores a partir do estado anterior, o que
+    Protocolo.save() tinha carregado do banco.
+    """
+    if raw:
+        return
+    deltas = Counter()
+    anterior = getattr(instance, '_estado_anterior', None)
+    if anterior:
+        for chave in metricas.chaves_protocolo(anterior['status'], anterior['tecnico_responsavel_id'],
+                                               anterior['cliente_id']):
+            deltas[chave] -= 1
+    for chave in metricas.chaves_protocolo(instance.status, instance.tecnico_responsavel_id, instance.cliente_id,
+                                           None if anterior else instance.criado_em):
+        deltas[chave] += 1
+    metricas.ajustar(deltas)
+
+
+@receiver(post_delete, sender=Protocolo)
+def descontar_protocolo(sender, instance, **kwargs):
+    metricas.contabilizar_protocolos([instance], sinal=-1)
+
+
+@receiver(pre_save, sender=Dispositivo)
+def guardar_estado_anterior_dispositivo(sender, instance, raw=False, **kwargs):
+    instance._estado_anterior = None
+    if not raw and instance.pk:
+        instance._estado_anterior = sender.objects.filter(pk=instance.pk).values('tipo', 'online').first()
+
+
+@receiver(post_save, sender=Dispositivo)
+def contabilizar_dispositivo(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = Counter()
+    anterior = getattr(instance, '_estado_anterior', None)
+    if anterior:
+        deltas[metricas.chaves_dispositivo(anterior['tipo'], anterior['online'])[0]] -= 1
+    deltas[metricas.chaves_dispositivo(instance.tipo, instance.online)[0]] += 1
+    metricas.ajustar(deltas)
+
+
+@receiver(post_delete, sender=Dispositivo)
+def descontar_dispositivo(sender, instance, **kwargs):
+    metricas.ajustar({metricas.chaves_dispositivo(instance.tipo, instance.online)[0]: -1})
+
+
+@receiver(post_save, sender=AtualizacaoProtocolo)
+def registrar_primeira_resposta(sender, instance, created=False, raw=False, **kwargs):
+    """
+    A primeira atualização feita por um técnico conta como primeira resposta.
+    """
+    if created and not raw and instance.tecnico_id:
+        Protocolo.objects.filter(pk=instance.protocolo_id, primeira_resposta_em__isnull=True).update(
+            primeira_resposta_em=instance.data_atualizacao)
+
+
+@receiver(post_save, sender=Protocolo)
+def publicar_evento_protocolo(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Publica (após o commit) a criação, a mudança de status ou a alteração do protocolo.
+    """
+    if raw or not tempo_real.barramento().tem_assinantes():
+        return
+    anterior = getattr(instance, '_estado_anterior', None)
+    if created:
+        evento = tempo_real.evento_protocolo('protocolo_criado', instance)
+    elif anterior and anterior['status'] != instance.status:
+        evento = tempo_real.evento_protocolo('status_alterado', instance, status_anterior=anterior['status'])
+    else:
+        evento = tempo_real.evento_protocolo('protocolo_atualizado', instance)
+    transaction.on_commit(lambda: tempo_real.barramento().publicar(evento))
+
+
+@receiver(post_save, sender=AtualizacaoProtocolo)
+def publicar_evento_atualizacao(sender, instance, created=False, raw=False, **kwargs):
+    if raw or not created or not tempo_real.barramento().tem_assinantes():
+        return
+    protocolo = Protocolo.objects.only('cliente_id', 'tecnico_responsavel_id', 'status').get(pk=instance.protocolo_id)
+    evento = tempo_real.evento_protocolo('atualizacao_criada', protocolo, atualizacao_id=instance.pk,
+                                         texto=instance.texto[:200])
+    transaction.on_commit(lambda: tempo_real.barramento().publicar(evento))
+
+
+@receiver(post_save, sender=Protocolo)
+def notificar_cliente(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Avisa o cliente (por e-mail, em segundo plano) da abertura e da conclusão.
+    """
+    if raw or not settings.NOTIFICAR_CLIENTES or not instance.cliente_id:
+        return
+    anterior = getattr(instance, '_estado_anterior', None)
+    if created or (instance.status == 'concluido' and anterior and anterior['status'] != 'concluido'):
+        fila.enfileirar('notificar_cliente', {'protocolo_id': instance.pk, 'status': instance.status},
+                        chave=f'notificar:{instance.pk}:{instance.status}')
@@ -0,0 +1,101 @@
+"""
+Relatório de SLA dos protocolos por cliente ou por técnico.
+
+Medidas (a partir do criado_em do protocolo):
+
+* primeira_resposta -> até primeira_resposta_em
+* resolucao         -> até concluido_em
+
+Os percentis usam o método do posto mais próximo e são calculados no banco com
+funções de janela: cada protocolo recebe sua posição (ROW_NUMBER) e o total do
+grupo (COUNT) ordenados pela duração, e só as linhas na posição
+ceil(total * p / 100) de cada percentil são lidas. O volume transferido depende
+da quantidade de grupos, não da quantidade de protocolos.
+"""
+from django.contrib.auth.models import User
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Q, Window
+from django.db.models.functions import Ceil, RowNumber
+
+from .models import Cliente, Protocolo
+
+PERCENTIS = (50, 90, 95)
+
+GRUPOS = {
+    'cliente': 'cliente_id',
+    'tecnico': 'tecnico_responsavel_id',
+}
+
+MEDIDAS = {
+    'primeira_resposta': 'primeira_resposta_em',
+    'resolucao': 'concluido_em',
+}
+
+
+def _com_duracao(queryset, medida):
+    fim = MEDIDAS[medida]
+    return queryset.filter(**{f'{fim}__isnull': False}).annotate(
+        duracao=ExpressionWrapper(F(fim) - F('criado_em'), output_field=DurationField()),
+    )
+
+
+def _nomes(grupo, ids):
+    ids = [pk for pk in ids if pk]
+    if grupo == 'tecnico':
+        return dict(User.objects.filter(pk__in=ids).values_list('pk', 'username'))
+    return dict(Cliente.objects.filter(pk__in=ids).values_list('pk', 'nome'))
+
+
+def _segundos(duracao):
+    return round(duracao.total_seconds(), 3) if duracao is not None else None
+
+
+def relatorio(grupo='cliente', medida='resolucao', queryset=None, percentis=PERCENTIS):
+    """
+    Retorna [{id, nome, quantidade, media, p50, p90, p95}] (durações em segundos)
+    para cada cliente ou técnico, ordenado pela quantidade de protocolos.
+    `queryset` permite restringir os protocolos (ex.: por período).
+    """
+    if grupo not in GRUPOS:
+        raise ValueError(f"Grupo desconhecido: {grupo}")
+    if medida not in MEDIDAS:
+        raise ValueError(f"Medida desconhecida: {medida}")
+    campo = GRUPOS[grupo]
+    protocolos = _com_duracao(queryset if queryset is not None else Protocolo.objects.all(), medida).order_by()
+
+    # Quantidade e média por grupo em uma agregação
+    linhas = {}
+    for identificador, quantidade, media in (
+        protocolos.values_list(campo).annotate(quantidade=Count('pk'), media=Avg('duracao'))
+    ):
+        linhas[identificador] = {'id': identificador, 'quantidade': quantidade, 'media': _segundos(media)}
+
+    # Posição de cada protocolo no grupo e só as linhas que são percentis
+    posicoes = protocolos.annotate(
+        posicao=Window(RowNumber(), partition_by=[F(campo)], order_by=[F('duracao').asc(), F('pk').asc()]),
+        total=Window(Count('pk'), partition_by=[F(campo)]),
+    )
+    condicao = Q()
+    for percentil in percentis:
+        condicao |= Q(posicao=Ceil(F('total') * percentil / 100.0))
+    for identificador, posicao, total, duracao in posicoes.filter(condicao).values_list(
+            campo, 'posicao', 'total', 'duracao'):
+        linha = linhas.setdefault(identificador, {'id': identificador})
+        for percentil in percentis:
+            if posicao == _posto(total, percentil):
+                linha[f'p{percentil}'] = _segundos(duracao)
+
+    nomes = _nomes(grupo, linhas)
+    resultado = []
+    for identificador, linha in linhas.items():
+        linha['nome'] = nomes.get(identificador, "Sem técnico" if grupo == 'tecnico' else "Sem cliente")
+        resultado.append(linha)
+    resultado.sort(key=lambda linha: (-linha.get('quantidade', 0), str(linha['nome'])))
+    return resultado
+
+
+def _posto(total, percentil):
+    """
+    Posição do percentil pelo método do posto mais próximo (igual à condição SQL).
+    """
+    posto = -(-total * percentil // 100)
+    return max(posto, 1)
@@ -0,0 +1,54 @@
+"""
+Tarefas de segundo plano (executadas por processar_tarefas; ver suporte_app.fila).
+Todas são idempotentes: podem rodar de novo sem efeito duplicado relevante.
+"""
+from django.conf import settings
+from django.core.mail import send_mail
+
+from . import busca
+from .fila import tarefa
+from .models import Protocolo
+
+
+@tarefa('reindexar_protocolos')
+def reindexar_protocolos(protocolo_ids):
+    busca.indexar(protocolo_ids)
+
+
+@tarefa('reindexar_protocolos_cliente')
+def reindexar_protocolos_cliente(cliente_id):
+    """
+    O nome do cliente faz parte do documento de busca de todos os seus protocolos.
+    """
+    busca.indexar(Protocolo.objects.filter(cliente_id=cliente_id).values_list('pk', flat=True).iterator())
+
+
+@tarefa('reindexar_protocolos_dispositivo')
+def reindexar_protocolos_dispositivo(dispositivo_id):
+    busca.indexar(Protocolo.objects.filter(dispositivo_id=dispositivo_id).values_list('pk', flat=True).iterator())
+
+
+@tarefa('notificar_cliente', tentativas=8)
+def notificar_cliente(protocolo_id, status):
+    """
+    E-mail ao cliente sobre a abertura ou a conclusão do protocolo. Não envia se
+    o protocolo já mudou de status (ex.: foi reaberto antes da execução).
+    """
+    protocolo = (
+        Protocolo.objects.select_related('cliente', 'dispositivo')
+        .filter(pk=protocolo_id, status=status, cliente__isnull=False)
+        .first()
+    )
+    if protocolo is None or not protocolo.cliente.email:
+        return
+    acao = 'concluído' if status == 'concluido' else 'aberto'
+    send_mail(
+        subject=f"Protocolo {protocolo.numero_protocolo} {acao}",
+        message=(
+            f"Olá, {protocolo.cliente.nome}.\n\n"
+            f"O protocolo {protocolo.numero_protocolo} do dispositivo {protocolo.dispositivo.nome} foi {acao}.\n\n"
+            f"{protocolo.descricao}\n"
+        ),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[protocolo.cliente.email],
+    )
@@ -0,0 +1,49 @@
+"""
+{% fragmento_em_cache %}: trecho de template renderizado uma vez e guardado no
+cache de referência (suporte_app/cache_modelos.py) até um dos modelos mudar.
+
+    {% load fragmentos %}
+    {% fragmento_em_cache "filtros_protocolo" "suporte_app.Cliente auth.User" request.GET.urlencode %}
+      ...
+    {% endfragmento_em_cache %}
+
+Argumentos: nome do fragmento, rótulos dos modelos de que ele depende
+(separados por espaço) e, opcionalmente, valores que fazem o trecho variar.
+"""
+from django import template
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+from .. import cache_modelos
+
+register = template.Library()
+
+
+class FragmentoEmCacheNode(template.Node):
+
+    def __init__(self, nodelist, nome, modelos, variacoes):
+        self.nodelist = nodelist
+        self.nome = nome
+        self.modelos = modelos
+        self.variacoes = variacoes
+
+    def render(self, context):
+        nome = self.nome.resolve(context)
+        modelos = self.modelos.resolve(context).split()
+        variacoes = [variacao.resolve(context) for variacao in self.variacoes]
+        html = cache_modelos.obter(
+            f'fragmento:{nome}', modelos, lambda: str(self.nodelist.render(context)), *variacoes,
+            segundos=settings.CACHE_FRAGMENTOS_SEGUNDOS,
+        )
+        return mark_safe(html)
+
+
+@register.tag('fragmento_em_cache')
+def fragmento_em_cache(parser, token):
+    argumentos = token.split_contents()
+    if len(argumentos) < 3:
+        raise template.TemplateSyntaxError(f"'{argumentos[0]}' precisa do nome e dos modelos do fragmento.")
+    nodelist = parser.parse(('endfragmento_em_cache',))
+    parser.delete_first_token()
+    nome, modelos, *variacoes = (parser.compile_filter(argumento) for argumento in argumentos[1:])
+    return FragmentoEmCacheNode(nodelist, nome, modelos, variacoes)
@@ -0,0 +1,305 @@
+"""
+Eventos de protocolos em tempo real (Server-Sent Events sobre ASGI).
+
+Os sinais dos modelos publicam, após o commit, os eventos protocolo_criado,
+protocolo_atualizado, status_alterado e atualizacao_criada. O endpoint
+/eventos/protocolos/ (view assíncrona: exige servidor ASGI, ex.: uvicorn
+suporte_beyond.asgi:application) repassa a cada conexão os eventos que casam
+com o seu filtro (técnico, cliente e/ou protocolo).
+
+O barramento é plugável (TEMPO_REAL_BACKEND). BarramentoMemoria entrega os
+eventos dentro do processo: cada assinante é só uma fila asyncio limitada, então
+milhares de conexões ociosas custam pouca memória e nenhuma thread. Para
+vários processos/servidores, um backend com a mesma interface (ex.: sobre Redis
+pub/sub) deve ser configurado.
+
+Contrapressão: se um assinante não consome (cliente lento), os eventos mais
+antigos da fila dele são descartados e ele recebe um evento `sobrecarga`
+indicando quantos perdeu, para recarregar o estado completo.
+"""
+import asyncio
+import itertools
+import json
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+class Filtro:
+    """
+    Eventos de um técnico, cliente e/ou protocolo (campos None não filtram),
+    restritos aos `clientes` permitidos ao assinante (None: todos; ver escopo.py).
+    """
+
+    def __init__(self, tecnico_id=None, cliente_id=None, protocolo_id=None, clientes=None):
+        self.tecnico_id = tecnico_id
+        self.cliente_id = cliente_id
+        self.protocolo_id = protocolo_id
+        self.clientes = clientes
+
+    def aceita(self, evento):
+        if self.clientes is not None and evento.get('cliente_id') not in self.clientes:
+            return False
+        return all(
+            valor is None or evento.get(campo) == valor
+            for campo, valor in (('tecnico_id', self.tecnico_id), ('cliente_id', self.cliente_id),
+                                 ('protocolo_id', self.protocolo_id))
+        )
+
+    def chave(self):
+        """
+        Chave do índice do barramento: o campo mais seletivo do filtro.
+        """
+        for campo in ('protocolo_id', 'tecnico_id', 'cliente_id'):
+            valor = getattr(self, campo)
+            if valor is not None:
+                return (campo, valor)
+        return ('todos', None)
+
+
+class Assinatura:
+    """
+    Fila limitada de eventos de um assinante, ligada ao loop em que foi criada.
+    """
+
+    def __init__(self, barramento, filtro, tamanho_fila):
+        self.barramento = barramento
+        self.filtro = filtro
+        self.loop = asyncio.get_running_loop()
+        self.fila = asyncio.Queue(maxsize=tamanho_fila)
+        self.perdidos = 0
+
+    def entregar(self, evento):
+        """
+        Enfileira o evento (no loop do assinante), descartando o mais antigo se cheia.
+        """
+        if self.fila.full():
+            self.fila.get_nowait()
+            self.perdidos += 1
+        self.fila.put_nowait(evento)
+
+    async def proximo(self, timeout=None):
+        """
+        Próximo evento, ou None se nada chegar em `timeout` segundos.
+        """
+        try:
+            return await asyncio.wait_for(self.fila.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def descartados(self):
+        """
+        Quantidade de eventos descartados desde a última chamada.
+        """
+        perdidos, self.perdidos = self.perdidos, 0
+        return perdidos
+
+    def fechar(self):
+        self.barramento.remover(self)
+
+
+class BarramentoMemoria:
+    """
+    Pub/sub em processo. `publicar` pode ser chamado de qualquer thread (ex.: a
+    thread do ORM); a entrega é agendada no loop de cada assinante.
+    """
+
+    def __init__(self):
+        self.trava = threading.Lock()
+        self.indice = {}
+        self.sequencia = itertools.count(1)
+
+    def assinar(self, filtro, tamanho_fila=None):
+        """
+        Cria uma assinatura no loop atual (chamar de código assíncrono).
+        """
+        assinatura = Assinatura(self, filtro, tamanho_fila or settings.TEMPO_REAL_FILA)
+        with self.trava:
+            self.indice.setdefault(filtro.chave(), set()).add(assinatura)
+        return assinatura
+
+    def remover(self, assinatura):
+        with self.trava:
+            assinaturas = self.indice.get(assinatura.filtro.chave())
+            if assinaturas is not None:
+                assinaturas.discard(assinatura)
+                if not assinaturas:
+                    del self.indice[assinatura.filtro.chave()]
+
+    def tem_assinantes(self):
+        return bool(self.indice)
+
+    def quantidade_assinantes(self):
+        with self.trava:
+            return sum(len(assinaturas) for assinaturas in self.indice.values())
+
+    def publicar(self, evento):
+        """
+        Entrega o evento às assinaturas cujo filtro o aceita. Retorna quantas.
+        """
+        evento = dict(evento, id=next(self.sequencia))
+        chaves = [('todos', None)] + [(campo, evento.get(campo)) for campo in ('protocolo_id', 'tecnico_id', 'cliente_id')
+                                      if evento.get(campo) is not None]
+        por_loop = {}
+        with self.trava:
+            for chave in chaves:
+                for assinatura in self.indice.get(chave, ()):
+                    if assinatura.filtro.aceita(evento):
+                        por_loop.setdefault(assinatura.loop, []).append(assinatura)
+        entregues = 0
+        for loop, assinaturas in por_loop.items():
+            if loop.is_closed():
+                continue
+            loop.call_soon_threadsafe(_entregar, assinaturas, evento)
+            entregues += len(assinaturas)
+        return entregues
+
+
+def _entregar(assinaturas, evento):
+    for assinatura in assinaturas:
+        assinatura.entregar(evento)
+
+
+_barramento = None
+
+
+def barramento():
+    """
+    Instância do backend configurado em TEMPO_REAL_BACKEND (uma por processo).
+    """
+    global _barramento
+    if _barramento is None:
+        _barramento = import_string(settings.TEMPO_REAL_BACKEND)()
+    return _barramento
+
+
+def evento_protocolo(tipo, protocolo, **extras):
+    return {
+        'tipo': tipo,
+        'protocolo_id': protocolo.pk,
+        'cliente_id': protocolo.cliente_id,
+        'tecnico_id': protocolo.tecnico_responsavel_id,
+        'status': protocolo.status,
+        'em': timezone.now().isoformat(),
+        **extras,
+    }
+
+
+def formatar_sse(evento):
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {json.dumps(evento, ensure_ascii=False)}\n\n"
+
+
+async def transmitir(filtro, heartbeat=None):
+    """
+    Gera o stream SSE dos eventos que casam com `filtro`: eventos, avisos de
+    sobrecarga e comentários periódicos (heartbeat) que mantêm a conexão ociosa
+    aberta. A assinatura existe enquanto o stream estiver sendo consumido.
+    """
+    heartbeat = heartbeat or settings.TEMPO_REAL_HEARTBEAT_SEGUNDOS
+    assinatura = barramento().assinar(filtro)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            evento = await assinatura.proximo(timeout=heartbeat)
+            perdidos = assinatura.descartados()
+            if perdidos:
+                yield f"event: sobrecarga\ndata: {json.dumps({'perdidos': perdidos})}\n\n"
+            yield formatar_sse(evento) if evento is not None else ": ping\n\n"
+    finally:
+        assinatura.fechar()
+
+
+class ConexaoAsgi:
+    """
+    Requisição GET feita diretamente à aplicação ASGI (sem servidor HTTP) e
+    mantida aberta até fechar(). Usada no teste de carga e nos testes.
+    """
+
+    def __init__(self, aplicacao, caminho, query='', cabecalhos=()):
+        self.aplicacao = aplicacao
+        self.escopo = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': caminho, 'raw_path': caminho.encode(), 'root_path': '',
+            'query_string': query.encode(), 'headers': [(b'host', b'testserver'), *cabecalhos],
+            'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+        }
+        self.status = None
+        self.corpo = b''
+        self.recebeu = asyncio.Event()
+        self.desconectar = asyncio.Event()
+        self.corpo_lido = False
+        self.tarefa = None
+
+    async def receive(self):
+        if not self.corpo_lido:
+            self.corpo_lido = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.desconectar.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, mensagem):
+        if mensagem['type'] == 'http.response.start':
+            self.status = mensagem['status']
+        elif mensagem['type'] == 'http.response.body':
+            self.corpo += mensagem.get('body', b'')
+            self.recebeu.set()
+
+    def abrir(self):
+        self.tarefa = asyncio.create_task(self.aplicacao(self.escopo, self.receive, self.send))
+        return self
+
+    async def aguardar(self, texto, timeout=5):
+        """
+        Espera até o corpo recebido conter `texto`.
+        """
+        async def esperar():
+            while texto.encode() not in self.corpo:
+                self.recebeu.clear()
+                await self.recebeu.wait()
+        await asyncio.wait_for(esperar(), timeout)
+
+    async def fechar(self):
+        self.desconectar.set()
+        await self.tarefa
+
+
+async def medir_conexoes(aplicacao, quantidade, cabecalhos=(), caminho='/eventos/protocolos/', medir_memoria=False):
+    """
+    Abre `quantidade` conexões SSE ociosas na aplicação ASGI, mede o tempo para
+    um evento chegar a todas e as fecha. Com `medir_memoria`, mede também a
+    memória por conexão (tracemalloc deixa a abertura bem mais lenta).
+    """
+    if medir_memoria:
+        tracemalloc.start()
+    memoria_inicial = tracemalloc.get_traced_memory()[0]
+    threads_iniciais = threading.active_count()
+    inicio = time.monotonic()
+    conexoes = [ConexaoAsgi(aplicacao, caminho, cabecalhos=cabecalhos).abrir() for _ in range(quantidade)]
+    await asyncio.gather(*(conexao.aguardar('retry:', timeout=60) for conexao in conexoes))
+    segundos_abertura = time.monotonic() - inicio
+    memoria = None
+    if medir_memoria:
+        memoria = (tracemalloc.get_traced_memory()[0] - memoria_inicial) / quantidade / 1024
+        tracemalloc.stop()
+    threads = threading.active_count() - threads_iniciais
+
+    inicio = time.monotonic()
+    entregues = barramento().publicar({'tipo': 'protocolo_atualizado', 'protocolo_id': 0, 'status': 'carga'})
+    await asyncio.gather(*(conexao.aguardar('"carga"', timeout=60) for conexao in conexoes))
+    segundos_fanout = time.monotonic() - inicio
+
+    await asyncio.gather(*(conexao.fechar() for conexao in conexoes))
+    return {
+        'conexoes': quantidade,
+        'status': sorted({conexao.status for conexao in conexoes}),
+        'segundos_abertura': segundos_abertura,
+        'memoria_por_conexao_kb': memoria,
+        'threads_adicionais': threads,
+        'entregues': entregues,
+        'fanout_ms': segundos_fanout * 1000,
+        'assinantes_apos_fechar': barramento().quantidade_assinantes(),
+    }
@@ -1,3 +1,1828 @@
-from django.test import TestCase
+import asyncio
+import json
+from io import StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import F, Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Cliente, Dispositivo, Protocolo, AtualizacaoProtocolo, Incidente
+
+
+def criar_protocolos(quantidade, tecnico=None, prefixo='cli'):
+    """
+    Cria `quantidade` protocolos, cada um com cliente, dispositivo e duas atualizações.
+    """
+    protocolos = []
+    for i in range(quantidade):
+        cliente = Cliente.objects.create(nome=f"{prefixo} {i}", email=f"{prefixo}{i}@exemplo.com", telefone="0")
+        dispositivo = Dispositivo.objects.create(
+            cliente=cliente, nome=f"disp {i}", tipo="sensor",
+            mac_address=f"{prefixo}-{i}", localizacao="sala",
+        )
+        protocolo = Protocolo.objects.create(
+            cliente=cliente, dispositivo=dispositivo, descricao="x" * 60,
+            tecnico_responsavel=tecnico,
+        )
+        AtualizacaoProtocolo.objects.create(protocolo=protocolo, texto="primeira", tecnico=tecnico)
+        AtualizacaoProtocolo.objects.create(protocolo=protocolo, texto="segunda", tecnico=tecnico)
+        protocolos.append(protocolo)
+    return protocolos
+
+
+class AdminQueryCountMixin:
+    """
+    Utilitários para medir a quantidade de consultas de uma página do admin.
+    """
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+        self.client.force_login(self.usuario)
+
+    def contar_consultas(self, url, params=None):
+        # Primeira requisição apenas aquece caches do Django (ex.: ContentType)
+        self.client.get(url, params or {})
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self.client.get(url, params or {})
+        self.assertEqual(resposta.status_code, 200)
+        return len(contexto.captured_queries)
+
+
+class ProtocoloAdminTests(AdminQueryCountMixin, TestCase):
+
+    def test_changelist_com_numero_constante_de_consultas(self):
+        url = reverse('admin:suporte_app_protocolo_changelist')
+        criar_protocolos(2, tecnico=self.usuario, prefixo='a')
+        poucas = self.contar_consultas(url)
+        criar_protocolos(20, tecnico=self.usuario, prefixo='b')
+        muitas = self.contar_consultas(url)
+        self.assertEqual(poucas, muitas)
+
+    def test_data_criacao_usa_criado_em(self):
+        protocolo = criar_protocolos(1)[0]
+        self.assertIsNotNone(protocolo.criado_em)
+        url = reverse('admin:suporte_app_protocolo_changelist')
+        resposta = self.client.get(url, {'o': '8'})
+        self.assertContains(resposta, protocolo.descricao[:50])
+
+    def test_filtro_por_data_de_criacao(self):
+        protocolo = criar_protocolos(1)[0]
+        url = reverse('admin:suporte_app_protocolo_changelist')
+        resposta = self.client.get(url, {
+            'criado_em__year': protocolo.criado_em.year,
+            'criado_em__month': protocolo.criado_em.month,
+        })
+        self.assertEqual(resposta.context['cl'].result_count, 1)
+
+
+class ClienteAdminTests(AdminQueryCountMixin, TestCase):
+
+    def test_changelist_com_numero_constante_de_consultas(self):
+        url = reverse('admin:suporte_app_cliente_changelist')
+        criar_protocolos(2, prefixo='a')
+        poucas = self.contar_consultas(url)
+        criar_protocolos(30, prefixo='b')
+        muitas = self.contar_consultas(url)
+        self.assertEqual(poucas, muitas)
+
+    def test_contagens_agregadas(self):
+        cliente = criar_protocolos(1)[0].cliente
+        Dispositivo.objects.create(cliente=cliente, nome="on", tipo="t", mac_address="on", localizacao="l", online=True)
+        Protocolo.objects.create(cliente=cliente, dispositivo=cliente.dispositivo_set.first(),
+                                 descricao="y", status='concluido')
+        anotado = Cliente.objects.com_contagens().get(pk=cliente.pk)
+        self.assertEqual(anotado.quantidade_dispositivos, 2)
+        self.assertEqual(anotado.dispositivos_online, 1)
+        self.assertEqual(anotado.dispositivos_offline, 1)
+        self.assertEqual(anotado.protocolos_abertos, 1)
+
+    def test_ordenacao_por_contagem(self):
+        clientes = [protocolo.cliente for protocolo in criar_protocolos(3)]
+        for i, cliente in enumerate(clientes):
+            for n in range(i * 2):
+                Dispositivo.objects.create(cliente=cliente, nome=f"extra {n}", tipo="t",
+                                           mac_address=f"extra-{i}-{n}", localizacao="l")
+        url = reverse('admin:suporte_app_cliente_changelist')
+        # Coluna 4: quantidade de dispositivos (1, 3 e 5)
+        resposta = self.client.get(url, {'o': '-4'})
+        self.assertEqual(resposta.status_code, 200)
+        resultado = resposta.context['cl'].result_list
+        self.assertEqual([cliente.quantidade_dispositivos for cliente in resultado], [5, 3, 1])
+        self.assertEqual([cliente.pk for cliente in resultado], [cliente.pk for cliente in reversed(clientes)])
+        resposta = self.client.get(url, {'o': '4'})
+        self.assertEqual([cliente.quantidade_dispositivos for cliente in resposta.context['cl'].result_list],
+                         [1, 3, 5])
+
+
+class DispositivoAdminTests(AdminQueryCountMixin, TestCase):
+
+    def test_changelist_com_numero_constante_de_consultas(self):
+        url = reverse('admin:suporte_app_dispositivo_changelist')
+        criar_protocolos(2, prefixo='a')
+        poucas = self.contar_consultas(url)
+        criar_protocolos(30, prefixo='b')
+        muitas = self.contar_consultas(url)
+        self.assertEqual(poucas, muitas)
+
+    def test_formulario_de_protocolo_com_numero_constante_de_consultas(self):
+        url = reverse('admin:suporte_app_protocolo_add')
+        criar_protocolos(2, prefixo='a')
+        poucas = self.contar_consultas(url)
+        criar_protocolos(30, prefixo='b')
+        muitas = self.contar_consultas(url)
+        self.assertEqual(poucas, muitas)
+
+    def test_protocolo_form_renderiza_so_os_selecionados(self):
+        from .forms import ProtocoloForm
+        protocolo = criar_protocolos(5)[0]
+        form = ProtocoloForm()
+        with self.assertNumQueries(0):
+            str(form['cliente'])
+            str(form['dispositivo'])
+        # Com valores selecionados: uma consulta por campo (o rótulo do dispositivo traz o cliente)
+        form = ProtocoloForm(instance=protocolo)
+        with self.assertNumQueries(2):
+            html = str(form['cliente']) + str(form['dispositivo'])
+        self.assertEqual(html.count('<option'), 4)
+        self.assertIn('data-autocompletar', html)
+
+
+class ExplicarConsultasTests(TestCase):
+
+    def test_explica_todas_as_consultas(self):
+        criar_protocolos(3)
+        saida = StringIO()
+        call_command('explicar_consultas', stdout=saida)
+        for nome in ('admin_protocolos', 'protocolos_abertos_tecnico', 'admin_clientes', 'protocolo_atualizacoes'):
+            self.assertIn(f"== {nome}", saida.getvalue())
+
+
+class BuscaProtocoloTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+        self.client.force_login(self.usuario)
+        self.protocolo, self.outro = criar_protocolos(2)
+        self.protocolo.buic = "BUIC-7781"
+        self.protocolo.save()
+        AtualizacaoProtocolo.objects.create(protocolo=self.protocolo, texto="Reinício do gateway resolveu a conexão")
+
+    def test_busca_no_texto_das_atualizacoes(self):
+        resposta = self.client.get(reverse('buscar_protocolos'), {'q': 'gateway conexao'})
+        dados = resposta.json()
+        self.assertEqual(dados['total'], 1)
+        self.assertEqual(dados['resultados'][0]['id'], self.protocolo.pk)
+
+    def test_busca_por_buic_e_nome_do_cliente(self):
+        from . import busca
+        self.assertEqual(list(busca.filtrar(Protocolo.objects.all(), "7781")), [self.protocolo])
+        self.assertEqual(list(busca.filtrar(Protocolo.objects.all(), self.outro.cliente.nome)), [self.outro])
+
+    @override_settings(TAREFAS_IMEDIATAS=True)
+    def test_indice_acompanha_alteracao_do_cliente(self):
+        from . import busca
+        cliente = self.outro.cliente
+        cliente.nome = "Fazenda Esperança"
+        with self.captureOnCommitCallbacks(execute=True):
+            cliente.save()
+        self.assertEqual(list(busca.filtrar(Protocolo.objects.all(), "esperanca")), [self.outro])
+
+    def test_paginacao(self):
+        url = reverse('buscar_protocolos')
+        dados = self.client.get(url, {'q': 'primeira', 'por_pagina': 1, 'pagina': 2}).json()
+        self.assertEqual(dados['total'], 2)
+        self.assertEqual(len(dados['resultados']), 1)
+
+    def test_exclusao_em_cascata_nao_recria_o_documento(self):
+        from .models import IndiceBuscaProtocolo
+        self.protocolo.delete()
+        self.outro.cliente.delete()
+        connection.check_constraints()
+        self.assertFalse(IndiceBuscaProtocolo.objects.exists())
+
+    def test_admin_usa_indice(self):
+        url = reverse('admin:suporte_app_protocolo_changelist')
+        resposta = self.client.get(url, {'q': 'gateway'})
+        self.assertEqual(resposta.context['cl'].result_count, 1)
+
+
+class ApiTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+        self.client.force_login(self.usuario)
+        self.protocolos = criar_protocolos(5, tecnico=self.usuario)
+
+    def test_paginacao_por_cursor(self):
+        url = reverse('api_protocolos')
+        ids = []
+        params = {'limit': 2, 'fields': 'id'}
+        while True:
+            dados = self.client.get(url, params).json()
+            ids += [item['id'] for item in dados['resultados']]
+            if not dados['next_cursor']:
+                break
+            params['cursor'] = dados['next_cursor']
+        self.assertEqual(ids, sorted((p.pk for p in self.protocolos), reverse=True))
+
+    def test_campos_aninhados(self):
+        dados = self.client.get(reverse('api_protocolos'), {'fields': 'id,cliente.nome', 'limit': 1}).json()
+        self.assertEqual(dados['resultados'], [{'id': self.protocolos[-1].pk,
+                                                'cliente': {'nome': self.protocolos[-1].cliente.nome}}])
+
+    def test_pagina_com_consulta_unica_sem_count(self):
+        url = reverse('api_protocolos')
+        cursor = str(self.protocolos[2].pk)
+        with CaptureQueriesContext(connection) as contexto:
+            self.client.get(url, {'cursor': cursor, 'fields': 'id,status,cliente.nome'})
+        consultas = [q['sql'] for q in contexto.captured_queries if 'suporte_app_protocolo' in q['sql']]
+        self.assertEqual(len(consultas), 1)
+        self.assertNotIn('COUNT', consultas[0])
+        self.assertNotIn('OFFSET', consultas[0])
+
+    def test_filtros(self):
+        url = reverse('api_protocolos')
+        cliente = self.protocolos[0].cliente
+        dados = self.client.get(url, {'cliente': cliente.pk, 'status': 'aberto', 'tecnico': self.usuario.pk,
+                                      'criado_de': '2000-01-01'}).json()
+        self.assertEqual([item['id'] for item in dados['resultados']], [self.protocolos[0].pk])
+        dados = self.client.get(url, {'criado_ate': '2000-01-01'}).json()
+        self.assertEqual(dados['resultados'], [])
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get(reverse('api_protocolos'), {'fields': 'senha'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_dispositivos'), {'online': 'talvez'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_clientes'), {'cursor': 'x'}).status_code, 400)
+
+    def test_dispositivos_e_clientes(self):
+        dados = self.client.get(reverse('api_dispositivos'), {'online': 'false', 'fields': 'nome,cliente.nome'}).json()
+        self.assertEqual(len(dados['resultados']), 5)
+        dados = self.client.get(reverse('api_clientes'), {'limit': 3}).json()
+        self.assertEqual(len(dados['resultados']), 3)
+        self.assertIsNotNone(dados['next_cursor'])
+
+
+class ImportacaoTests(TestCase):
+
+    CSV = (
+        "cliente_email,cliente_nome,nome,tipo,mac_address,localizacao,online\n"
+        "a@exemplo.com,Cliente A,Sensor 1,sensor,aa-bb-cc-dd-ee-01,Galpão,sim\n"
+        "A@exemplo.com,Cliente A,Sensor 2,sensor,aabbccddee02,Galpão,nao\n"
+        "b@exemplo.com,Cliente B,Gateway,gateway,AA:BB:CC:DD:EE:03,Sala,1\n"
+        "b@exemplo.com,Cliente B,Inválido,gateway,xx:yy,Sala,1\n"
+        ",Sem email,Sensor,sensor,AA:BB:CC:DD:EE:04,Sala,1\n"
+    )
+
+    def importar_csv(self, conteudo, tamanho_lote=2):
+        from . import importacao
+        return importacao.importar(importacao.ler_registros(StringIO(conteudo), 'csv'), tamanho_lote=tamanho_lote)
+
+    def test_usuario_restrito_so_importa_para_os_seus_clientes(self):
+        from .escopo import limitar_a_clientes
+        self.importar_csv(self.CSV)
+        cliente_a = Cliente.objects.get(email="a@exemplo.com")
+        csv_restrito = (
+            "cliente_email,cliente_nome,nome,tipo,mac_address,localizacao,online\n"
+            "a@exemplo.com,Cliente A,Sensor 5,sensor,AA:BB:CC:DD:EE:05,Galpão,sim\n"
+            "b@exemplo.com,Cliente B,Sensor 6,sensor,AA:BB:CC:DD:EE:06,Sala,sim\n"
+            "a@exemplo.com,Cliente A,Tomado,gateway,AA:BB:CC:DD:EE:03,Sala,sim\n"
+            "novo@exemplo.com,Novo,Sensor 7,sensor,AA:BB:CC:DD:EE:07,Sala,sim\n"
+        )
+        with limitar_a_clientes([cliente_a.pk]):
+            resultado = self.importar_csv(csv_restrito)
+        self.assertEqual(resultado.importados, 1)
+        self.assertEqual([numero for numero, _ in resultado.erros], [3, 4, 5])
+        self.assertEqual(Dispositivo.objects.get(mac_address="AA:BB:CC:DD:EE:03").cliente.email, "b@exemplo.com")
+        self.assertFalse(Cliente.objects.filter(email="novo@exemplo.com").exists())
+
+    def test_normalizar_mac(self):
+        from .importacao import normalizar_mac
+        for valor in ('aa:bb:cc:dd:ee:ff', 'AA-BB-CC-DD-EE-FF', 'aabb.ccdd.eeff', 'AABBCCDDEEFF'):
+            self.assertEqual(normalizar_mac(valor), 'AA:BB:CC:DD:EE:FF')
+        for valor in ('', 'aa:bb', 'zz:bb:cc:dd:ee:ff', 'aa:bb:cc:dd:ee:ff:00'):
+            with self.assertRaises(ValueError):
+                normalizar_mac(valor)
+
+    def test_importa_e_relata_erros_sem_abortar(self):
+        resultado = self.importar_csv(self.CSV)
+        self.assertEqual(resultado.lidos, 5)
+        self.assertEqual(resultado.importados, 3)
+        self.assertEqual(resultado.clientes_criados, 2)
+        self.assertEqual([numero for numero, _ in resultado.erros], [5, 6])
+        self.assertEqual(Cliente.objects.count(), 2)
+        self.assertEqual(Dispositivo.objects.get(mac_address='AA:BB:CC:DD:EE:01').cliente.email, 'a@exemplo.com')
+        self.assertTrue(Dispositivo.objects.get(mac_address='AA:BB:CC:DD:EE:01').online)
+
+    def test_reimportacao_atualiza_pelo_mac(self):
+        self.importar_csv(self.CSV)
+        resultado = self.importar_csv(
+            "cliente_email,nome,mac_address,online\n"
+            "b@exemplo.com,Renomeado,aa:bb:cc:dd:ee:01,0\n"
+        )
+        self.assertEqual(resultado.importados, 1)
+        self.assertEqual(Dispositivo.objects.count(), 3)
+        dispositivo = Dispositivo.objects.get(mac_address='AA:BB:CC:DD:EE:01')
+        self.assertEqual((dispositivo.nome, dispositivo.cliente.email, dispositivo.online),
+                         ('Renomeado', 'b@exemplo.com', False))
+
+    def test_jsonl_com_linha_malformada(self):
+        from . import importacao
+        conteudo = (
+            '{"cliente_email": "c@exemplo.com", "nome": "D1", "mac_address": "00:11:22:33:44:55", "online": true}\n'
+            '{quebrado\n'
+        )
+        resultado = importacao.importar(importacao.ler_registros(StringIO(conteudo), 'jsonl'))
+        self.assertEqual((resultado.importados, resultado.quantidade_erros), (1, 1))
+
+    def test_comando_grava_relatorio_de_erros(self):
+        import os
+        import tempfile
+        with tempfile.TemporaryDirectory() as pasta:
+            entrada = os.path.join(pasta, 'dispositivos.csv')
+            erros = os.path.join(pasta, 'erros.csv')
+            with open(entrada, 'w', encoding='utf-8') as arquivo:
+                arquivo.write(self.CSV)
+            call_command('importar_dispositivos', entrada, erros=erros, stdout=StringIO(), stderr=StringIO())
+            with open(erros, encoding='utf-8') as arquivo:
+                self.assertEqual(len(arquivo.readlines()), 3)
+        self.assertEqual(Dispositivo.objects.count(), 3)
+
+    def test_importacao_pelo_admin(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        usuario = User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+        self.client.force_login(usuario)
+        url = reverse('admin:suporte_app_dispositivo_importar')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        arquivo = SimpleUploadedFile('d.csv', self.CSV.encode('utf-8'), content_type='text/csv')
+        resposta = self.client.post(url, {'arquivo': arquivo, 'formato': 'csv'})
+        self.assertRedirects(resposta, reverse('admin:suporte_app_dispositivo_changelist'))
+        self.assertEqual(Dispositivo.objects.count(), 3)
+
+
+class IngestaoMqttTests(TestCase):
+
+    def setUp(self):
+        from .importacao import normalizar_mac
+        self.dispositivos = []
+        cliente = Cliente.objects.create(nome="Cliente", email="c@exemplo.com", telefone="0")
+        for i in range(3):
+            self.dispositivos.append(Dispositivo.objects.create(
+                cliente=cliente, nome=f"d{i}", tipo="sensor", localizacao="sala",
+                mac_address=normalizar_mac(f"00000000000{i}"),
+            ))
+        Protocolo.objects.create(cliente=cliente, dispositivo=self.dispositivos[2], descricao="x",
+                                 buic="BUIC-2", topico_mqtt="fazenda/bomba/estado")
+
+    def ingerir(self, mensagens, **kwargs):
+        from asgiref.sync import async_to_sync
+        from .ingestao import BrokerEmMemoria, IndiceDispositivos, IngestorStatus
+
+        broker = BrokerEmMemoria()
+        ingestor = IngestorStatus(broker, IndiceDispositivos().carregar(), janela=60, **kwargs)
+
+        async def rodar():
+            for topico, payload in mensagens:
+                await broker.publicar(topico, payload)
+            await broker.fechar()
+            await ingestor.executar()
+
+        async_to_sync(rodar)()
+        return ingestor
+
+    def test_interpretar_payload(self):
+        from .ingestao import interpretar_payload
+        self.assertEqual(interpretar_payload(b'online'), (True, {}))
+        self.assertEqual(interpretar_payload('{"status": "offline", "buic": "X"}'), (False, {'buic': 'X'}))
+        self.assertEqual(interpretar_payload('{"online": true}'), (True, {}))
+        self.assertEqual(interpretar_payload('{"uptime": 10}'), (None, {}))
+
+    def test_agrupa_mensagens_e_grava_em_lote(self):
+        transicoes = []
+        ingestor = self.ingerir([
+            ('dispositivos/000000000000/status', b'1'),
+            ('dispositivos/000000000000/status', b'0'),
+            ('dispositivos/000000000000/status', b'1'),
+            ('dispositivos/qualquer/status', '{"online": true, "mac": "00-00-00-00-00-01"}'),
+            ('fazenda/bomba/estado', b'online'),
+            ('fazenda/BUIC-2/estado', '{"uptime": 5}'),
+            ('dispositivos/desconhecido/status', b'1'),
+        ], ao_gravar=transicoes.extend)
+        self.assertEqual(ingestor.mensagens, 7)
+        self.assertEqual(ingestor.ignoradas, 1)
+        self.assertEqual(ingestor.linhas_gravadas, 3)
+        for dispositivo in Dispositivo.objects.all():
+            self.assertTrue(dispositivo.online)
+            self.assertIsNotNone(dispositivo.ultimo_contato)
+        self.assertEqual(sorted(t[0] for t in transicoes), sorted(d.pk for d in self.dispositivos))
+
+    def test_carga_amplificacao_de_escrita(self):
+        mensagens = [(f'dispositivos/00000000000{i % 3}/status', b'1' if i % 2 else b'0') for i in range(3000)]
+        with CaptureQueriesContext(connection) as contexto:
+            ingestor = self.ingerir(mensagens)
+        self.assertEqual(ingestor.linhas_gravadas, 3)
+        self.assertLess(ingestor.amplificacao_escrita, 0.01)
+        atualizacoes = [q for q in contexto.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertLessEqual(len(atualizacoes), 3)
+
+    def test_falha_na_gravacao_devolve_o_lote(self):
+        from unittest import mock
+        from asgiref.sync import async_to_sync
+        from django.db import OperationalError
+        from .ingestao import IndiceDispositivos, IngestorStatus
+        ingestor = IngestorStatus(None, IndiceDispositivos().carregar())
+        ingestor.processar('dispositivos/000000000000/status', b'1')
+        with mock.patch('suporte_app.ingestao.transaction.atomic', side_effect=OperationalError("conexão perdida")):
+            with self.assertLogs('suporte_app.ingestao', 'ERROR'):
+                self.assertEqual(async_to_sync(ingestor.descarregar)(), [])
+        # Nada gravado: o índice não mudou e o lote volta, com o heartbeat recebido depois
+        self.assertFalse(ingestor.indice.online[self.dispositivos[0].pk])
+        ingestor.processar('dispositivos/000000000000/status', '{"uptime": 5}')
+        self.assertEqual(len(async_to_sync(ingestor.descarregar)()), 1)
+        self.assertTrue(Dispositivo.objects.get(pk=self.dispositivos[0].pk).online)
+
+    def test_indice_recarregado_para_dispositivo_novo(self):
+        from asgiref.sync import async_to_sync
+        from .ingestao import IndiceDispositivos, IngestorStatus
+        ingestor = IngestorStatus(None, IndiceDispositivos().carregar(), recarga_indice=3600, recarga_minima=0)
+        self.assertFalse(async_to_sync(ingestor.recarregar_indice)())
+        novo = Dispositivo.objects.create(cliente=self.dispositivos[0].cliente, nome="novo", tipo="sensor",
+                                          localizacao="sala", mac_address="00:00:00:00:00:09")
+        ingestor.processar('dispositivos/000000000009/status', b'1')
+        self.assertEqual(ingestor.ignoradas, 1)
+        self.assertTrue(async_to_sync(ingestor.recarregar_indice)())
+        ingestor.processar('dispositivos/000000000009/status', b'1')
+        self.assertIn(novo.pk, ingestor.pendentes)
+
+
+class ProtocoloAutomaticoTests(TestCase):
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nome="Fazenda", email="f@exemplo.com", telefone="0")
+        self.outro_cliente = Cliente.objects.create(nome="Loja", email="l@exemplo.com", telefone="0")
+        self.dispositivos = [
+            Dispositivo.objects.create(cliente=self.cliente, nome=f"d{i}", tipo="sensor",
+                                       mac_address=f"00:00:00:00:00:0{i}", localizacao="campo", online=True)
+            for i in range(6)
+        ]
+        self.isolado = Dispositivo.objects.create(cliente=self.outro_cliente, nome="caixa", tipo="pdv",
+                                                  mac_address="mac-loja", localizacao="loja", online=True)
+
+    def processar(self, dispositivos, online=False, anterior=True, **kwargs):
+        from django.utils import timezone
+        from .eventos import processar_transicoes
+        agora = timezone.now()
+        return processar_transicoes([(d.pk, anterior, online, agora) for d in dispositivos], **kwargs)
+
+    def test_queda_abre_protocolo_e_repeticao_vira_atualizacao(self):
+        self.processar([self.isolado])
+        self.processar([self.isolado])
+        protocolo = Protocolo.objects.get(dispositivo=self.isolado)
+        self.assertEqual(protocolo.origem, 'automatico')
+        self.assertEqual(protocolo.cliente, self.outro_cliente)
+        self.assertEqual(protocolo.atualizacoes.count(), 1)
+        self.processar([self.isolado], online=True, anterior=False)
+        self.assertEqual(protocolo.atualizacoes.count(), 2)
+
+    def test_protocolo_aberto_antigo_recebe_a_queda(self):
+        from datetime import timedelta
+        self.processar([self.isolado])
+        Protocolo.objects.update(criado_em=Protocolo.objects.get().criado_em - timedelta(hours=2))
+        self.processar([self.isolado], janela=timedelta(minutes=30))
+        protocolo = Protocolo.objects.get(dispositivo=self.isolado)
+        self.assertEqual(protocolo.atualizacoes.count(), 1)
+        # Só um protocolo concluído: a nova queda abre outro
+        Protocolo.objects.update(status='concluido')
+        self.processar([self.isolado], janela=timedelta(minutes=30))
+        self.assertEqual(Protocolo.objects.filter(dispositivo=self.isolado).count(), 2)
+
+    def test_protocolos_automaticos_indexados_contados_e_publicados(self):
+        from unittest import mock
+        from . import busca, metricas
+        publicados = []
+        barramento = mock.Mock(tem_assinantes=lambda: True, publicar=publicados.append)
+        with mock.patch('suporte_app.eventos.tempo_real.barramento', return_value=barramento):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.processar([self.isolado])
+            with self.captureOnCommitCallbacks(execute=True):
+                self.processar([self.isolado])
+        protocolo = Protocolo.objects.get(dispositivo=self.isolado)
+        self.assertEqual([(evento['tipo'], evento['protocolo_id']) for evento in publicados],
+                         [('protocolo_criado', protocolo.pk), ('atualizacao_criada', protocolo.pk)])
+        self.assertEqual(list(busca.filtrar(Protocolo.objects.all(), "caixa")), [protocolo])
+        painel = metricas.montar_painel()
+        self.assertEqual(sum(linha['aberto'] for linha in painel['por_cliente']), 1)
+
+    def test_surto_do_cliente_agrupado_em_incidente(self):
+        self.processar(self.dispositivos[:3], limiar_incidente=5)
+        self.assertFalse(Incidente.objects.exists())
+        resultado = self.processar(self.dispositivos[3:] + [self.isolado], limiar_incidente=5)
+        self.assertEqual(resultado.incidentes_criados, 1)
+        incidente = Incidente.objects.get()
+        self.assertEqual(incidente.cliente, self.cliente)
+        self.assertEqual(incidente.protocolos.count(), 6)
+        self.assertIsNone(Protocolo.objects.get(dispositivo=self.isolado).incidente)
+
+    def test_tempestade_com_consultas_constantes(self):
+        from django.utils import timezone
+        from .eventos import processar_transicoes
+        Dispositivo.objects.bulk_create([
+            Dispositivo(cliente=self.cliente, nome=f"x{i}", tipo="sensor", mac_address=f"x-{i}",
+                        localizacao="campo", online=True)
+            for i in range(300)
+        ])
+        agora = timezone.now()
+        transicoes = [(pk, True, False, agora) for pk in Dispositivo.objects.values_list('pk', flat=True)]
+        with CaptureQueriesContext(connection) as contexto:
+            resultado = processar_transicoes(transicoes, limiar_incidente=5)
+        self.assertEqual(resultado.protocolos_criados, 307)
+        self.assertEqual(Incidente.objects.count(), 1)
+        # Independe da quantidade de dispositivos (só do número de clientes e lotes)
+        self.assertLess(len(contexto.captured_queries), 40)
+
+    def test_ingestao_abre_protocolos(self):
+        from asgiref.sync import async_to_sync
+        from .eventos import processar_transicoes
+        from .ingestao import BrokerEmMemoria, IndiceDispositivos, IngestorStatus
+        broker = BrokerEmMemoria()
+        ingestor = IngestorStatus(broker, IndiceDispositivos().carregar(), ao_gravar=processar_transicoes)
+        for dispositivo in self.dispositivos:
+            ingestor.processar(f"dispositivos/{dispositivo.mac_address}/status", b'offline')
+        async_to_sync(ingestor.descarregar)()
+        self.assertEqual(Protocolo.objects.filter(origem='automatico').count(), 6)
+        self.assertEqual(Incidente.objects.count(), 1)
+
+
+class MetricasTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.usuario = User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+
+    def contadores(self):
+        from .models import Metrica
+        return {(m.dimensao, m.chave): m.valor for m in Metrica.objects.exclude(valor=0)}
+
+    def test_contadores_incrementais_iguais_a_reconstrucao(self):
+        from . import metricas
+        protocolos = criar_protocolos(4, tecnico=self.usuario)
+        protocolos[0].status = 'concluido'
+        protocolos[0].save()
+        protocolos[1].tecnico_responsavel = None
+        protocolos[1].save()
+        protocolos[2].delete()
+        dispositivo = protocolos[3].dispositivo
+        dispositivo.online = True
+        dispositivo.save()
+        incrementais = self.contadores()
+        metricas.reconstruir()
+        self.assertEqual(incrementais, self.contadores())
+        self.assertEqual(incrementais[('status', 'aberto')], 2)
+        self.assertEqual(incrementais[('tipo', 'sensor:online')], 1)
+
+    def test_painel_em_cache_e_invalidado_por_alteracao(self):
+        from . import metricas
+        criar_protocolos(2, tecnico=self.usuario)
+        metricas.painel()
+        with self.assertNumQueries(0):
+            dados = metricas.painel()
+        self.assertEqual(dados['por_tecnico'][0]['aberto'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            criar_protocolos(1, tecnico=self.usuario, prefixo='novo')
+        self.assertEqual(metricas.painel()['por_tecnico'][0]['aberto'], 3)
+
+    def test_painel_nao_consulta_tabelas_grandes(self):
+        criar_protocolos(3, tecnico=self.usuario)
+        self.client.force_login(self.usuario)
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self.client.get(reverse('painel_operacoes'))
+        self.assertContains(resposta, 'Painel de Operações')
+        for consulta in contexto.captured_queries:
+            self.assertNotIn('suporte_app_protocolo', consulta['sql'])
+            self.assertNotIn('suporte_app_dispositivo', consulta['sql'])
+
+    def test_transicoes_da_ingestao(self):
+        from django.utils import timezone
+        from . import metricas
+        protocolo = criar_protocolos(1)[0]
+        metricas.registrar_transicoes([(protocolo.dispositivo_id, False, True, timezone.now())])
+        self.assertEqual(self.contadores()[('tipo', 'sensor:online')], 1)
+        self.assertNotIn(('tipo', 'sensor:offline'), self.contadores())
+
+
+class SlaTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+
+    def test_transicoes_registradas_com_autor(self):
+        protocolo = criar_protocolos(1)[0]
+        self.assertFalse(protocolo.transicoes.exists())
+        protocolo.autor = self.usuario
+        protocolo.status = 'em_andamento'
+        protocolo.save()
+        protocolo.descricao = "sem mudança de status"
+        protocolo.save()
+        protocolo.status = 'concluido'
+        protocolo.save()
+        transicoes = list(protocolo.transicoes.values_list('status_anterior', 'status_novo', 'autor'))
+        self.assertEqual(transicoes, [
+            ('aberto', 'em_andamento', self.usuario.pk),
+            ('em_andamento', 'concluido', self.usuario.pk),
+        ])
+        with self.assertRaises(ValueError):
+            protocolo.transicoes.first().save()
+
+    def test_marcos_de_sla(self):
+        protocolo = criar_protocolos(1)[0]
+        protocolo.refresh_from_db()
+        self.assertIsNone(protocolo.primeira_resposta_em)  # atualizações sem técnico
+        AtualizacaoProtocolo.objects.create(protocolo=protocolo, texto="visita", tecnico=self.usuario)
+        protocolo.refresh_from_db()
+        primeira_resposta = protocolo.primeira_resposta_em
+        self.assertIsNotNone(primeira_resposta)
+        protocolo.status = 'concluido'
+        protocolo.save()
+        self.assertIsNotNone(protocolo.concluido_em)
+        self.assertEqual(protocolo.primeira_resposta_em, primeira_resposta)
+        protocolo.status = 'em_andamento'
+        protocolo.save()
+        self.assertIsNone(protocolo.concluido_em)
+
+    def test_percentis_por_cliente(self):
+        from datetime import timedelta
+        from . import sla
+        protocolo = criar_protocolos(1)[0]
+        inicio = protocolo.criado_em
+        for minutos in range(1, 11):
+            Protocolo.objects.create(
+                cliente=protocolo.cliente, dispositivo=protocolo.dispositivo, descricao="x",
+                status='concluido', criado_em=inicio, concluido_em=inicio + timedelta(minutes=minutos),
+            )
+        with self.assertNumQueries(3):
+            linhas = sla.relatorio('cliente', 'resolucao')
+        self.assertEqual(len(linhas), 1)
+        linha = linhas[0]
+        self.assertEqual(linha['quantidade'], 10)
+        self.assertEqual(linha['media'], 330.0)
+        self.assertEqual((linha['p50'], linha['p90'], linha['p95']), (300.0, 540.0, 600.0))
+
+    def test_relatorio_json(self):
+        criar_protocolos(1, tecnico=self.usuario)
+        self.client.force_login(self.usuario)
+        resposta = self.client.get(reverse('relatorio_sla'), {'grupo': 'tecnico', 'medida': 'primeira_resposta'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['resultados'][0]['nome'], 'admin')
+        resposta = self.client.get(reverse('relatorio_sla'), {'grupo': 'outro'})
+        self.assertEqual(resposta.status_code, 400)
+
+
+class AutocompletarTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.usuario = User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+        self.client.force_login(self.usuario)
+        self.cliente = Cliente.objects.create(nome="Padaria Central", email="contato@padaria.com", telefone="0")
+        self.outro = Cliente.objects.create(nome="Mercado", email="mercado@exemplo.com", telefone="0")
+        self.sensor = Dispositivo.objects.create(cliente=self.cliente, nome="Sensor porta", tipo="sensor",
+                                                 mac_address="AA:BB:CC:00:00:01", localizacao="loja")
+        self.camera = Dispositivo.objects.create(cliente=self.outro, nome="Sensor caixa", tipo="camera",
+                                                 mac_address="AA:BB:CC:00:00:02", localizacao="loja")
+        Protocolo.objects.create(cliente=self.cliente, dispositivo=self.sensor, descricao="x", buic="BX-991")
+
+    def ids(self, nome_url, **params):
+        resposta = self.client.get(reverse(nome_url), params)
+        self.assertEqual(resposta.status_code, 200)
+        return [item['id'] for item in resposta.json()['resultados']]
+
+    def test_clientes_por_prefixo_de_nome_ou_email(self):
+        self.assertEqual(self.ids('autocompletar_clientes', q='pada'), [self.cliente.pk])
+        self.assertEqual(self.ids('autocompletar_clientes', q='MERCADO@'), [self.outro.pk])
+        self.assertEqual(self.ids('autocompletar_clientes', q='central'), [])
+
+    def test_dispositivos_do_cliente_por_nome_mac_ou_buic(self):
+        self.assertEqual(self.ids('autocompletar_dispositivos', cliente=self.cliente.pk), [self.sensor.pk])
+        self.assertEqual(self.ids('autocompletar_dispositivos', q='sensor'), [self.camera.pk, self.sensor.pk])
+        self.assertEqual(self.ids('autocompletar_dispositivos', q='aabbcc000002'), [self.camera.pk])
+        self.assertEqual(self.ids('autocompletar_dispositivos', q='bx-9'), [self.sensor.pk])
+        self.assertEqual(self.ids('autocompletar_dispositivos', q='sensor', cliente=self.outro.pk), [self.camera.pk])
+        self.assertEqual(self.ids('autocompletar_dispositivos'), [])
+
+    def test_respostas_em_cache(self):
+        self.ids('autocompletar_clientes', q='pa')
+        with self.assertNumQueries(2):  # apenas sessão e usuário
+            self.assertEqual(self.ids('autocompletar_clientes', q='pa'), [self.cliente.pk])
+
+    def test_dispositivo_precisa_ser_do_cliente(self):
+        from .forms import ProtocoloForm
+        form = ProtocoloForm(data={'cliente': self.cliente.pk, 'dispositivo': self.camera.pk,
+                                   'descricao': 'x', 'status': 'aberto'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('dispositivo', form.errors)
+        form = ProtocoloForm(data={'cliente': self.outro.pk, 'dispositivo': self.camera.pk,
+                                   'descricao': 'x', 'status': 'aberto'})
+        self.assertTrue(form.is_valid())
+
+    def test_autocompletar_do_admin(self):
+        resposta = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'suporte_app', 'model_name': 'protocolo', 'field_name': 'dispositivo', 'term': 'aa:bb:cc:00:00:01',
+        })
+        self.assertEqual([item['id'] for item in resposta.json()['results']], [str(self.sensor.pk)])
+        resposta = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'suporte_app', 'model_name': 'protocolo', 'field_name': 'cliente', 'term': 'merc',
+        })
+        self.assertEqual([item['id'] for item in resposta.json()['results']], [str(self.outro.pk)])
+
+    def test_gerar_protocolo_nao_lista_a_frota(self):
+        resposta = self.client.get(reverse('gerar_protocolo'))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotContains(resposta, 'Sensor caixa')
+        self.assertContains(resposta, 'data-autocompletar')
+
+
+@override_settings(INSTRUMENTACAO_AMOSTRAGEM=1.0, INSTRUMENTACAO_MAXIMO_CONSULTAS=10)
+class InstrumentacaoTests(TestCase):
+
+    def setUp(self):
+        from .instrumentacao import histogramas
+        histogramas.limpar()
+        self.usuario = User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+        self.client.force_login(self.usuario)
+
+    def test_assinatura_agrupa_parametros(self):
+        from .instrumentacao import assinatura_sql
+        self.assertEqual(
+            assinatura_sql("SELECT * FROM t WHERE id = 10 AND nome = 'a''b'"),
+            assinatura_sql("SELECT *  FROM t WHERE id = 7 AND nome = 'x'"),
+        )
+        self.assertEqual(assinatura_sql("SELECT 1 FROM t WHERE id IN (%s, %s, %s)"),
+                         "SELECT ? FROM t WHERE id IN (...)")
+
+    def test_server_timing_e_log_json(self):
+        import json
+        criar_protocolos(3, tecnico=self.usuario)
+        with self.assertLogs('suporte_app.instrumentacao', level='INFO') as logs:
+            resposta = self.client.get(reverse('api_protocolos'))
+        self.assertIn('db;dur=', resposta['Server-Timing'])
+        registro = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(registro['rota'], 'api_protocolos')
+        self.assertEqual(registro['evento'], 'requisicao')
+        self.assertGreater(registro['consultas'], 0)
+
+    def test_consultas_repetidas_viram_aviso(self):
+        import json
+        criar_protocolos(12)
+        url = reverse('admin:suporte_app_protocolo_changelist')
+        with self.settings(INSTRUMENTACAO_MAXIMO_CONSULTAS=1):
+            with self.assertLogs('suporte_app.instrumentacao', level='WARNING') as logs:
+                self.client.get(url)
+        registro = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(registro['evento'], 'requisicao_lenta')
+
+    def test_metricas_prometheus(self):
+        self.client.get(reverse('api_clientes'))
+        resposta = self.client.get(reverse('metricas_prometheus'))
+        self.assertContains(resposta, 'suporte_requisicao_segundos_count{rota="api_clientes"} 1')
+        self.assertContains(resposta, 'suporte_requisicao_consultas_total{rota="api_clientes"}')
+        with self.settings(INSTRUMENTACAO_METRICAS_TOKEN='segredo'):
+            self.assertEqual(self.client.get(reverse('metricas_prometheus')).status_code, 403)
+            resposta = self.client.get(reverse('metricas_prometheus'), HTTP_AUTHORIZATION='Bearer segredo')
+            self.assertEqual(resposta.status_code, 200)
+
+    def test_orcamento_de_consultas(self):
+        from .instrumentacao import orcamento_consultas
+        protocolos = criar_protocolos(3)
+        with orcamento_consultas(4):
+            self.client.get(reverse('api_protocolos'), {'fields': 'id,cliente.nome,dispositivo.nome'})
+        with self.assertRaisesMessage(AssertionError, "Consultas repetidas"):
+            with orcamento_consultas(2):
+                for protocolo in Protocolo.objects.filter(pk__in=[p.pk for p in protocolos]):
+                    protocolo.cliente.nome
+
+
+class BenchmarkTests(TestCase):
+
+    def test_dados_sinteticos_reprodutiveis(self):
+        from .models import Metrica
+        call_command('gerar_dados_sinteticos', clientes=3, dispositivos_por_cliente=2, protocolos=20,
+                     atualizacoes_por_protocolo=2, tecnicos=2, lote=7, stdout=StringIO())
+        self.assertEqual(Cliente.objects.count(), 3)
+        self.assertEqual(Dispositivo.objects.count(), 6)
+        self.assertEqual(Protocolo.objects.count(), 20)
+        self.assertEqual(AtualizacaoProtocolo.objects.count(), 40)
+        self.assertEqual(Metrica.objects.filter(dimensao='status').aggregate(total=Sum('valor'))['total'], 20)
+        self.assertFalse(Protocolo.objects.filter(dispositivo__cliente__isnull=False)
+                         .exclude(cliente=F('dispositivo__cliente')).exists())
+        self.assertFalse(Protocolo.objects.filter(status='concluido', concluido_em__isnull=True).exists())
+        descricoes = list(Protocolo.objects.order_by('pk').values_list('descricao', flat=True))
+        # Uma segunda execução com a mesma semente continua a numeração e repete os dados
+        call_command('gerar_dados_sinteticos', clientes=3, dispositivos_por_cliente=2, protocolos=20,
+                     atualizacoes_por_protocolo=2, tecnicos=2, lote=7, stdout=StringIO())
+        self.assertEqual(Dispositivo.objects.count(), 12)
+        self.assertEqual(list(Protocolo.objects.order_by('pk').values_list('descricao', flat=True))[20:],
+                         descricoes)
+
+    def test_benchmark_e_comparacao(self):
+        from . import benchmark
+        call_command('gerar_dados_sinteticos', clientes=2, dispositivos_por_cliente=2, protocolos=5,
+                     stdout=StringIO())
+        relatorio = benchmark.executar(iteracoes=2, nomes=['api_protocolos', 'gerar_protocolo_post'])
+        self.assertEqual(set(relatorio['cenarios']), {'api_protocolos', 'gerar_protocolo_post'})
+        self.assertEqual(relatorio['cenarios']['gerar_protocolo_post']['status'], [302])
+        self.assertEqual(Protocolo.objects.count(), 5)  # POSTs desfeitos
+        self.assertEqual(benchmark.comparar(relatorio, relatorio), [])
+        pior = json.loads(json.dumps(relatorio))
+        pior['cenarios']['api_protocolos']['consultas'] += 1
+        pior['cenarios']['api_protocolos']['p95_ms'] += 100
+        self.assertEqual(len(benchmark.comparar(pior, relatorio)), 2)
+
+    def test_percentil_posto_mais_proximo(self):
+        from .benchmark import percentil
+        valores = list(range(1, 101))
+        self.assertEqual([percentil(valores, p) for p in (50, 95, 99)], [50, 95, 99])
+        self.assertEqual(percentil([7], 99), 7)
+
+
+class ProtocoloDetalheTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+        self.client.force_login(self.usuario)
+        self.protocolo = criar_protocolos(1, tecnico=self.usuario)[0]
+        self.url = reverse('protocolo_detalhe', args=[self.protocolo.pk])
+
+    def adicionar_atualizacoes(self, quantidade):
+        AtualizacaoProtocolo.objects.bulk_create([
+            AtualizacaoProtocolo(protocolo=self.protocolo, texto=f"atualização {n}", tecnico=self.usuario)
+            for n in range(quantidade)
+        ])
+
+    def test_consultas_nao_dependem_das_atualizacoes(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as poucas:
+            self.client.get(self.url)
+        self.adicionar_atualizacoes(60)
+        with CaptureQueriesContext(connection) as muitas:
+            resposta = self.client.get(self.url)
+        self.assertEqual(len(poucas), len(muitas))
+        self.assertEqual(len(resposta.context['atualizacoes']), 20)
+        self.assertIsNotNone(resposta.context['proximo_cursor'])
+
+    def test_linha_do_tempo_paginada_por_cursor(self):
+        self.adicionar_atualizacoes(45)
+        url = reverse('protocolo_atualizacoes', args=[self.protocolo.pk])
+        vistos = []
+        cursor = None
+        while True:
+            dados = self.client.get(url, {'cursor': cursor, 'limite': 10} if cursor else {'limite': 10}).json()
+            vistos += [item['id'] for item in dados['resultados']]
+            cursor = dados['next_cursor']
+            if not cursor:
+                break
+        esperados = list(self.protocolo.atualizacoes.order_by('-data_atualizacao', '-pk').values_list('pk', flat=True))
+        self.assertEqual(vistos, esperados)
+        self.assertEqual(self.client.get(url, {'cursor': 'x'}).status_code, 400)
+
+    def test_get_condicional(self):
+        resposta = self.client.get(self.url)
+        etag = resposta['ETag']
+        self.assertIn('Last-Modified', resposta)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        AtualizacaoProtocolo.objects.create(protocolo=self.protocolo, texto="nova", tecnico=self.usuario)
+        resposta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotEqual(resposta['ETag'], etag)
+        self.protocolo.status = 'concluido'
+        self.protocolo.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=resposta['ETag']).status_code, 200)
+
+    def test_protocolo_inexistente(self):
+        self.assertEqual(self.client.get(reverse('protocolo_detalhe', args=[999999])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('protocolo_atualizacoes', args=[999999])).status_code, 404)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class TempoRealTests(TestCase):
+
+    def setUp(self):
+        from django.core.signals import request_finished, request_started
+        from django.db import close_old_connections
+        # Como no cliente de testes do Django: a requisição ASGI não fecha a conexão da transação do teste
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        self.addCleanup(request_started.connect, close_old_connections)
+        self.addCleanup(request_finished.connect, close_old_connections)
+        self.usuario = User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+        self.client.force_login(self.usuario)
+        self.cookie = (b'cookie', f"sessionid={self.client.cookies['sessionid'].value}".encode())
+
+    def conexao(self, query=''):
+        from django.core.handlers.asgi import ASGIHandler
+        from .tempo_real import ConexaoAsgi
+        return ConexaoAsgi(ASGIHandler(), reverse('eventos_protocolos'), query, cabecalhos=[self.cookie]).abrir()
+
+    def test_eventos_filtrados_por_protocolo_e_tecnico(self):
+        from asgiref.sync import async_to_sync, sync_to_async
+        primeiro, segundo = criar_protocolos(2)
+
+        async def cenario():
+            do_primeiro = self.conexao(f'protocolo={primeiro.pk}')
+            meus = self.conexao('tecnico=eu')
+            await do_primeiro.aguardar('retry:')
+            await meus.aguardar('retry:')
+
+            @sync_to_async
+            def alterar():
+                with self.captureOnCommitCallbacks(execute=True):
+                    segundo.tecnico_responsavel = self.usuario
+                    segundo.status = 'em_andamento'
+                    segundo.save()
+                with self.captureOnCommitCallbacks(execute=True):
+                    AtualizacaoProtocolo.objects.create(protocolo=primeiro, texto="chegou", tecnico=self.usuario)
+
+            await alterar()
+            await do_primeiro.aguardar('atualizacao_criada')
+            await meus.aguardar('status_alterado')
+            await do_primeiro.fechar()
+            await meus.fechar()
+            return do_primeiro, meus
+
+        do_primeiro, meus = async_to_sync(cenario)()
+        self.assertEqual(do_primeiro.status, 200)
+        self.assertIn(b'"texto": "chegou"', do_primeiro.corpo)
+        self.assertNotIn(b'status_alterado', do_primeiro.corpo)
+        self.assertNotIn(b'atualizacao_criada', meus.corpo)
+
+    def test_cliente_lento_perde_os_mais_antigos(self):
+        from asgiref.sync import async_to_sync
+        from .tempo_real import BarramentoMemoria, Filtro
+
+        async def cenario():
+            barramento = BarramentoMemoria()
+            assinatura = barramento.assinar(Filtro(cliente_id=7), tamanho_fila=3)
+            for numero in range(5):
+                barramento.publicar({'tipo': 'protocolo_atualizado', 'cliente_id': 7, 'numero': numero})
+            barramento.publicar({'tipo': 'protocolo_atualizado', 'cliente_id': 8})
+            await asyncio.sleep(0)
+            recebidos = [(await assinatura.proximo(timeout=0.1))['numero'] for _ in range(3)]
+            vazio = await assinatura.proximo(timeout=0.01)
+            perdidos = assinatura.descartados()
+            assinatura.fechar()
+            return recebidos, vazio, perdidos, barramento.tem_assinantes()
+
+        self.assertEqual(async_to_sync(cenario)(), ([2, 3, 4], None, 2, False))
+
+    def test_conexoes_ociosas_sem_threads(self):
+        from asgiref.sync import async_to_sync
+        from django.core.handlers.asgi import ASGIHandler
+        from .tempo_real import medir_conexoes
+        resultado = async_to_sync(medir_conexoes)(ASGIHandler(), 200, cabecalhos=[self.cookie])
+        self.assertEqual(resultado['status'], [200])
+        self.assertEqual(resultado['entregues'], 200)
+        self.assertLessEqual(resultado['threads_adicionais'], 1)
+        self.assertEqual(resultado['assinantes_apos_fechar'], 0)
+
+    def test_filtro_invalido(self):
+        resposta = self.client.get(reverse('eventos_protocolos'), {'cliente': 'abc'})
+        self.assertEqual(resposta.status_code, 400)
+
+
+class ArquivamentoTests(TestCase):
+
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        self.usuario = User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+        self.client.force_login(self.usuario)
+        self.protocolos = criar_protocolos(5, tecnico=self.usuario)
+        antigo = timezone.now() - timedelta(days=400)
+        # Três concluídos há mais de um ano, um concluído agora e um aberto
+        for protocolo in self.protocolos[:4]:
+            protocolo.status = 'concluido'
+            protocolo.save()
+        Protocolo.objects.filter(pk__in=[p.pk for p in self.protocolos[:3]]).update(concluido_em=antigo)
+        AtualizacaoProtocolo.objects.filter(protocolo=self.protocolos[0]).update(data_atualizacao=antigo)
+        self.antigos = sorted(p.pk for p in self.protocolos[:3])
+
+    def contadores(self):
+        from .models import Metrica
+        return {(m.dimensao, m.chave): m.valor for m in Metrica.objects.exclude(valor=0)}
+
+    def test_arquivar_em_lotes_e_retomar(self):
+        from . import arquivamento, metricas
+        from .models import AtualizacaoProtocoloArquivada, IndiceBuscaProtocolo, ProtocoloArquivado
+        datas = list(AtualizacaoProtocolo.objects.filter(protocolo_id__in=self.antigos)
+                     .order_by('pk').values_list('pk', 'data_atualizacao'))
+
+        self.assertEqual(arquivamento.arquivar(dias=365, tamanho_lote=2, maximo=2), 2)
+        self.assertEqual(arquivamento.arquivar(dias=365, tamanho_lote=2), 1)
+        self.assertEqual(arquivamento.arquivar(dias=365, tamanho_lote=2), 0)
+
+        self.assertEqual(sorted(ProtocoloArquivado.objects.values_list('pk', flat=True)), self.antigos)
+        self.assertFalse(Protocolo.objects.filter(pk__in=self.antigos).exists())
+        self.assertFalse(IndiceBuscaProtocolo.objects.filter(protocolo_id__in=self.antigos).exists())
+        self.assertEqual(list(AtualizacaoProtocoloArquivada.objects.order_by('pk').values_list('pk', 'data_atualizacao')),
+                         datas)
+        self.assertEqual(ProtocoloArquivado.objects.get(pk=self.antigos[0]).transicoes.count(), 1)
+        self.assertEqual(Protocolo.objects.count(), 2)
+
+        incrementais = self.contadores()
+        metricas.reconstruir()
+        self.assertEqual(incrementais, self.contadores())
+
+    def test_restaurar(self):
+        from . import arquivamento
+        from .models import ProtocoloArquivado, TransicaoStatusProtocolo
+        original = Protocolo.objects.values().get(pk=self.antigos[0])
+        datas = list(AtualizacaoProtocolo.objects.filter(protocolo_id=self.antigos[0]).values_list('data_atualizacao'))
+        arquivamento.arquivar(dias=365)
+
+        self.assertEqual(arquivamento.restaurar([self.antigos[0]]), 1)
+        self.assertEqual(Protocolo.objects.values().get(pk=self.antigos[0]), original)
+        self.assertEqual(list(AtualizacaoProtocolo.objects.filter(protocolo_id=self.antigos[0])
+                              .values_list('data_atualizacao')), datas)
+        self.assertEqual(TransicaoStatusProtocolo.objects.filter(protocolo_id=self.antigos[0]).count(), 1)
+        self.assertEqual(ProtocoloArquivado.objects.count(), 2)
+        resposta = self.client.get(reverse('buscar_protocolos'), {'q': 'primeira'})
+        self.assertContains(resposta, f"{self.antigos[0]:06d}")
+
+    def test_api_so_consulta_arquivo_quando_pedido(self):
+        from . import arquivamento
+        arquivamento.arquivar(dias=365)
+        url = reverse('api_protocolos')
+        ids = lambda resposta: [item['id'] for item in resposta.json()['resultados']]
+
+        self.assertEqual(len(ids(self.client.get(url))), 2)
+        self.assertEqual(ids(self.client.get(url, {'arquivados': 'somente'})), self.antigos[::-1])
+        todos = sorted((p.pk for p in self.protocolos), reverse=True)
+        primeira = self.client.get(url, {'arquivados': 'incluir', 'limit': 3, 'fields': 'id,cliente.nome'})
+        segunda = self.client.get(url, {'arquivados': 'incluir', 'limit': 3, 'cursor': primeira.json()['next_cursor']})
+        self.assertEqual(ids(primeira) + ids(segunda), todos)
+        self.assertIsNone(segunda.json()['next_cursor'])
+        self.assertEqual(self.client.get(url, {'arquivados': 'x'}).status_code, 400)
+
+    def test_admin_do_arquivo(self):
+        call_command('arquivar_protocolos', '--dias', '365', stdout=StringIO())
+        resposta = self.client.get(reverse('admin:suporte_app_protocoloarquivado_changelist'))
+        self.assertContains(resposta, 'Restaurar protocolos selecionados')
+        self.assertEqual(len(resposta.context['cl'].result_list), 3)
+        resposta = self.client.get(reverse('admin:suporte_app_protocoloarquivado_change', args=[self.antigos[0]]))
+        self.assertContains(resposta, 'primeira')
+        resposta = self.client.post(reverse('admin:suporte_app_protocoloarquivado_changelist'), {
+            'action': 'restaurar', '_selected_action': self.antigos,
+        })
+        self.assertEqual(resposta.status_code, 302)
+        self.assertEqual(Protocolo.objects.count(), 5)
+
+
+class FilaTarefasTests(TestCase):
+
+    def setUp(self):
+        from . import fila
+        self.falhas_restantes = 0
+        self.execucoes = []
+
+        def instavel(valor):
+            self.execucoes.append(valor)
+            if self.falhas_restantes:
+                self.falhas_restantes -= 1
+                raise ConnectionError("servidor indisponível")
+
+        fila.tarefa('teste_instavel', tentativas=3)(instavel)
+        self.addCleanup(fila._registro.pop, 'teste_instavel')
+
+    def enfileirar(self, valor=1, chave=None):
+        from . import fila
+        with self.captureOnCommitCallbacks(execute=True):
+            fila.enfileirar('teste_instavel', {'valor': valor}, chave=chave)
+
+    def test_enfileira_no_commit_e_ignora_chave_pendente(self):
+        from . import busca, fila
+        from .models import Tarefa
+        protocolo = criar_protocolos(1)[0]
+        cliente = protocolo.cliente
+        with self.captureOnCommitCallbacks() as callbacks:
+            cliente.nome = "Fazenda Esperança"
+            cliente.save()
+        self.assertFalse(Tarefa.objects.exists())
+        for callback in callbacks:
+            callback()
+        with self.captureOnCommitCallbacks(execute=True):
+            cliente.save()
+        self.assertEqual(Tarefa.objects.get().chave, f'reindexar:cliente:{cliente.pk}')
+
+        self.assertEqual(fila.processar(uma_vez=True), {'concluidas': 1, 'falhas': 0})
+        self.assertEqual(Tarefa.objects.get().status, 'concluida')
+        self.assertEqual(list(busca.filtrar(Protocolo.objects.all(), "esperanca")), [protocolo])
+        # Concluída a anterior, a mesma chave volta a ser aceita
+        with self.captureOnCommitCallbacks(execute=True):
+            cliente.save()
+        self.assertEqual(Tarefa.objects.filter(status='pendente').count(), 1)
+
+    def test_novas_tentativas_com_espera(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from . import fila
+        from .models import Tarefa
+        self.falhas_restantes = 1
+        self.enfileirar(7)
+        with self.assertLogs('suporte_app.fila', 'WARNING'):
+            self.assertEqual(fila.processar(uma_vez=True), {'concluidas': 0, 'falhas': 1})
+        tarefa = Tarefa.objects.get()
+        self.assertEqual((tarefa.status, tarefa.tentativas), ('pendente', 1))
+        self.assertIn('servidor indisponível', tarefa.erro)
+        self.assertGreater(tarefa.executar_em, timezone.now() + timedelta(seconds=5))
+        # Ainda não venceu: nada a fazer
+        self.assertEqual(fila.processar(uma_vez=True), {'concluidas': 0, 'falhas': 0})
+
+        Tarefa.objects.update(executar_em=timezone.now())
+        self.assertEqual(fila.processar(uma_vez=True), {'concluidas': 1, 'falhas': 0})
+        self.assertEqual(Tarefa.objects.get().status, 'concluida')
+        self.assertEqual(self.execucoes, [7, 7])
+
+    def test_falha_definitiva_e_tarefa_desconhecida(self):
+        from . import fila
+        from .models import Tarefa
+        self.falhas_restantes = 10
+        self.enfileirar()
+        with self.settings(TAREFAS_ESPERA_BASE_SEGUNDOS=0):
+            with self.assertLogs('suporte_app.fila', 'WARNING'):
+                fila.processar(uma_vez=True)
+        self.assertEqual(self.execucoes, [1, 1, 1])
+        Tarefa.objects.create(nome='inexistente')
+        with self.assertLogs('suporte_app.fila', 'ERROR'):
+            fila.processar(uma_vez=True)
+        self.assertEqual(sorted(Tarefa.objects.values_list('status', 'tentativas')), [('falhou', 1), ('falhou', 3)])
+
+    def test_reserva_exclusiva_e_recuperacao(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from . import fila
+        from .models import Tarefa
+        self.enfileirar(1)
+        self.enfileirar(2)
+        primeira = fila.reservar('a', 1)
+        segunda = fila.reservar('b', 5)
+        self.assertEqual([t.argumentos['valor'] for t in primeira + segunda], [1, 2])
+        self.assertEqual(fila.reservar('c', 5), [])
+
+        Tarefa.objects.filter(pk=primeira[0].pk).update(iniciada_em=timezone.now() - timedelta(hours=1))
+        with self.settings(TAREFAS_ESPERA_BASE_SEGUNDOS=0):
+            with self.assertLogs('suporte_app.fila', 'WARNING'):
+                self.assertEqual(fila.recuperar_interrompidas(), 1)
+        self.assertEqual([t.pk for t in fila.reservar('c', 5)], [primeira[0].pk])
+
+    @override_settings(TAREFAS_IMEDIATAS=True, NOTIFICAR_CLIENTES=True)
+    def test_modo_imediato_e_notificacao_ao_cliente(self):
+        from django.core import mail
+        from .models import Tarefa
+        with self.captureOnCommitCallbacks(execute=True):
+            protocolo = criar_protocolos(1)[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            protocolo.status = 'concluido'
+            protocolo.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            protocolo.descricao = "outra"
+            protocolo.save()
+        self.assertFalse(Tarefa.objects.exists())
+        self.assertEqual([m.subject for m in mail.outbox],
+                         [f"Protocolo {protocolo.numero_protocolo} aberto",
+                          f"Protocolo {protocolo.numero_protocolo} concluído"])
+        self.assertEqual(mail.outbox[0].to, [protocolo.cliente.email])
+
+    def test_salvar_protocolo_nao_executa_a_reindexacao(self):
+        protocolo = criar_protocolos(1)[0]
+        for quantidade in (1, 30):
+            Protocolo.objects.bulk_create([
+                Protocolo(cliente=protocolo.cliente, dispositivo=protocolo.dispositivo, descricao="x")
+                for _ in range(quantidade)
+            ])
+            protocolo.cliente.nome = f"Nome {quantidade}"
+            with CaptureQueriesContext(connection) as contexto, self.captureOnCommitCallbacks(execute=True):
+                protocolo.cliente.save()
+            self.assertLessEqual(len(contexto.captured_queries), 3)
+
+    def test_reexecutar_exige_permissao_de_alteracao(self):
+        from django.contrib.auth.models import Permission
+        from .models import Tarefa
+        tarefa = Tarefa.objects.create(nome='teste_instavel', status='falhou', tentativas=3)
+        usuario = User.objects.create_user('operador', 'operador@exemplo.com', 'senha', is_staff=True)
+        usuario.user_permissions.add(Permission.objects.get(codename='view_tarefa'))
+        self.client.force_login(usuario)
+        url = reverse('admin:suporte_app_tarefa_changelist')
+        self.assertNotContains(self.client.get(url), 'value="reexecutar"')
+        self.client.post(url, {'action': 'reexecutar', '_selected_action': [tarefa.pk]})
+        self.assertEqual(Tarefa.objects.get().status, 'falhou')
+
+        usuario.user_permissions.add(Permission.objects.get(codename='change_tarefa'))
+        self.client.post(url, {'action': 'reexecutar', '_selected_action': [tarefa.pk]})
+        self.assertEqual(Tarefa.objects.get().status, 'pendente')
+
+
+class RoteamentoBancoTests(SimpleTestCase):
+
+    def setUp(self):
+        from .roteamento import RoteadorReplica
+        self.roteador = RoteadorReplica()
+
+    def test_so_leituras_permitidas_vao_para_a_replica(self):
+        from .roteamento import ler_da_replica
+        self.assertEqual(self.roteador.db_for_read(Protocolo), 'default')
+        with ler_da_replica(False):
+            self.assertEqual(self.roteador.db_for_read(Protocolo), 'default')
+        with ler_da_replica():
+            self.assertEqual(self.roteador.db_for_read(Protocolo), 'replica')
+            # Depois de uma escrita, o resto da requisição lê do primário
+            self.assertEqual(self.roteador.db_for_write(Protocolo, instance=Protocolo()), 'default')
+            self.assertEqual(self.roteador.db_for_read(Protocolo), 'default')
+        self.assertFalse(self.roteador.allow_migrate('replica', 'suporte_app'))
+        self.assertTrue(self.roteador.allow_migrate('default', 'suporte_app'))
+
+    def test_middleware_fixa_no_primario_apos_escrita(self):
+        from unittest import mock
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from . import roteamento
+        decisoes = []
+
+        def view(request):
+            decisoes.append(self.roteador.db_for_read(Protocolo))
+            if request.GET.get('grava'):
+                self.roteador.db_for_write(Protocolo)
+            return HttpResponse()
+
+        with mock.patch.object(roteamento, 'replica_configurada', return_value=True):
+            middleware = roteamento.RoteamentoBancoMiddleware(view)
+        fabrica = RequestFactory()
+        self.assertNotIn(roteamento.COOKIE, middleware(fabrica.get('/')).cookies)
+        resposta = middleware(fabrica.post('/'))
+        self.assertEqual(resposta.cookies[roteamento.COOKIE]['max-age'], 10)
+        self.assertIn(roteamento.COOKIE, middleware(fabrica.get('/', {'grava': 1})).cookies)
+        requisicao = fabrica.get('/')
+        requisicao.COOKIES[roteamento.COOKIE] = '1'
+        middleware(requisicao)
+        self.assertEqual(decisoes, ['replica', 'default', 'replica', 'default'])
+
+    def test_sem_replica_o_middleware_sai_da_cadeia(self):
+        from django.core.exceptions import MiddlewareNotUsed
+        from .roteamento import RoteamentoBancoMiddleware
+        if 'replica' not in connections:
+            with self.assertRaises(MiddlewareNotUsed):
+                RoteamentoBancoMiddleware(lambda request: None)
+
+
+@skipUnless('replica' in settings.DATABASES, "DATABASE_REPLICA_URL não configurada")
+class ReplicaLeituraTests(TransactionTestCase):
+    """
+    Com DATABASE_REPLICA_URL (nos testes, um espelho do banco de testes do
+    primário), verifica em qual conexão cada requisição realmente consulta.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+        self.client.force_login(self.usuario)
+        self.protocolo = criar_protocolos(1, tecnico=self.usuario)[0]
+
+    def consultas(self, metodo, url, dados=None):
+        with CaptureQueriesContext(connections['default']) as primario, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            resposta = getattr(self.client, metodo)(url, dados or {})
+        self.assertLess(resposta.status_code, 400)
+        return len(primario.captured_queries), len(replica.captured_queries)
+
+    def test_leitura_na_replica_e_leitura_apos_escrita_no_primario(self):
+        url_api = reverse('api_protocolos')
+        self.assertEqual(self.consultas('get', url_api)[0], 0)
+        self.assertEqual(self.consultas('get', reverse('admin:suporte_app_protocolo_changelist'))[0], 0)
+
+        url = reverse('admin:suporte_app_protocolo_change', args=[self.protocolo.pk])
+        formulario = self.client.get(url).context['adminform'].form
+        dados = {**formulario.initial, 'cliente': self.protocolo.cliente_id, 'status': 'em_andamento',
+                 'dispositivo': self.protocolo.dispositivo_id, 'descricao': 'alterado',
+                 'atualizacoes-TOTAL_FORMS': 0, 'atualizacoes-INITIAL_FORMS': 0,
+                 'transicoes-TOTAL_FORMS': 0, 'transicoes-INITIAL_FORMS': 0}
+        dados = {chave: valor for chave, valor in dados.items() if valor is not None}
+        self.assertEqual(self.consultas('post', url, dados)[1], 0)
+        self.assertEqual(Protocolo.objects.get().descricao, 'alterado')
+        # Logo após a escrita, o mesmo navegador lê do primário
+        primario, replica = self.consultas('get', url_api)
+        self.assertGreater(primario, 0)
+        self.assertEqual(replica, 0)
+
+
+class TriagemTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+        self.tecnico = User.objects.create_user('tecnico', 'tecnico@exemplo.com', 'senha', is_staff=True)
+        self.client.force_login(self.usuario)
+        self.protocolos = criar_protocolos(4, tecnico=self.usuario)
+
+    def contadores(self):
+        from .models import Metrica
+        return {(m.dimensao, m.chave): m.valor for m in Metrica.objects.exclude(valor=0)}
+
+    def test_alterar_status_registra_transicoes_historico_e_metricas(self):
+        from django.contrib.admin.models import LogEntry
+        from . import metricas, triagem
+        from .models import TransicaoStatusProtocolo
+        self.protocolos[0].status = 'em_andamento'
+        self.protocolos[0].save()
+
+        total = triagem.alterar_status(Protocolo.objects.all(), 'concluido', self.tecnico)
+        self.assertEqual(total, 4)
+        self.assertEqual(triagem.alterar_status(Protocolo.objects.all(), 'concluido', self.tecnico), 0)
+        self.assertFalse(Protocolo.objects.exclude(status='concluido').exists())
+        self.assertFalse(Protocolo.objects.filter(concluido_em__isnull=True).exists())
+        self.assertFalse(Protocolo.objects.filter(primeira_resposta_em__isnull=True).exists())
+        transicoes = TransicaoStatusProtocolo.objects.filter(autor=self.tecnico, status_novo='concluido')
+        self.assertEqual(sorted(transicoes.values_list('status_anterior', flat=True)),
+                         ['aberto', 'aberto', 'aberto', 'em_andamento'])
+        entrada = LogEntry.objects.filter(user=self.tecnico, object_id=str(self.protocolos[0].pk)).get()
+        self.assertEqual(json.loads(entrada.change_message), [{'changed': {'fields': ['Status']}}])
+
+        incrementais = self.contadores()
+        metricas.reconstruir()
+        self.assertEqual(incrementais, self.contadores())
+
+    def test_reatribuir_e_adicionar_atualizacao(self):
+        from . import busca, metricas, triagem
+        selecionados = Protocolo.objects.filter(pk__in=[p.pk for p in self.protocolos[:3]])
+        self.assertEqual(triagem.reatribuir(selecionados, self.tecnico, self.usuario), 3)
+        self.assertEqual(Protocolo.objects.filter(tecnico_responsavel=self.tecnico).count(), 3)
+        incrementais = self.contadores()
+        metricas.reconstruir()
+        self.assertEqual(incrementais, self.contadores())
+
+        with override_settings(TAREFAS_IMEDIATAS=True), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(triagem.adicionar_atualizacao(selecionados, "firmware corrigido", self.tecnico), 3)
+        self.assertEqual(AtualizacaoProtocolo.objects.filter(texto="firmware corrigido",
+                                                             tecnico=self.tecnico).count(), 3)
+        encontrados = busca.filtrar(Protocolo.objects.all(), 'firmware')
+        self.assertEqual(sorted(encontrados.values_list('pk', flat=True)), sorted(p.pk for p in self.protocolos[:3]))
+
+    def test_acao_do_admin_em_todos_os_filtrados(self):
+        url = reverse('admin:suporte_app_protocolo_changelist')
+        consultas = []
+        # A primeira rodada cria os contadores e preenche caches (ex.: ContentType)
+        for quantidade in (1, 2, 20):
+            cliente = Cliente.objects.create(nome=f"Lote {quantidade}", email=f"lote{quantidade}@exemplo.com",
+                                             telefone="0")
+            dispositivo = Dispositivo.objects.create(cliente=cliente, nome="disp", tipo="sensor",
+                                                     mac_address=f"lote-{quantidade}", localizacao="sala")
+            for status in ['aberto'] * quantidade + ['concluido']:
+                Protocolo.objects.create(cliente=cliente, dispositivo=dispositivo, descricao="x", status=status,
+                                         tecnico_responsavel=self.usuario)
+            selecionados = Protocolo.objects.filter(cliente=cliente)
+            dados = {'action': 'alterar_status', 'select_across': '1', 'index': '0', 'status': 'em_andamento',
+                     '_selected_action': [selecionados.first().pk]}
+            with CaptureQueriesContext(connection) as contexto:
+                resposta = self.client.post(f"{url}?cliente__id__exact={cliente.pk}&status__exact=aberto", dados)
+            self.assertEqual(resposta.status_code, 302)
+            self.assertEqual(selecionados.filter(status='em_andamento').count(), quantidade)
+            self.assertEqual(selecionados.filter(status='concluido').count(), 1)
+            consultas.append(len(contexto.captured_queries))
+        self.assertEqual(consultas[1], consultas[2])
+
+        # Sem o valor da ação nada é alterado
+        resposta = self.client.post(url, {'action': 'reatribuir', 'index': '0', 'tecnico': '',
+                                          '_selected_action': [Protocolo.objects.first().pk]}, follow=True)
+        self.assertContains(resposta, "Escolha o técnico.")
+        self.assertFalse(Protocolo.objects.filter(tecnico_responsavel=self.tecnico).exists())
+
+    def test_api_de_triagem(self):
+        url = reverse('api_triagem_protocolos')
+        enviar = lambda dados: self.client.post(url, json.dumps(dados), content_type='application/json')
+
+        resposta = enviar({'acao': 'tecnico', 'tecnico': self.tecnico.pk, 'filtros': {'status': 'aberto'}})
+        self.assertEqual(resposta.json(), {'alterados': 4})
+        resposta = enviar({'acao': 'status', 'status': 'em_andamento', 'ids': [self.protocolos[0].pk]})
+        self.assertEqual(resposta.json(), {'alterados': 1})
+        self.assertEqual(Protocolo.objects.get(pk=self.protocolos[0].pk).status, 'em_andamento')
+        resposta = enviar({'acao': 'tecnico', 'tecnico': None, 'ids': [self.protocolos[1].pk]})
+        self.assertEqual(resposta.json(), {'alterados': 1})
+        self.assertIsNone(Protocolo.objects.get(pk=self.protocolos[1].pk).tecnico_responsavel_id)
+
+        for dados in ({'acao': 'status', 'status': 'x', 'ids': [1]}, {'acao': 'status', 'status': 'aberto'},
+                      {'acao': 'atualizacao', 'texto': 'x', 'filtros': {'desconhecido': 1}}, {'acao': 'x'}):
+            self.assertEqual(enviar(dados).status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.client.force_login(self.tecnico)
+        self.assertEqual(enviar({'acao': 'status', 'status': 'aberto', 'ids': [1]}).status_code, 403)
+
+
+class ExportacaoTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+        self.client.force_login(self.usuario)
+        self.protocolos = criar_protocolos(5, tecnico=self.usuario)
+        self.protocolos[0].status = 'concluido'
+        self.protocolos[0].save()
+
+    def ler_csv(self, conteudo):
+        import csv
+        return list(csv.reader(StringIO(conteudo.lstrip('\ufeff'))))
+
+    def test_csv_do_admin_com_filtros_em_stream(self):
+        url = reverse('admin:suporte_app_protocolo_exportar', args=['csv'])
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self.client.get(url, {'status__exact': 'aberto'})
+            conteudo = b''.join(resposta.streaming_content).decode()
+        self.assertTrue(resposta.streaming)
+        self.assertIn('attachment;', resposta['Content-Disposition'])
+        linhas = self.ler_csv(conteudo)
+        self.assertEqual(linhas[0][0], 'Protocolo')
+        self.assertEqual([linha[0] for linha in linhas[1:]], [p.numero_protocolo for p in self.protocolos[1:]])
+        self.assertEqual(linhas[1][5], self.protocolos[1].cliente.nome)
+        self.assertEqual(linhas[1][12], '2')
+        self.assertEqual([linha.split(': ', 1)[1] for linha in linhas[1][13].split('\n')], ['primeira', 'segunda'])
+        # Sem COUNT(*) da lista; protocolos e atualizações em uma consulta cada por lote
+        self.assertFalse([q for q in contexto.captured_queries if 'COUNT(' in q['sql']])
+
+        resposta = self.client.get(reverse('admin:suporte_app_protocolo_changelist'), {'status__exact': 'aberto'})
+        self.assertContains(resposta, f"{url}?status__exact=aberto")
+
+    def test_consultas_por_lote(self):
+        from . import exportacao
+        # Uma leitura dos protocolos (em blocos) e uma consulta de atualizações por lote
+        for tamanho_lote, esperadas in ((2, 4), (10, 2)):
+            with CaptureQueriesContext(connection) as contexto:
+                linhas = list(exportacao.linhas(Protocolo.objects.all(), tamanho_lote=tamanho_lote))
+            self.assertEqual(len(linhas), 6)
+            self.assertEqual(len(contexto.captured_queries), esperadas)
+
+    def test_xlsx_e_comando(self):
+        import os
+        import tempfile
+        import zipfile
+        from io import BytesIO
+        from xml.etree import ElementTree
+        resposta = self.client.get(reverse('admin:suporte_app_protocolo_exportar', args=['xlsx']))
+        with zipfile.ZipFile(BytesIO(b''.join(resposta.streaming_content))) as arquivo:
+            planilha = ElementTree.fromstring(arquivo.read('xl/worksheets/sheet1.xml'))
+        self.assertEqual(len(planilha.findall('.//{*}row')), 6)
+        self.assertEqual(self.client.get(reverse('admin:suporte_app_protocolo_exportar', args=['pdf'])).status_code, 404)
+
+        saida = StringIO()
+        call_command('exportar_protocolos', '--status', 'concluido', stdout=saida)
+        linhas = self.ler_csv(saida.getvalue())
+        self.assertEqual([linha[0] for linha in linhas[1:]], [self.protocolos[0].numero_protocolo])
+        self.assertEqual(linhas[1][1], 'Concluído')
+        with tempfile.TemporaryDirectory() as diretorio:
+            caminho = os.path.join(diretorio, 'protocolos.xlsx')
+            call_command('exportar_protocolos', '--formato', 'xlsx', '--saida', caminho, stdout=StringIO())
+            self.assertTrue(zipfile.is_zipfile(caminho))
+
+
+class InventarioTests(TestCase):
+
+    def setUp(self):
+        from . import inventario
+        inventario.limpar_cache()
+        self.cliente = Cliente.objects.create(nome="Fazenda", email="fazenda@exemplo.com", telefone="0")
+        self.bomba = Dispositivo.objects.create(cliente=self.cliente, nome="Bomba", tipo="sensor",
+                                                mac_address="aa-bb-cc-dd-ee-01", localizacao="poço")
+        self.portao = Dispositivo.objects.create(cliente=self.cliente, nome="Portão", tipo="sensor",
+                                                 mac_address="AABBCCDDEE02", localizacao="entrada")
+
+    def test_mac_gravado_e_consultado_no_formato_canonico(self):
+        from django.db import IntegrityError
+        self.bomba.refresh_from_db()
+        self.assertEqual(self.bomba.mac_address, 'AA:BB:CC:DD:EE:01')
+        self.assertEqual(Dispositivo.objects.get(mac_address='aabb.ccdd.ee02'), self.portao)
+        with self.assertRaises(IntegrityError):
+            Dispositivo.objects.create(cliente=self.cliente, nome="Cópia", tipo="sensor",
+                                       mac_address="aa:bb:cc:dd:ee:01", localizacao="poço")
+
+    def test_formulario_rejeita_mac_invalido(self):
+        from django.forms import modelform_factory
+        formulario = modelform_factory(Dispositivo, fields=['cliente', 'nome', 'tipo', 'mac_address', 'localizacao'])
+        dados = {'cliente': self.cliente.pk, 'nome': 'Novo', 'tipo': 'sensor', 'localizacao': 'x'}
+        self.assertFalse(formulario(data={**dados, 'mac_address': 'aa:bb'}).is_valid())
+        form = formulario(data={**dados, 'mac_address': '00-11-22-33-44-55'})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.instance.mac_address, '00:11:22:33:44:55')
+
+    def test_localizar_por_mac_buic_ou_topico_com_cache(self):
+        from . import inventario
+        Protocolo.objects.create(cliente=self.cliente, dispositivo=self.bomba, descricao="x",
+                                 buic=" bx-1 ", topico_mqtt="fazenda/bomba")
+        self.bomba.refresh_from_db()
+        self.assertEqual((self.bomba.buic, self.bomba.topico_mqtt), ('BX-1', 'fazenda/bomba'))
+        for valor in ('aa:bb:cc:dd:ee:01', 'AABBCCDDEE01', 'bx-1', 'fazenda/bomba'):
+            self.assertEqual(inventario.localizar(valor), self.bomba.pk)
+        with self.assertNumQueries(1):
+            self.assertIsNone(inventario.localizar('desconhecido'))
+        with self.assertNumQueries(0):
+            self.assertEqual(inventario.localizar('AABBCCDDEE01'), self.bomba.pk)
+            self.assertIsNone(inventario.localizar('desconhecido'))
+
+        # Gravar um dispositivo descarta o cache
+        self.portao.buic = 'desconhecido'
+        self.portao.save()
+        self.assertEqual(inventario.localizar('desconhecido'), self.portao.pk)
+
+    def test_protocolo_transfere_buic_para_o_seu_dispositivo(self):
+        from . import inventario
+        Protocolo.objects.create(cliente=self.cliente, dispositivo=self.bomba, descricao="x", buic="BX-1")
+        self.assertEqual(inventario.localizar('BX-1'), self.bomba.pk)
+        Protocolo.objects.create(cliente=self.cliente, dispositivo=self.portao, descricao="x", buic="bx-1")
+        self.assertEqual(inventario.localizar('BX-1'), self.portao.pk)
+        self.assertEqual(list(Dispositivo.objects.filter(buic='BX-1')), [self.portao])
+        # Protocolo com o BUIC que o dispositivo já tem: só a leitura do dispositivo
+        with self.assertNumQueries(1):
+            inventario.atribuir_identificadores(self.portao.pk, 'BX-1')
+
+    def test_busca_por_mac_traz_os_protocolos_do_dispositivo(self):
+        from . import busca
+        protocolos = [
+            Protocolo.objects.create(cliente=self.cliente, dispositivo=self.bomba, descricao=f"falha {i}")
+            for i in range(2)
+        ]
+        Protocolo.objects.create(cliente=self.cliente, dispositivo=self.portao, descricao="falha")
+        encontrados = busca.filtrar(Protocolo.objects.all(), 'aabbccddee01')
+        self.assertEqual(sorted(protocolo.pk for protocolo in encontrados), [p.pk for p in protocolos])
+
+
+class CacheModelosTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        from . import cache_modelos
+        cache.clear()
+        cache_modelos.estatisticas.limpar()
+        self.usuario = User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+        self.client.force_login(self.usuario)
+        self.protocolos = criar_protocolos(3, tecnico=self.usuario)
+
+    def test_obter_guarda_ate_o_modelo_mudar(self):
+        from . import cache_modelos
+        calculos = []
+
+        def calcular():
+            calculos.append(1)
+            return list(Cliente.objects.values_list('nome', flat=True))
+
+        for _ in range(3):
+            cache_modelos.obter('nomes', (Cliente,), calcular)
+        self.assertEqual(len(calculos), 1)
+        # Gravar um dispositivo não afeta valores que só dependem de clientes
+        self.protocolos[0].dispositivo.save()
+        cache_modelos.obter('nomes', (Cliente,), calcular)
+        self.assertEqual(len(calculos), 1)
+        Cliente.objects.create(nome="Novo", email="novo@exemplo.com", telefone="0")
+        self.assertIn("Novo", cache_modelos.obter('nomes', (Cliente,), calcular))
+        self.assertEqual(len(calculos), 2)
+        self.assertEqual(cache_modelos.estatisticas.resumo()['nomes'],
+                         {'acertos': 3, 'falhas': 2, 'taxa_acerto': 0.6})
+
+    def test_filtros_do_admin_em_cache(self):
+        url = reverse('admin:suporte_app_dispositivo_changelist')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self.client.get(url)
+        self.assertFalse([q for q in contexto.captured_queries if 'DISTINCT' in q['sql']])
+        self.assertContains(resposta, self.protocolos[0].cliente.nome)
+
+        Dispositivo.objects.create(cliente=self.protocolos[0].cliente, nome="Câmera", tipo="camera",
+                                   mac_address="00:00:00:00:00:09", localizacao="sala")
+        resposta = self.client.get(url)
+        self.assertContains(resposta, '?tipo=camera')
+
+    def test_fragmento_dos_filtros_de_protocolo(self):
+        from . import cache_modelos
+        url = reverse('admin:suporte_app_protocolo_changelist')
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(cache_modelos.estatisticas.resumo()['fragmento:filtros_protocolo']['acertos'], 1)
+        Cliente.objects.create(nome="Cliente Recente", email="recente@exemplo.com", telefone="0")
+        self.assertContains(self.client.get(url), "Cliente Recente")
+        resposta = self.client.get(reverse('metricas_prometheus'))
+        self.assertContains(resposta, 'suporte_cache_taxa_acerto{nome="fragmento:filtros_protocolo"}')
+        # Cada amostra pertence a uma família declarada em # TYPE, com o mesmo nome base
+        linhas = resposta.content.decode().splitlines()
+        tipos = {linha.split()[2]: linha.split()[3] for linha in linhas if linha.startswith('# TYPE')}
+        for linha in linhas:
+            if not linha.startswith('#'):
+                nome = linha.split('{')[0].split()[0]
+                familia = nome if nome in tipos else nome.rsplit('_', 1)[0]
+                self.assertIn(familia, tipos, linha)
+                if nome != familia:
+                    self.assertEqual(tipos[familia], 'histogram', linha)
+
+    def test_dispositivos_do_cliente_acompanham_a_ingestao(self):
+        from . import autocompletar
+        from .ingestao import IndiceDispositivos, IngestorStatus
+        dispositivo = self.protocolos[0].dispositivo
+        cliente_id = dispositivo.cliente_id
+        self.assertEqual(autocompletar.dispositivos_do_cliente(cliente_id),
+                         [(dispositivo.pk, dispositivo.nome, dispositivo.mac_address, False)])
+        with self.assertNumQueries(0):
+            autocompletar.dispositivos_do_cliente(cliente_id)
+        ingestor = IngestorStatus(None, IndiceDispositivos().carregar())
+        ingestor.gravar({dispositivo.pk: (True, None)})
+        self.assertTrue(autocompletar.dispositivos_do_cliente(cliente_id)[0][3])
+
+
+class ConcorrenciaOtimistaTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+        self.outro = User.objects.create_user('outro', 'outro@exemplo.com', 'senha', is_staff=True)
+        self.client.force_login(self.usuario)
+        self.protocolo = criar_protocolos(1, tecnico=self.usuario)[0]
+        self.url = reverse('admin:suporte_app_protocolo_change', args=[self.protocolo.pk])
+
+    def dados_do_formulario(self, versao, texto_atualizacao='', **campos):
+        dados = {
+            'cliente': self.protocolo.cliente_id, 'dispositivo': self.protocolo.dispositivo_id, 'buic': '',
+            'descricao': self.protocolo.descricao, 'status': self.protocolo.status, 'versao_lida': versao,
+            'topico_mqtt': '', 'payload_exemplo': '',
+            'atualizacoes-TOTAL_FORMS': 1 if texto_atualizacao else 0, 'atualizacoes-INITIAL_FORMS': 0,
+            'atualizacoes-0-texto': texto_atualizacao,
+            'transicoes-TOTAL_FORMS': 0, 'transicoes-INITIAL_FORMS': 0,
+        }
+        dados.update(campos)
+        return dados
+
+    def test_gravacao_com_versao_antiga_nao_sobrescreve(self):
+        from .models import ConflitoEdicao
+        primeiro = Protocolo.objects.get(pk=self.protocolo.pk)
+        segundo = Protocolo.objects.get(pk=self.protocolo.pk)
+        primeiro.descricao = "versão do primeiro"
+        with CaptureQueriesContext(connection) as contexto:
+            primeiro.save()
+        self.assertFalse([q for q in contexto.captured_queries if 'FOR UPDATE' in q['sql']])
+        # O estado anterior vem da instância carregada: nenhuma releitura do protocolo
+        self.assertFalse([q for q in contexto.captured_queries
+                          if q['sql'].startswith('SELECT') and '"suporte_app_protocolo"."versao"' in q['sql']])
+        self.assertEqual(primeiro.versao, 2)
+
+        segundo.descricao = "versão do segundo"
+        segundo.status = 'concluido'
+        with self.assertRaises(ConflitoEdicao):
+            segundo.save()
+        self.assertEqual(segundo.versao, 1)
+        self.assertEqual(Protocolo.objects.values_list('descricao', 'status', 'versao').get(pk=self.protocolo.pk),
+                         ("versão do primeiro", 'aberto', 2))
+        self.assertFalse(self.protocolo.transicoes.exists())
+
+    def test_triagem_muda_a_versao_e_atualizacoes_nao(self):
+        from . import triagem
+        AtualizacaoProtocolo.objects.create(protocolo=self.protocolo, texto="mais uma", tecnico=self.outro)
+        self.assertEqual(Protocolo.objects.get(pk=self.protocolo.pk).versao, 1)
+        triagem.alterar_status(Protocolo.objects.filter(pk=self.protocolo.pk), 'em_andamento', self.outro)
+        self.assertEqual(Protocolo.objects.get(pk=self.protocolo.pk).versao, 2)
+
+    def test_conflito_no_admin_mostra_o_diff(self):
+        self.client.get(self.url)
+        atual = Protocolo.objects.get(pk=self.protocolo.pk)
+        atual.descricao = "linha 1\nlinha 2 do outro técnico"
+        atual.save()
+
+        resposta = self.client.post(self.url, self.dados_do_formulario(
+            1, texto_atualizacao="anotação durante o incidente", descricao="linha 1\nlinha 2 minha", status='concluido'))
+        self.assertEqual(resposta.status_code, 409)
+        self.assertContains(resposta, "não foram gravadas", status_code=409)
+        self.assertContains(resposta, "+linha 2 minha", status_code=409)
+        self.assertContains(resposta, "Concluído", status_code=409)
+        self.assertEqual(Protocolo.objects.get(pk=self.protocolo.pk).descricao, "linha 1\nlinha 2 do outro técnico")
+        # A atualização da linha do tempo passou sem conflito
+        self.assertTrue(self.protocolo.atualizacoes.filter(texto="anotação durante o incidente").exists())
+
+        # "Gravar minha versão": reenvia com a versão atual, sem repetir a atualização
+        reenvio = {}
+        for nome, valor in resposta.context['reenvio']:
+            reenvio.setdefault(nome, []).append(valor)
+        resposta = self.client.post(self.url, reenvio)
+        self.assertRedirects(resposta, self.url)
+        protocolo = Protocolo.objects.get(pk=self.protocolo.pk)
+        self.assertEqual((protocolo.descricao, protocolo.status, protocolo.versao),
+                         ("linha 1\nlinha 2 minha", 'concluido', 3))
+        self.assertEqual(self.protocolo.atualizacoes.filter(texto="anotação durante o incidente").count(), 1)
+
+    def test_so_atualizacao_na_linha_do_tempo_nao_conflita(self):
+        from . import triagem
+        triagem.reatribuir(Protocolo.objects.filter(pk=self.protocolo.pk), self.outro, self.outro)
+        resposta = self.client.post(self.url, self.dados_do_formulario(1, texto_atualizacao="sem conflito"))
+        self.assertEqual(resposta.status_code, 302)
+        protocolo = Protocolo.objects.get(pk=self.protocolo.pk)
+        # O protocolo não foi regravado com os dados antigos do formulário
+        self.assertEqual((protocolo.tecnico_responsavel, protocolo.versao), (self.outro, 2))
+        self.assertTrue(protocolo.atualizacoes.filter(texto="sem conflito").exists())
+
+    def test_atualizacao_na_linha_do_tempo_atribui_o_tecnico(self):
+        Protocolo.objects.filter(pk=self.protocolo.pk).update(tecnico_responsavel=None)
+        self.protocolo.tecnico_responsavel = None
+        resposta = self.client.post(self.url, self.dados_do_formulario(1, texto_atualizacao="assumindo"))
+        self.assertEqual(resposta.status_code, 302)
+        protocolo = Protocolo.objects.get(pk=self.protocolo.pk)
+        self.assertEqual((protocolo.tecnico_responsavel, protocolo.versao), (self.usuario, 2))
+        self.assertTrue(protocolo.atualizacoes.filter(texto="assumindo", tecnico=self.usuario).exists())
+
+
+class EscopoClienteTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import AcessoCliente
+        cache.clear()
+        self.meu, self.alheio = criar_protocolos(2)
+        self.usuario = User.objects.create_user('portal', 'portal@exemplo.com', 'senha')
+        AcessoCliente.objects.create(usuario=self.usuario, cliente=self.meu.cliente)
+        self.client.force_login(self.usuario)
+
+    def ids(self, nome_url, **params):
+        dados = self.client.get(reverse(nome_url), dict(params, fields='id')).json()
+        return [item['id'] for item in dados['resultados']]
+
+    def test_api_so_lista_os_clientes_permitidos(self):
+        self.assertEqual(self.ids('api_clientes'), [self.meu.cliente_id])
+        self.assertEqual(self.ids('api_dispositivos'), [self.meu.dispositivo_id])
+        self.assertEqual(self.ids('api_protocolos'), [self.meu.pk])
+        self.assertEqual(self.ids('api_protocolos', cliente=self.alheio.cliente_id), [])
+
+    def test_detalhe_e_busca_de_outro_cliente(self):
+        self.assertEqual(self.client.get(reverse('protocolo_detalhe', args=[self.meu.pk])).status_code, 200)
+        self.assertEqual(self.client.get(reverse('protocolo_detalhe', args=[self.alheio.pk])).status_code, 404)
+        dados = self.client.get(reverse('buscar_protocolos'), {'q': 'primeira'}).json()
+        self.assertEqual((dados['total'], [item['id'] for item in dados['resultados']]), (1, [self.meu.pk]))
+
+    def test_autocompletar_em_cache_por_usuario(self):
+        url = reverse('autocompletar_clientes')
+        self.assertEqual(len(self.client.get(url, {'q': 'cli'}).json()['resultados']), 1)
+        admin = User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+        self.client.force_login(admin)
+        self.assertEqual(len(self.client.get(url, {'q': 'cli'}).json()['resultados']), 2)
+
+    def test_quem_ve_todos_e_quem_nao_ve_nenhum(self):
+        tecnico = User.objects.create_user('tecnico', 'tecnico@exemplo.com', 'senha', is_staff=True)
+        self.client.force_login(tecnico)
+        self.assertEqual(len(self.ids('api_clientes')), 2)
+        sem_acesso = User.objects.create_user('sem_acesso', 'sem@exemplo.com', 'senha')
+        self.client.force_login(sem_acesso)
+        self.assertEqual(self.ids('api_protocolos'), [])
+
+    def test_escopo_guardado_na_sessao(self):
+        from .models import AcessoCliente
+        url = reverse('api_clientes')
+        with CaptureQueriesContext(connection) as primeira:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as segunda:
+            self.client.get(url)
+        # A primeira lê os acessos e grava a sessão; as seguintes usam a cópia da sessão
+        def contar(contexto, trecho):
+            return len([q for q in contexto.captured_queries if trecho in q['sql']])
+        self.assertEqual((contar(primeira, 'acessocliente'), contar(primeira, 'UPDATE "django_session"')), (1, 1))
+        self.assertEqual((contar(segunda, 'acessocliente'), contar(segunda, 'UPDATE "django_session"')), (0, 0))
+        # Sessão, usuário e a página de clientes
+        self.assertEqual(len(segunda.captured_queries), 3)
+
+        # Um novo acesso vale já na próxima requisição
+        AcessoCliente.objects.create(usuario=self.usuario, cliente=self.alheio.cliente)
+        self.assertEqual(len(self.ids('api_clientes')), 2)
+
+    def test_incidentes_no_admin_so_dos_clientes_permitidos(self):
+        from django.contrib.auth.models import Permission
+        meu = Incidente.objects.create(cliente=self.meu.cliente, descricao="Queda de energia")
+        alheio = Incidente.objects.create(cliente=self.alheio.cliente, descricao="Queda de energia")
+        self.usuario.is_staff = True
+        self.usuario.save()
+        self.usuario.user_permissions.add(Permission.objects.get(codename='view_incidente'))
+        url = reverse('admin:suporte_app_incidente_changelist')
+        for params in ({}, {'q': 'energia'}, {'q': self.alheio.cliente.nome}):
+            resposta = self.client.get(url, params)
+            self.assertEqual(resposta.status_code, 200)
+            self.assertEqual([incidente.pk for incidente in resposta.context['cl'].result_list],
+                             [meu.pk] if params.get('q') != self.alheio.cliente.nome else [])
+        resposta = self.client.get(reverse('admin:suporte_app_incidente_change', args=[alheio.pk]))
+        self.assertRedirects(resposta, reverse('admin:index'))
+
+    @skipUnless(connection.vendor == 'sqlite', "Plano verificado no SQLite (outros bancos podem preferir a tabela)")
+    def test_consulta_no_escopo_usa_indice_do_cliente(self):
+        from .escopo import limitar_a_clientes
+        with limitar_a_clientes([self.meu.cliente_id]):
+            plano = Protocolo.objects.filter(status='aberto').order_by('-id').values('id')[:50].explain()
+        self.assertIn('protocolo_cliente_status_idx', plano)
+
+    def test_validacao_e_eventos_no_escopo(self):
+        from django.core.exceptions import ValidationError
+        from .escopo import limitar_a_clientes
+        from .tempo_real import Filtro
+        with limitar_a_clientes([self.meu.cliente_id]):
+            # A unicidade considera também os clientes fora do escopo
+            with self.assertRaises(ValidationError):
+                Cliente(nome="Outro", email=self.alheio.cliente.email, telefone="0").full_clean()
+        filtro = Filtro(clientes=frozenset([self.meu.cliente_id]))
+        self.assertTrue(filtro.aceita({'cliente_id': self.meu.cliente_id, 'protocolo_id': self.meu.pk}))
+        self.assertFalse(filtro.aceita({'cliente_id': self.alheio.cliente_id, 'protocolo_id': self.alheio.pk}))
@@ -0,0 +1,188 @@
+"""
+Ações em massa de triagem sobre protocolos (admin e API).
+
+Cada operação recebe um queryset (ex.: "selecionar todos" do admin, com os
+filtros da lista) e roda em uma transação com poucas consultas, qualquer que
+seja a quantidade de protocolos:
+
+* trava as linhas afetadas (SELECT ... FOR UPDATE) lendo só as colunas
+  necessárias para os contadores e eventos;
+* aplica a mudança com UPDATE/bulk_create em lotes de TAMANHO_LOTE,
+  incrementando a versão dos protocolos alterados (edições concorrentes no
+  admin recebem o conflito; atualizações da linha do tempo não mudam a versão);
+* registra quem fez o quê: transições de status com autor e entradas no
+  histórico do admin (LogEntry), também em massa;
+* ajusta os contadores do painel, invalida o cache de referência, agenda a
+  reindexação e as notificações na fila de tarefas e publica os eventos em
+  tempo real após o commit, como os sinais fariam em gravações individuais.
+"""
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import cache_modelos, fila, metricas, tempo_real
+from .models import AtualizacaoProtocolo, Protocolo, TransicaoStatusProtocolo
+
+TAMANHO_LOTE = 5000
+# Protocolos reindexados por tarefa da fila
+INDEXACAO_POR_TAREFA = 1000
+
+
+def _lotes(itens, tamanho=TAMANHO_LOTE):
+    for inicio in range(0, len(itens), tamanho):
+        yield itens[inicio:inicio + tamanho]
+
+
+def _travar(protocolos):
+    """
+    Trava os protocolos do queryset e retorna [(pk, status, tecnico_id, cliente_id)].
+    A subconsulta por pk evita travar tabelas do select_related/distinct do admin.
+    """
+    return list(
+        Protocolo.objects.filter(pk__in=protocolos.order_by().values('pk'))
+        .order_by('pk')
+        .select_for_update()
+        .values_list('pk', 'status', 'tecnico_responsavel_id', 'cliente_id')
+    )
+
+
+def _registrar_historico(autor, ids, mensagem):
+    """
+    Uma entrada do histórico do admin por protocolo, no formato de mensagem do admin.
+    """
+    tipo = ContentType.objects.get_for_model(Protocolo)
+    agora = timezone.now()
+    LogEntry.objects.bulk_create([
+        LogEntry(user_id=autor.pk, content_type_id=tipo.pk, object_id=str(pk), object_repr=f"Protocolo #{pk}",
+                 action_flag=CHANGE, change_message=json.dumps(mensagem), action_time=agora)
+        for pk in ids
+    ], batch_size=1000)
+
+
+def _invalidar_cache():
+    # UPDATE/bulk_create não disparam o sinal que invalida o cache de referência
+    transaction.on_commit(lambda: cache_modelos.invalidar(Protocolo))
+
+
+def _publicar(tipo, linhas, **extras):
+    """
+    Publica após o commit um evento por protocolo. `linhas`: [(pk, status,
+    tecnico_id, cliente_id)], opcionalmente com um dict de campos do evento.
+    """
+    if not tempo_real.barramento().tem_assinantes():
+        return
+    eventos = []
+    for pk, status, tecnico_id, cliente_id, *campos in linhas:
+        protocolo = Protocolo(pk=pk, status=status, tecnico_responsavel_id=tecnico_id, cliente_id=cliente_id)
+        eventos.append(tempo_real.evento_protocolo(tipo, protocolo, **extras, **(campos[0] if campos else {})))
+
+    def publicar():
+        barramento = tempo_real.barramento()
+        for evento in eventos:
+            barramento.publicar(evento)
+    transaction.on_commit(publicar)
+
+
+def alterar_status(protocolos, status, autor):
+    """
+    Muda o status dos protocolos (os que já estão nele ficam de fora). Retorna quantos.
+    """
+    with transaction.atomic():
+        linhas = _travar(protocolos.exclude(status=status))
+        if not linhas:
+            return 0
+        ids = [pk for pk, *_ in linhas]
+        agora = timezone.now()
+        # Mesmas regras de SLA de Protocolo.save()
+        # Nova versão: quem estiver editando um destes protocolos recebe o conflito ao gravar
+        campos = {'status': status, 'concluido_em': agora if status == 'concluido' else None,
+                  'versao': F('versao') + 1}
+        if status != 'aberto':
+            campos['primeira_resposta_em'] = Coalesce('primeira_resposta_em', Value(agora))
+        for lote in _lotes(ids):
+            Protocolo.objects.filter(pk__in=lote).update(**campos)
+        TransicaoStatusProtocolo.objects.bulk_create([
+            TransicaoStatusProtocolo(protocolo_id=pk, status_anterior=anterior, status_novo=status,
+                                     autor=autor, criado_em=agora)
+            for pk, anterior, _, _ in linhas
+        ], batch_size=1000)
+
+        deltas = Counter()
+        for _, anterior, tecnico_id, cliente_id in linhas:
+            for chave in metricas.chaves_protocolo(anterior, tecnico_id, cliente_id):
+                deltas[chave] -= 1
+            for chave in metricas.chaves_protocolo(status, tecnico_id, cliente_id):
+                deltas[chave] += 1
+        metricas.ajustar(deltas)
+        _invalidar_cache()
+        _registrar_historico(autor, ids, [{'changed': {'fields': ['Status']}}])
+        if status == 'concluido' and settings.NOTIFICAR_CLIENTES:
+            # Como o sinal notificar_cliente, com um só INSERT na fila
+            fila.enfileirar_varias('notificar_cliente', [
+                ({'protocolo_id': pk, 'status': status}, f'notificar:{pk}:{status}')
+                for pk, _, _, cliente_id in linhas if cliente_id
+            ])
+        _publicar('status_alterado', [(pk, status, tecnico_id, cliente_id, {'status_anterior': anterior})
+                                      for pk, anterior, tecnico_id, cliente_id in linhas])
+    return len(linhas)
+
+
+def reatribuir(protocolos, tecnico, autor):
+    """
+    Define `tecnico` (User ou None) como responsável pelos protocolos. Retorna quantos mudaram.
+    """
+    tecnico_id = tecnico.pk if tecnico else None
+    with transaction.atomic():
+        if tecnico_id is None:
+            protocolos = protocolos.exclude(tecnico_responsavel__isnull=True)
+        else:
+            protocolos = protocolos.exclude(tecnico_responsavel_id=tecnico_id)
+        linhas = _travar(protocolos)
+        if not linhas:
+            return 0
+        ids = [pk for pk, *_ in linhas]
+        for lote in _lotes(ids):
+            Protocolo.objects.filter(pk__in=lote).update(tecnico_responsavel_id=tecnico_id, versao=F('versao') + 1)
+
+        deltas = Counter()
+        for _, status, anterior, _ in linhas:
+            deltas[('tecnico', f"{anterior or ''}:{status}")] -= 1
+            deltas[('tecnico', f"{tecnico_id or ''}:{status}")] += 1
+        metricas.ajustar(deltas)
+        _invalidar_cache()
+        _registrar_historico(autor, ids, [{'changed': {'fields': ['Técnico Responsável']}}])
+        _publicar('protocolo_atualizado', [(pk, status, tecnico_id, cliente_id)
+                                           for pk, status, _, cliente_id in linhas])
+    return len(linhas)
+
+
+def adicionar_atualizacao(protocolos, texto, autor):
+    """
+    Acrescenta a mesma atualização (feita por `autor`) a todos os protocolos. Retorna quantos.
+    """
+    with transaction.atomic():
+        linhas = _travar(protocolos)
+        if not linhas:
+            return 0
+        ids = [pk for pk, *_ in linhas]
+        atualizacoes = AtualizacaoProtocolo.objects.bulk_create(
+            [AtualizacaoProtocolo(protocolo_id=pk, texto=texto, tecnico=autor) for pk in ids], batch_size=1000,
+        )
+        # Como o sinal registrar_primeira_resposta: a atualização de um técnico é a primeira resposta
+        instante = atualizacoes[0].data_atualizacao
+        for lote in _lotes(ids):
+            Protocolo.objects.filter(pk__in=lote, primeira_resposta_em__isnull=True).update(
+                primeira_resposta_em=instante)
+        _invalidar_cache()
+        _registrar_historico(autor, ids, [{'added': {'name': 'Atualização do Protocolo', 'object': texto[:100]}}])
+        for lote in _lotes(ids, INDEXACAO_POR_TAREFA):
+            fila.enfileirar('reindexar_protocolos', {'protocolo_ids': lote})
+        _publicar('atualizacao_criada', linhas, texto=texto[:200])
+    return len(linhas)
@@ -0,0 +1,20 @@
+from django.urls import path
+
+from . import api, instrumentacao, views
+
+urlpatterns = [
+    path('protocolos/novo/', views.gerar_protocolo, name='gerar_protocolo'),
+    path('protocolos/<int:pk>/', views.protocolo_detalhe, name='protocolo_detalhe'),
+    path('protocolos/<int:pk>/atualizacoes/', views.protocolo_atualizacoes, name='protocolo_atualizacoes'),
+    path('protocolos/busca/', views.buscar_protocolos, name='buscar_protocolos'),
+    path('autocompletar/clientes/', views.autocompletar_clientes, name='autocompletar_clientes'),
+    path('autocompletar/dispositivos/', views.autocompletar_dispositivos, name='autocompletar_dispositivos'),
+    path('eventos/protocolos/', views.eventos_protocolos, name='eventos_protocolos'),
+    path('painel/', views.painel_operacoes, name='painel_operacoes'),
+    path('relatorios/sla/', views.relatorio_sla, name='relatorio_sla'),
+    path('metrics', instrumentacao.metricas_prometheus, name='metricas_prometheus'),
+    path('api/protocolos/', api.api_protocolos, name='api_protocolos'),
+    path('api/protocolos/triagem/', api.api_triagem_protocolos, name='api_triagem_protocolos'),
+    path('api/dispositivos/', api.api_dispositivos, name='api_dispositivos'),
+    path('api/clientes/', api.api_clientes, name='api_clientes'),
+]
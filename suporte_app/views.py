@@ -2,12 +2,25 @@ from django.shortcuts import render
 
 # Create your views here.
 
+import hashlib
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
+from django.db import transaction
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+from . import autocompletar, busca, escopo, linha_do_tempo, metricas, sla, tempo_real
+from .api import _data_hora
 from .forms import ProtocoloForm
-from .models import Protocolo, AtualizacaoProtocolo
+from .models import Protocolo, AtualizacaoProtocolo, TransicaoStatusProtocolo
 from django.forms import inlineformset_factory
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from django.views.decorators.cache import cache_page
 
 @login_required
 def gerar_protocolo(request):
@@ -27,15 +40,18 @@ def gerar_protocolo(request):
         formset = AtualizacaoProtocoloFormset(request.POST)
         
         if form.is_valid() and formset.is_valid():
-            protocolo = form.save(commit=False)
-            protocolo.autor = request.user
-            protocolo.save()
-            
-            instances = formset.save(commit=False)
-            for instance in instances:
-                instance.protocolo = protocolo
-                instance.autor = request.user
-                instance.save()
+            # Protocolo e atualizações juntos; as tarefas de segundo plano só
+            # são enfileiradas no commit
+            with transaction.atomic():
+                protocolo = form.save(commit=False)
+                protocolo.autor = request.user
+                protocolo.save()
+
+                instances = formset.save(commit=False)
+                for instance in instances:
+                    instance.protocolo = protocolo
+                    instance.autor = request.user
+                    instance.save()
             
             return redirect('protocolo_detalhe', pk=protocolo.id)
     else:
@@ -48,13 +64,244 @@ def gerar_protocolo(request):
     }
     return render(request, 'suporte_app/gerar_protocolo.html', context)
 
+def _versao_protocolo(request, pk):
+    """
+    (etag, last_modified) do protocolo, derivados dos seus campos e da última
+    atualização/transição, lidos em uma consulta (memorizada na requisição,
+    pois o decorator condition pede os dois separadamente).
+    """
+    if not hasattr(request, '_versao_protocolo'):
+        ultima_atualizacao = (
+            AtualizacaoProtocolo.objects.filter(protocolo=OuterRef('pk'))
+            .order_by('-data_atualizacao').values('data_atualizacao')[:1]
+        )
+        ultima_transicao = (
+            TransicaoStatusProtocolo.objects.filter(protocolo=OuterRef('pk'))
+            .order_by('-criado_em').values('criado_em')[:1]
+        )
+        linha = (
+            Protocolo.objects.filter(pk=pk)
+            .annotate(ultima_atualizacao=Subquery(ultima_atualizacao), ultima_transicao=Subquery(ultima_transicao))
+            .values_list('status', 'tecnico_responsavel_id', 'cliente_id', 'dispositivo_id', 'dispositivo__online',
+                         'incidente_id', 'buic', 'topico_mqtt', 'descricao', 'payload_exemplo', 'criado_em',
+                         'ultima_atualizacao', 'ultima_transicao')
+            .first()
+        )
+        versao = (None, None)
+        if linha is not None:
+            etag = hashlib.md5(repr(linha).encode('utf-8')).hexdigest()
+            versao = (etag, max(data for data in linha[-3:] if data is not None))
+        request._versao_protocolo = versao
+    return request._versao_protocolo
+
 @login_required
+@condition(etag_func=lambda request, pk: _versao_protocolo(request, pk)[0],
+           last_modified_func=lambda request, pk: _versao_protocolo(request, pk)[1])
 def protocolo_detalhe(request, pk):
     """
     View para exibir os detalhes de um protocolo, incluindo o seu ID.
+    Carrega o protocolo, seus relacionamentos, o histórico de status e a primeira
+    página da linha do tempo de uma vez; as páginas seguintes vêm de
+    protocolo_atualizacoes. Responde 304 se o protocolo não mudou.
     """
-    protocolo = get_object_or_404(Protocolo, pk=pk)
+    queryset = (
+        Protocolo.objects
+        .select_related('cliente', 'dispositivo', 'tecnico_responsavel', 'incidente')
+        .prefetch_related(
+            linha_do_tempo.prefetch_primeira_pagina(),
+            Prefetch('transicoes', queryset=TransicaoStatusProtocolo.objects.select_related('autor')),
+        )
+    )
+    protocolo = get_object_or_404(queryset, pk=pk)
+    atualizacoes, proximo_cursor = linha_do_tempo.dividir(protocolo.atualizacoes_recentes, linha_do_tempo.POR_PAGINA)
     context = {
-        'protocolo': protocolo
+        'protocolo': protocolo,
+        'atualizacoes': atualizacoes,
+        'proximo_cursor': proximo_cursor,
     }
     return render(request, 'suporte_app/protocolo_detalhe.html', context)
+
+@login_required
+def protocolo_atualizacoes(request, pk):
+    """
+    Página da linha do tempo em JSON, das mais recentes para as mais antigas.
+    Parâmetros: cursor (o next_cursor da página anterior) e limite.
+    """
+    if not Protocolo.objects.filter(pk=pk).exists():
+        raise Http404("Protocolo não encontrado.")
+    limite = _inteiro(request.GET.get('limite'), linha_do_tempo.POR_PAGINA, maximo=linha_do_tempo.POR_PAGINA_MAXIMO)
+    try:
+        atualizacoes, proximo_cursor = linha_do_tempo.pagina(pk, request.GET.get('cursor'), limite)
+    except linha_do_tempo.CursorInvalido:
+        return JsonResponse({'erro': "Cursor inválido."}, status=400)
+    return JsonResponse({
+        'resultados': [
+            {
+                'id': atualizacao.pk,
+                'texto': atualizacao.texto,
+                'tecnico': atualizacao.tecnico.username if atualizacao.tecnico else None,
+                'data': atualizacao.data_atualizacao.isoformat(),
+            }
+            for atualizacao in atualizacoes
+        ],
+        'next_cursor': proximo_cursor,
+    })
+
+# Limites da paginação da busca
+BUSCA_POR_PAGINA = 20
+BUSCA_POR_PAGINA_MAXIMO = 100
+
+def _inteiro(valor, padrao, minimo=1, maximo=None):
+    try:
+        valor = int(valor)
+    except (TypeError, ValueError):
+        return padrao
+    valor = max(valor, minimo)
+    return min(valor, maximo) if maximo else valor
+
+@login_required
+def buscar_protocolos(request):
+    """
+    Busca textual de protocolos em JSON, ordenada por relevância e paginada.
+    Parâmetros: q (termo), pagina e por_pagina.
+    """
+    termo = request.GET.get('q', '').strip()
+    pagina = _inteiro(request.GET.get('pagina'), 1)
+    por_pagina = _inteiro(request.GET.get('por_pagina'), BUSCA_POR_PAGINA, maximo=BUSCA_POR_PAGINA_MAXIMO)
+
+    total, encontrados = busca.buscar(termo, limite=por_pagina, deslocamento=(pagina - 1) * por_pagina)
+    protocolos = Protocolo.objects.select_related('cliente', 'dispositivo').in_bulk([pk for pk, _ in encontrados])
+
+    resultados = []
+    for pk, rank in encontrados:
+        protocolo = protocolos.get(pk)
+        if protocolo is None:
+            continue
+        resultados.append({
+            'id': protocolo.pk,
+            'numero': protocolo.numero_protocolo,
+            'status': protocolo.status,
+            'cliente': protocolo.cliente.nome if protocolo.cliente else None,
+            'dispositivo': protocolo.dispositivo.nome,
+            'buic': protocolo.buic,
+            'descricao': protocolo.descricao,
+            'rank': rank,
+            'url': reverse('protocolo_detalhe', args=[protocolo.pk]),
+        })
+
+    return JsonResponse({
+        'q': termo,
+        'pagina': pagina,
+        'por_pagina': por_pagina,
+        'total': total,
+        'resultados': resultados,
+    })
+
+@staff_member_required
+def painel_operacoes(request):
+    """
+    Painel de operações: protocolos por status, técnico, cliente e dia e
+    dispositivos online por tipo, lidos dos contadores pré-agregados.
+    """
+    # Os contadores são de todos os clientes
+    if escopo.clientes_ativos() is not None:
+        raise PermissionDenied
+    context = {
+        'painel': metricas.painel(),
+    }
+    return render(request, 'suporte_app/painel.html', context)
+
+@staff_member_required
+def relatorio_sla(request):
+    """
+    Relatório de SLA em JSON: quantidade, média e percentis (segundos) por grupo.
+    Parâmetros: grupo (cliente ou tecnico), medida (resolucao ou primeira_resposta),
+    criado_de e criado_ate.
+    """
+    grupo = request.GET.get('grupo', 'cliente')
+    medida = request.GET.get('medida', 'resolucao')
+    if grupo not in sla.GRUPOS or medida not in sla.MEDIDAS:
+        return JsonResponse({'erro': "Grupo ou medida inválidos."}, status=400)
+
+    protocolos = Protocolo.objects.all()
+    try:
+        if request.GET.get('criado_de'):
+            protocolos = protocolos.filter(criado_em__gte=_data_hora(request.GET['criado_de']))
+        if request.GET.get('criado_ate'):
+            protocolos = protocolos.filter(criado_em__lte=_data_hora(request.GET['criado_ate'], fim_do_dia=True))
+    except ValueError:
+        return JsonResponse({'erro': "Data inválida."}, status=400)
+
+    return JsonResponse({
+        'grupo': grupo,
+        'medida': medida,
+        'percentis': list(sla.PERCENTIS),
+        'resultados': sla.relatorio(grupo, medida, queryset=protocolos),
+    })
+
+@login_required
+@cache_page(settings.AUTOCOMPLETAR_CACHE_SEGUNDOS)
+@vary_on_cookie
+def autocompletar_clientes(request):
+    """
+    Clientes por prefixo de nome ou e-mail (parâmetro q), em JSON.
+    """
+    clientes = autocompletar.clientes(request.GET.get('q', ''))
+    return JsonResponse({
+        'resultados': [
+            {'id': pk, 'texto': f"{nome} <{email}>"}
+            for pk, nome, email in clientes.values_list('pk', 'nome', 'email')
+        ],
+    })
+
+@login_required
+@cache_page(settings.AUTOCOMPLETAR_CACHE_SEGUNDOS)
+@vary_on_cookie
+def autocompletar_dispositivos(request):
+    """
+    Dispositivos do cliente selecionado (parâmetro cliente) por prefixo de nome,
+    MAC ou BUIC (parâmetro q), em JSON.
+    """
+    cliente_id = request.GET.get('cliente') or None
+    if cliente_id is not None:
+        cliente_id = _inteiro(cliente_id, None)
+        if cliente_id is None:
+            return JsonResponse({'erro': "Cliente inválido."}, status=400)
+    termo = request.GET.get('q', '')
+    if cliente_id is not None and not termo.strip():
+        linhas = autocompletar.dispositivos_do_cliente(cliente_id)
+    else:
+        linhas = autocompletar.dispositivos(termo, cliente_id=cliente_id).values_list(
+            'pk', 'nome', 'mac_address', 'online')
+    return JsonResponse({
+        'resultados': [
+            {'id': pk, 'texto': f"{nome} ({mac})", 'online': online}
+            for pk, nome, mac, online in linhas
+        ],
+    })
+
+@login_required
+async def eventos_protocolos(request):
+    """
+    Stream (Server-Sent Events) dos eventos de protocolos. Filtros opcionais:
+    tecnico (id ou "eu"), cliente e protocolo. Requer servidor ASGI.
+    """
+    filtros = {}
+    for parametro, campo in (('tecnico', 'tecnico_id'), ('cliente', 'cliente_id'), ('protocolo', 'protocolo_id')):
+        valor = request.GET.get(parametro)
+        if not valor:
+            continue
+        if parametro == 'tecnico' and valor == 'eu':
+            filtros[campo] = (await request.auser()).pk
+        elif valor.isdigit():
+            filtros[campo] = int(valor)
+        else:
+            return JsonResponse({'erro': f"Valor inválido para '{parametro}'."}, status=400)
+
+    # Só os eventos dos clientes que o usuário pode ver
+    filtro = tempo_real.Filtro(**filtros, clientes=escopo.clientes_ativos())
+    response = StreamingHttpResponse(tempo_real.transmitir(filtro),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # sem buffer no proxy reverso (nginx)
+    return response
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import sys
 from pathlib import Path
 from decouple import config
 import dj_database_url
@@ -47,11 +48,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primeiro da lista para medir a requisição inteira
+    'suporte_app.instrumentacao.InstrumentacaoMiddleware',
+    # Antes de qualquer acesso ao banco (só ativo com DATABASE_REPLICA_URL)
+    'suporte_app.roteamento.RoteamentoBancoMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Depois da autenticação: limita as leituras aos clientes do usuário
+    'suporte_app.escopo.EscopoClienteMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,10 +86,176 @@ WSGI_APPLICATION = 'suporte_beyond.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Conexões persistentes: reaproveitadas por até DB_CONN_MAX_AGE segundos (0 = uma por
+# requisição), verificadas antes do reuso. Em ASGI use 0 com DB_POOL (psycopg 3, só
+# PostgreSQL), já que cada requisição assíncrona roda em uma thread diferente.
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=60, cast=int)
+DB_CONN_HEALTH_CHECKS = config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool)
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+DB_POOL_MIN = config('DB_POOL_MIN', default=2, cast=int)
+DB_POOL_MAX = config('DB_POOL_MAX', default=10, cast=int)
+# Segundos esperando uma conexão livre do pool antes de falhar
+DB_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', default=10, cast=float)
+
+
+def configurar_banco(url):
+    banco = dj_database_url.parse(url, conn_max_age=DB_CONN_MAX_AGE, conn_health_checks=DB_CONN_HEALTH_CHECKS)
+    if DB_POOL and banco['ENGINE'] == 'django.db.backends.postgresql':
+        # O pool substitui as conexões persistentes (o Django exige CONN_MAX_AGE = 0)
+        banco['CONN_MAX_AGE'] = 0
+        banco.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': DB_POOL_MIN, 'max_size': DB_POOL_MAX, 'timeout': DB_POOL_TIMEOUT,
+        }
+    return banco
+
+
 DATABASES = {
-    'default': dj_database_url.parse(config('DATABASE_URL'))
+    'default': configurar_banco(config('DATABASE_URL'))
 }
 
+# Réplica de leitura (suporte_app/roteamento.py): GETs leem dela, exceto logo após uma
+# escrita do mesmo navegador (por BANCO_REPLICA_FIXAR_SEGUNDOS, cobrindo o atraso de replicação)
+DATABASE_REPLICA_URL = config('DATABASE_REPLICA_URL', default='')
+BANCO_REPLICA_FIXAR_SEGUNDOS = config('BANCO_REPLICA_FIXAR_SEGUNDOS', default=10, cast=int)
+DATABASE_ROUTERS = []
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = configurar_banco(DATABASE_REPLICA_URL)
+    # Nos testes a réplica aponta para o banco de testes do primário
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_ROUTERS = ['suporte_app.roteamento.RoteadorReplica']
+
+
+# MQTT (ingestão do status dos dispositivos: python manage.py ingerir_mqtt)
+
+MQTT_HOST = config('MQTT_HOST', default='localhost')
+MQTT_PORT = config('MQTT_PORT', default=1883, cast=int)
+MQTT_TOPICOS_STATUS = config('MQTT_TOPICOS_STATUS', default='dispositivos/+/status').split(',')
+MQTT_JANELA_SEGUNDOS = config('MQTT_JANELA_SEGUNDOS', default=1.0, cast=float)
+# Recarga do índice de dispositivos: periódica e, com mensagens de dispositivos desconhecidos,
+# no máximo a cada MQTT_INDICE_RECARGA_MINIMA_SEGUNDOS
+MQTT_INDICE_RECARGA_SEGUNDOS = config('MQTT_INDICE_RECARGA_SEGUNDOS', default=300.0, cast=float)
+MQTT_INDICE_RECARGA_MINIMA_SEGUNDOS = config('MQTT_INDICE_RECARGA_MINIMA_SEGUNDOS', default=30.0, cast=float)
+
+
+# Protocolos automáticos (dispositivo ficou offline)
+
+# Nova queda de um dispositivo com protocolo em aberto (de qualquer data) vira atualização dele.
+# Janela em que as quedas de um mesmo cliente são contadas para o incidente agrupador
+PROTOCOLO_AUTOMATICO_JANELA_MINUTOS = config('PROTOCOLO_AUTOMATICO_JANELA_MINUTOS', default=30, cast=int)
+# Quedas de um mesmo cliente, dentro da janela, a partir das quais é aberto um incidente agrupador
+PROTOCOLO_AUTOMATICO_LIMIAR_INCIDENTE = config('PROTOCOLO_AUTOMATICO_LIMIAR_INCIDENTE', default=5, cast=int)
+
+
+# Cache (painel, autocompletar, dados de referência e fragmentos; suporte_app/cache_modelos.py)
+# Memória local de cada processo por padrão. Com vários processos use um cache
+# compartilhado (ex.: CACHE_BACKEND=django.core.cache.backends.redis.RedisCache e
+# CACHE_LOCATION=redis://localhost:6379/1) para a invalidação valer em todos.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='suporte-beyond'),
+        'KEY_PREFIX': config('CACHE_PREFIXO', default='suporte'),
+        'TIMEOUT': config('CACHE_SEGUNDOS', default=300, cast=int),
+    }
+}
+# Validade (segundos) das escolhas dos filtros do admin e demais dados de referência
+CACHE_REFERENCIA_SEGUNDOS = config('CACHE_REFERENCIA_SEGUNDOS', default=3600, cast=int)
+# Validade (segundos) dos fragmentos de template ({% fragmento_em_cache %})
+CACHE_FRAGMENTOS_SEGUNDOS = config('CACHE_FRAGMENTOS_SEGUNDOS', default=600, cast=int)
+
+# Painel de operações: validade (segundos) dos dados em cache
+METRICAS_CACHE_SEGUNDOS = config('METRICAS_CACHE_SEGUNDOS', default=60, cast=int)
+
+# Autocompletar de clientes/dispositivos: validade (segundos) das respostas em cache
+AUTOCOMPLETAR_CACHE_SEGUNDOS = config('AUTOCOMPLETAR_CACHE_SEGUNDOS', default=30, cast=int)
+
+
+# Instrumentação de requisições (suporte_app/instrumentacao.py)
+
+INSTRUMENTACAO_ATIVA = config('INSTRUMENTACAO_ATIVA', default=True, cast=bool)
+# Fração das requisições medidas em detalhe (consultas, Server-Timing, log JSON)
+INSTRUMENTACAO_AMOSTRAGEM = config('INSTRUMENTACAO_AMOSTRAGEM', default=0.05, cast=float)
+# Requisições amostradas acima destes limites são registradas como WARNING
+INSTRUMENTACAO_LENTA_MS = config('INSTRUMENTACAO_LENTA_MS', default=500, cast=int)
+INSTRUMENTACAO_MAXIMO_CONSULTAS = config('INSTRUMENTACAO_MAXIMO_CONSULTAS', default=30, cast=int)
+# Se definido, o /metrics exige 'Authorization: Bearer <token>'
+INSTRUMENTACAO_METRICAS_TOKEN = config('INSTRUMENTACAO_METRICAS_TOKEN', default='')
+
+# Eventos de protocolos em tempo real (suporte_app/tempo_real.py; endpoint SSE via ASGI)
+
+TEMPO_REAL_BACKEND = config('TEMPO_REAL_BACKEND', default='suporte_app.tempo_real.BarramentoMemoria')
+# Eventos guardados por conexão antes de descartar os mais antigos (cliente lento)
+TEMPO_REAL_FILA = config('TEMPO_REAL_FILA', default=100, cast=int)
+# Intervalo (segundos) dos comentários que mantêm as conexões ociosas abertas
+TEMPO_REAL_HEARTBEAT_SEGUNDOS = config('TEMPO_REAL_HEARTBEAT_SEGUNDOS', default=15, cast=int)
+
+# Arquivamento de protocolos concluídos (python manage.py arquivar_protocolos)
+# Dias após a conclusão para o protocolo ser movido para o arquivo
+ARQUIVAMENTO_DIAS = config('ARQUIVAMENTO_DIAS', default=365, cast=int)
+# Protocolos movidos por transação
+ARQUIVAMENTO_LOTE = config('ARQUIVAMENTO_LOTE', default=500, cast=int)
+
+# Fila de tarefas em segundo plano (suporte_app/fila.py; python manage.py processar_tarefas)
+# Executa as tarefas em memória, no commit, sem gravar na fila (testes/desenvolvimento)
+TAREFAS_IMEDIATAS = config('TAREFAS_IMEDIATAS', default=False, cast=bool)
+# Threads do processar_tarefas e tarefas reservadas por vez em cada uma
+TAREFAS_CONCORRENCIA = config('TAREFAS_CONCORRENCIA', default=2, cast=int)
+TAREFAS_LOTE = config('TAREFAS_LOTE', default=10, cast=int)
+# Espera (segundos) entre consultas à fila quando não há tarefas
+TAREFAS_INTERVALO_SEGUNDOS = config('TAREFAS_INTERVALO_SEGUNDOS', default=1.0, cast=float)
+# Tentativas por tarefa e espera exponencial entre elas (segundos)
+TAREFAS_TENTATIVAS = config('TAREFAS_TENTATIVAS', default=5, cast=int)
+TAREFAS_ESPERA_BASE_SEGUNDOS = config('TAREFAS_ESPERA_BASE_SEGUNDOS', default=10, cast=int)
+TAREFAS_ESPERA_MAXIMA_SEGUNDOS = config('TAREFAS_ESPERA_MAXIMA_SEGUNDOS', default=3600, cast=int)
+# Tarefa em execução há mais que isso volta para a fila (trabalhador interrompido)
+TAREFAS_TEMPO_LIMITE_SEGUNDOS = config('TAREFAS_TEMPO_LIMITE_SEGUNDOS', default=600, cast=int)
+
+# Localização de dispositivos por MAC/BUIC/tópico MQTT (suporte_app/inventario.py)
+# Validade (segundos) e tamanho máximo do cache em memória de cada processo
+INVENTARIO_CACHE_SEGUNDOS = config('INVENTARIO_CACHE_SEGUNDOS', default=300, cast=int)
+INVENTARIO_CACHE_MAXIMO = config('INVENTARIO_CACHE_MAXIMO', default=50000, cast=int)
+
+# E-mails aos clientes na abertura e na conclusão de protocolos (enviados pela fila)
+NOTIFICAR_CLIENTES = config('NOTIFICAR_CLIENTES', default=False, cast=bool)
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='suporte@beyond.exemplo')
+
+# `manage.py test`: o log das requisições não se mistura à saída dos testes
+TESTANDO = sys.argv[1:2] == ['test']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'instrumentacao': {'class': 'logging.StreamHandler', 'formatter': 'json'},
+    },
+    'loggers': {
+        'suporte_app.instrumentacao': {
+            'handlers': ['instrumentacao'],
+            # Nos testes só as requisições lentas (os testes que leem o log usam assertLogs)
+            'level': config('INSTRUMENTACAO_LOG_NIVEL', default='WARNING' if TESTANDO else 'INFO'),
+            'propagate': False,
+        },
+        'suporte_app.fila': {
+            'handlers': ['instrumentacao'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'suporte_app.ingestao': {
+            'handlers': ['instrumentacao'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
 
 
 